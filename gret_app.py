@@ -0,0 +1,434 @@
+import numpy as np
+import tkinter as tk
+import tkinter.ttk as ttk
+
+from gret_biomes import DEFAULT_BIOMES
+from gret_cache import LayerCache
+from gret_composite import MapComposer
+from gret_core import MapSpec, compose_maps, save_map
+from gret_generatorkits import GeneratorKit, GradientKit
+from gret_hydrology import DEFAULT_HYDROLOGY
+from gret_jit import NUMBA_AVAILABLE
+from gret_jobs import JobScheduler
+from gret_profile import load_profile, save_profile
+from gret_pyramid import TilePyramid, array_source
+from gret_tkinter_widgets import LabeledEntry, LabeledVerticalScale
+from gret_trace import TRACER, format_summary, span
+from gret_viewport import MapViewport
+from multiprocessing import cpu_count, Pool
+from os import path
+from tkinter import filedialog, messagebox
+
+
+class Root(tk.Tk):
+    def __init__(self, parent):
+        tk.Tk.__init__(self, parent)
+        self.title("gret_sandbox")
+        self.minsize(1150, 550)
+        self.geometry("1440x840")
+        self.main_bg = "gray"
+        self.config(bg=self.main_bg)
+        self.update()
+        self.bind("<Configure>", self.window_resize_event)
+        self.protocol("WM_DELETE_WINDOW", self.close_window)
+
+        # list of dynamically added/removed frames (generator kit frames for now)
+        self.dynamic_frames = []
+        # indicator of object of which array is actually displayed - for easy control of refreshing
+        self.displayed_frame = None
+        # canvas' size (height, width) - to be the same as for MAP_SIZE
+        self.CANVAS_SIZE = (0, 0)
+        # array's size (rows, columns) => (height, width)
+        self.MAP_SIZE = (800, 800)
+        # (row, column) of the map in infinite noise plane and period of tileable map (None - not tileable)
+        self.offset = (0, 0)
+        self.period = None
+        # levels for better image visualization
+        self.levels = 32
+        # type of arrays of the whole pipeline - map is quantized into levels anyway, float64 would be wasted
+        self.dtype = np.float32
+        # noise kernel: 'numpy' - vectorized generation, 'snoise2' - snoise2 called pixel by pixel,
+        # 'numba' - compiled kernels (if Numba is installed)
+        self.noise_kernel = 'numba' if NUMBA_AVAILABLE else 'numpy'
+        # one pool of worker processes for the whole application - created on first use, closed with window
+        # (with 1 worker arrays are generated in the main process)
+        self.workers = min(cpu_count(), 6)
+        self.pool = None
+        # generated layers are kept on disk, so regenerating them with the same parameters is instant
+        self.layer_cache = LayerCache(path.join(path.expanduser('~'), '.cache', 'gret_sandbox', 'layers'),
+                                      max_bytes=2 * 1024 ** 3)
+        # heavy operations (generation, composition of the map) are run in the background thread
+        self.scheduler = JobScheduler(self, on_progress=self.show_progress)
+
+        # additional frame for proper placement purposes
+        self.corner_offset = tk.Frame(self, width=10, height=10, bg=self.main_bg)
+        self.corner_offset.grid(row=0, column=0)
+
+        # column 1 - place for gradient and river generators
+        self.col1_frame = tk.Frame(self, bg=self.main_bg)
+        self.col1_frame.grid(row=1, column=1, sticky='n')
+        # col_width frames are only to setup static width of frame (at least that is how I figured it out)
+        self.col1_width = tk.Frame(self.col1_frame, width=300, bg=self.main_bg)
+        self.col1_width.grid(row=0, column=0)
+        # create basic gradient kit
+        self.gradient = GradientKit(self.col1_frame)
+        self.gradient.grid(row=2, column=0, pady=3, sticky='n')
+
+        # Map controls frame
+        self.map_frame = tk.Frame(self.col1_frame, bg=self.main_bg, bd=1, relief=tk.SUNKEN)
+        self.map_frame.grid(row=3, column=0, pady=3, sticky='n')
+        self.map_frame_width = tk.Frame(self.map_frame, width=292, bg=self.main_bg)
+        self.map_frame_width.grid(row=0, column=0, columnspan=5)
+        # sea level slider
+        self.sea_level_slider = LabeledVerticalScale(self.map_frame,
+                                                     text="Sea level", value=0.3,
+                                                     slider_bind_func=self.change_map_level_event)
+        self.sea_level_slider.grid(row=0, column=0, padx=5, pady=3)
+        # plains slider
+        self.plains_level_slider = LabeledVerticalScale(self.map_frame,
+                                                        text="Plains level", value=0.5,
+                                                        slider_bind_func=self.change_map_level_event)
+        self.plains_level_slider.grid(row=0, column=1, padx=5, pady=3)
+        # hills slider
+        self.hills_level_slider = LabeledVerticalScale(self.map_frame,
+                                                       text="Hills level", value=0.5,
+                                                       slider_bind_func=self.change_map_level_event)
+        self.hills_level_slider.grid(row=0, column=2, padx=5, pady=3)
+        # resize map frame
+        self.resize_map_frame = tk.Frame(self.map_frame, bg=self.main_bg)
+        self.resize_map_frame.grid(row=1, column=0, padx=5, columnspan=4, sticky='we')
+        self.map_width_entry = LabeledEntry(self.resize_map_frame, text="Map width: ",
+                                            validate_for='int', value=self.MAP_SIZE[0])
+        self.map_width_entry.grid(row=1, column=0, columnspan=2, sticky='w')
+        self.map_height_entry = LabeledEntry(self.resize_map_frame, text="height: ",
+                                             validate_for='int', value=self.MAP_SIZE[1])
+        self.map_height_entry.grid(row=1, column=2, columnspan=2, sticky='w')
+        self.resize_arrays_btn = tk.Button(self.resize_map_frame, text="Apply", width=7, command=self.resize_arrays)
+        self.resize_arrays_btn.grid(row=1, column=4, rowspan=2, sticky='e')
+        # window of the noise plane (offset of the map) and tileable map - applied with the size
+        self.offset_x_entry = LabeledEntry(self.resize_map_frame, text="Offset x: ", validate_for='int', value=0)
+        self.offset_x_entry.grid(row=2, column=0, columnspan=2, sticky='w')
+        self.offset_y_entry = LabeledEntry(self.resize_map_frame, text="y: ", validate_for='int', value=0)
+        self.offset_y_entry.grid(row=2, column=2, sticky='w')
+        self.tileable = tk.BooleanVar(value=False)
+        self.tileable_check = tk.Checkbutton(self.resize_map_frame, text="Tileable", variable=self.tileable,
+                                             bg=self.main_bg, activebackground=self.main_bg)
+        self.tileable_check.grid(row=2, column=3, sticky='w')
+        # displaying the whole map button
+        self.make_frame_btn = tk.Button(self.map_frame, text="Display the whole map", command=self.display_map)
+        self.make_frame_btn.grid(row=2, column=0, padx=3, pady=3, columnspan=3, sticky='nwe')
+        # erosion, rivers and lakes of the whole map (parameters are kept from loaded profile)
+        self.hydrology = tk.BooleanVar(value=False)
+        self.hydrology_params = dict(DEFAULT_HYDROLOGY)
+        self.hydrology_check = tk.Checkbutton(self.map_frame, text="Water", variable=self.hydrology,
+                                              command=lambda: self.change_map_level_event(None),
+                                              bg=self.main_bg, activebackground=self.main_bg)
+        self.hydrology_check.grid(row=2, column=3, sticky='w')
+        # colors of biomes (from temperature and moisture noise) instead of colors of heights
+        self.biomes = tk.BooleanVar(value=False)
+        self.biomes_params = dict(DEFAULT_BIOMES)
+        self.biomes_check = tk.Checkbutton(self.map_frame, text="Biomes", variable=self.biomes,
+                                           command=lambda: self.change_map_level_event(None),
+                                           bg=self.main_bg, activebackground=self.main_bg)
+        self.biomes_check.grid(row=2, column=4, sticky='w')
+        # exporting the whole map (heightmap .npy, 16-bit heightmap .png, colorized map .png)
+        self.export_btn = tk.Button(self.map_frame, text="Export map", command=self.export_map)
+        self.export_btn.grid(row=4, column=0, padx=3, pady=3, columnspan=5, sticky='nwe')
+        # profiles - all parameters of the sandbox and (optionally) generated arrays
+        self.profile_frame = tk.Frame(self.map_frame, bg=self.main_bg)
+        self.profile_frame.grid(row=5, column=0, columnspan=5, sticky='we')
+        self.profile_frame.columnconfigure(0, weight=1)
+        self.profile_frame.columnconfigure(1, weight=1)
+        self.save_profile_btn = tk.Button(self.profile_frame, text="Save profile", command=self.save_profile)
+        self.save_profile_btn.grid(row=0, column=0, padx=3, pady=3, sticky='we')
+        self.load_profile_btn = tk.Button(self.profile_frame, text="Load profile", command=self.load_profile)
+        self.load_profile_btn.grid(row=0, column=1, padx=3, pady=3, sticky='we')
+        # progress of the background job and button cancelling all jobs
+        self.progress_bar = ttk.Progressbar(self.map_frame, orient=tk.HORIZONTAL, mode='determinate', maximum=1)
+        self.progress_bar.grid(row=3, column=0, padx=3, pady=3, columnspan=4, sticky='we')
+        self.cancel_btn = tk.Button(self.map_frame, text="Cancel", width=7, command=self.scheduler.cancel)
+        self.cancel_btn.grid(row=3, column=4, padx=3, pady=3, sticky='e')
+        # timings of the last runs of stages of the pipeline and memory (refreshed every STATUS_INTERVAL ms)
+        self.STATUS_INTERVAL = 1000
+        self.status_label = tk.Label(self.map_frame, text="", justify=tk.LEFT, anchor='w', bg=self.main_bg,
+                                     font=('TkFixedFont', 8))
+        self.status_label.grid(row=6, column=0, padx=3, columnspan=5, sticky='we')
+        self.export_trace_btn = tk.Button(self.map_frame, text="Export trace", command=self.export_trace)
+        self.export_trace_btn.grid(row=7, column=0, padx=3, pady=3, columnspan=5, sticky='nwe')
+        self.refresh_status()
+
+        # column 2 - generator kits
+        self.col2_frame = tk.Frame(self, bg=self.main_bg)
+        self.col2_frame.grid(row=1, column=2, sticky='n')
+        self.col2_width = tk.Frame(self.col2_frame, width=300, bg=self.main_bg)
+        self.col2_width.grid(row=0, column=0)
+        # create basic generator kit
+        generator_kit = GeneratorKit(self.col2_frame)
+        # access generator kits by this list only - dynamic_frames
+        self.dynamic_frames.append(generator_kit)
+        generator_kit.grid(row=1, column=0, pady=3, sticky='n')
+        # button for adding layers (generator kits, at least for now)
+        self.make_frame_btn = tk.Button(self.col2_frame, text="Add layer", command=self.new_generator_kit)
+        self.make_frame_btn.grid(row=2, column=0, padx=3, pady=3, sticky='nwe')
+
+        # column 3 - array display area
+        self.canvas_frame = tk.Frame(self, bg=self.main_bg)
+        self.canvas_frame.grid(row=1, column=3)
+        # only visible tiles of the map are rendered, mouse wheel zooms in/out
+        self.viewport = MapViewport(self.canvas_frame, width=self.CANVAS_SIZE[1], height=self.CANVAS_SIZE[0])
+        self.viewport.grid(row=0, column=0, sticky='nw')
+        self.canvas = self.viewport.canvas
+        # cached stages of the whole map composition
+        self.composer = MapComposer(self.levels, self.dtype)
+
+    def get_pool(self):
+        # all kits submit their jobs to the same pool, so processes are started only once
+        if self.pool is None:
+            with span('pool start', workers=self.workers):
+                self.pool = Pool(self.workers)
+        return self.pool
+
+    def close_pool(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def close_window(self):
+        self.scheduler.close()
+        for generator in self.dynamic_frames:
+            generator.release_array()
+        self.close_pool()
+        self.destroy()
+
+    def show_progress(self, progress):
+        # progress is (done, total) of the running job or None if nothing is running
+        if progress is None or not progress[1]:
+            self.progress_bar['value'] = 0
+        else:
+            self.progress_bar['value'] = progress[0] / progress[1]
+
+    def refresh_status(self):
+        self.status_label.config(text=format_summary(TRACER.summary()))
+        self.after(self.STATUS_INTERVAL, self.refresh_status)
+
+    def export_trace(self):
+        filename = filedialog.asksaveasfilename(parent=self, title="Export trace", defaultextension='.json',
+                                                filetypes=[("Chrome trace", "*.json")])
+        if filename:
+            # open in chrome://tracing or https://ui.perfetto.dev
+            TRACER.export_chrome_trace(filename)
+
+    def change_map_level_event(self, event):
+        if self.displayed_frame is self:
+            self.display_map()
+
+    def window_resize_event(self, event):
+        save_width = 640
+        save_height = 40
+        if self.CANVAS_SIZE[1] != self.winfo_width() - save_width \
+                or self.CANVAS_SIZE[0] != self.winfo_height() - save_height:
+            self.CANVAS_SIZE = (self.winfo_height() - save_height, self.winfo_width() - save_width)
+            self.canvas.configure(width=self.CANVAS_SIZE[1], height=self.CANVAS_SIZE[0])
+
+    def resize_arrays(self):
+        if int(self.map_height_entry.get()) < 400:
+            self.map_height_entry.entry.delete(0, tk.END)
+            self.map_height_entry.entry.insert(0, 400)
+        if int(self.map_width_entry.get()) < 400:
+            self.map_width_entry.entry.delete(0, tk.END)
+            self.map_width_entry.entry.insert(0, 400)
+        self.MAP_SIZE = (int(self.map_height_entry.get()), int(self.map_width_entry.get()))
+        offset = []
+        for entry in (self.offset_y_entry, self.offset_x_entry):
+            try:
+                offset.append(int(entry.get()))
+            except ValueError:
+                entry.set(0)
+                offset.append(0)
+        self.offset = tuple(offset)
+        # tileable map repeats after its size
+        self.period = self.MAP_SIZE if self.tileable.get() else None
+        for generator in self.dynamic_frames:
+            if generator.array is not None:
+                generator.generate_array(refresh_map=False)
+        if self.gradient.array is not None:
+            self.gradient.generate_gradient(refresh_map=False)
+        # jobs are run in order of submitting - refresh after all arrays are regenerated
+        self.scheduler.submit('resize', lambda job: None, on_done=lambda result: self.refresh_displayed())
+
+    def refresh_displayed(self):
+        try:
+            self.displayed_frame.show_array()
+        except AttributeError:
+            self.display_map()
+
+    def save_profile(self):
+        filename = filedialog.asksaveasfilename(parent=self, title="Save profile", defaultextension='.json',
+                                                filetypes=[("Profile", "*.json")])
+        if not filename:
+            return
+        with_arrays = messagebox.askyesno("Save profile", "Save generated arrays too?\n"
+                                                          "Profile is bigger, but it is loaded without generation.",
+                                          parent=self)
+        layer_arrays = [generator.array for generator in self.dynamic_frames] if with_arrays else None
+        gradient_array = self.gradient.array if with_arrays else None
+        # arrays are copied to disk in the background
+        self.scheduler.submit('profile', lambda job: save_profile(filename, self.get_map_spec(), layer_arrays,
+                                                                  gradient_array))
+
+    def load_profile(self):
+        filename = filedialog.askopenfilename(parent=self, title="Load profile", filetypes=[("Profile", "*.json")])
+        if not filename:
+            return
+        try:
+            # arrays are memory-mapped - nothing is read until it is displayed
+            spec, layer_arrays, gradient_array = load_profile(filename)
+        except (OSError, ValueError, KeyError) as error:
+            messagebox.showerror("Load profile", str(error), parent=self)
+            return
+        self.apply_map_spec(spec, layer_arrays, gradient_array)
+
+    def apply_map_spec(self, spec, layer_arrays=None, gradient_array=None):
+        """
+        apply_map_spec - sets all parameters of the sandbox from MapSpec and displays the map.
+        :param spec: MapSpec
+        :param layer_arrays: optional list of arrays of layers (None for layers to be generated)
+        :param gradient_array: optional array of the gradient (generated if None and spec has gradient)
+        :return: None
+        """
+        self.scheduler.cancel()
+        self.MAP_SIZE = spec.map_size
+        self.map_height_entry.set(spec.map_size[0])
+        self.map_width_entry.set(spec.map_size[1])
+        self.offset = spec.offset
+        self.offset_y_entry.set(spec.offset[0])
+        self.offset_x_entry.set(spec.offset[1])
+        self.period = spec.period
+        # period other than size of the map is kept, but checkbox shows only whether the map is tileable
+        self.tileable.set(spec.period is not None)
+        self.hydrology.set(spec.hydrology is not None)
+        if spec.hydrology is not None:
+            self.hydrology_params = dict(spec.hydrology)
+        self.biomes.set(spec.biomes is not None)
+        if spec.biomes is not None:
+            self.biomes_params = dict(spec.biomes)
+        self.levels = spec.levels
+        self.noise_kernel = spec.kernel
+        if np.dtype(self.dtype) != np.dtype(spec.dtype):
+            self.dtype = np.dtype(spec.dtype).type
+            self.composer = MapComposer(self.levels, self.dtype)
+        for slider, level in zip((self.sea_level_slider, self.plains_level_slider, self.hills_level_slider),
+                                 spec.color_levels):
+            slider.set(level)
+
+        for generator in self.dynamic_frames:
+            generator.cancel_generation()
+            generator.release_array()
+            generator.destroy()
+        self.dynamic_frames = []
+        layer_arrays = layer_arrays or [None] * len(spec.layers)
+        for layer, array in zip(spec.layers, layer_arrays):
+            generator_kit = GeneratorKit(self.col2_frame)
+            self.dynamic_frames.append(generator_kit)
+            generator_kit.set_layer(layer)
+            if array is None:
+                generator_kit.generate_array(refresh_map=False)
+            else:
+                generator_kit.set_array((None, array), refresh_map=False)
+        self.group_generation_kits()
+
+        if spec.gradient is None:
+            self.gradient.clear_gradient(refresh_map=False)
+        else:
+            self.gradient.set_gradient_params(spec.gradient)
+            if gradient_array is None:
+                self.gradient.generate_gradient(refresh_map=False)
+            else:
+                self.gradient.set_gradient(gradient_array, refresh_map=False)
+
+        # the whole map is displayed after all arrays are generated
+        self.displayed_frame = self
+        self.scheduler.submit('resize', lambda job: None, on_done=lambda result: self.display_map())
+
+    # Create kit, add it to the list and run grouping method
+    def new_generator_kit(self):
+        # max number of kits controlled with showing/hiding "Add layer" button in grouping method
+        generator_kit = GeneratorKit(self.col2_frame)
+        self.dynamic_frames.append(generator_kit)
+        self.group_generation_kits()
+
+    # regrouping kits in case of creating new or deleting one
+    def group_generation_kits(self):
+        for i in range(len(self.dynamic_frames)):
+            self.dynamic_frames[i].grid(row=i+1, column=0, pady=3, sticky='n')
+        # Add layer button - always at the bottom of list
+        self.make_frame_btn.grid(row=len(self.dynamic_frames)+1)
+        # managing max number of kits, later on will be dependant of window size, or scrollbar will be added
+        if len(self.dynamic_frames) > 4:
+            self.make_frame_btn.grid_remove()
+
+    def get_map_spec(self):
+        # state of the sandbox as MapSpec - the same map can be generated without GUI (see gret_generate)
+        return MapSpec(self.MAP_SIZE, [generator.get_layer() for generator in self.dynamic_frames],
+                       None if self.gradient.array is None else self.gradient.get_gradient(), self.levels,
+                       (self.sea_level_slider.get(), self.plains_level_slider.get(), self.hills_level_slider.get()),
+                       kernel=self.noise_kernel, dtype=np.dtype(self.dtype).name, offset=self.offset,
+                       period=self.period, hydrology=self.hydrology_params if self.hydrology.get() else None,
+                       biomes=self.biomes_params if self.biomes.get() else None)
+
+    # display all arrays, mixed together
+    def display_map(self):
+        # composition itself is run in the background
+        self.scheduler.submit(self, self.compose_map, *self.get_map_state(), on_done=self.show_map)
+
+    def get_map_state(self):
+        # state of widgets needed for composition - read in the GUI thread
+        layers = [(generator, generator.array, float(generator.factor_entry.get()))
+                  for generator in self.dynamic_frames]
+        color_levels = (self.sea_level_slider.get(), self.plains_level_slider.get(), self.hills_level_slider.get())
+        hydrology = dict(self.hydrology_params) if self.hydrology.get() else None
+        biomes = dict(self.biomes_params) if self.biomes.get() else None
+        return layers, self.gradient.array, self.levels, self.MAP_SIZE, color_levels, hydrology, biomes, \
+            self.offset, self.period, self.noise_kernel
+
+    def export_map(self):
+        directory = filedialog.askdirectory(parent=self, title="Export map")
+        if directory:
+            self.scheduler.submit('export', self.export_map_job, directory, *self.get_map_state())
+
+    def export_map_job(self, job, directory, *map_state):
+        heightmap, rgb_map, biome_map = self.compose_heightmap(job, *map_state)
+        if rgb_map is not None:
+            # files are written band by band - the composer's heightmap is not copied
+            save_map(directory, 'map', heightmap, rgb_map, biome_map=biome_map,
+                     formats=('npy', 'png', 'png16') + (() if biome_map is None else ('biomes',)))
+
+    def compose_map(self, job, *map_state):
+        with span('display map'):
+            _, rgb_map, _ = self.compose_heightmap(job, *map_state)
+        if rgb_map is None:
+            return None
+        # tiles are rendered later, from read-only view of the composer's buffer - the next job colors into a new one
+        rgb_map = rgb_map.view()
+        rgb_map.flags.writeable = False
+        return rgb_map
+
+    def compose_heightmap(self, job, layers, gradient, levels, map_size, color_levels, hydrology, biomes, offset,
+                          period, kernel):
+        # only stages affected by changes since the last call are recomputed
+        for generator, array, factor in layers:
+            self.composer.set_layer(generator, array, factor)
+        self.composer.remove_missing_layers([layer[0] for layer in layers])
+        self.composer.set_gradient(gradient)
+        self.composer.set_levels(levels)
+        # eroded map and biomes are computed again for every change, colors of heights are cached by the composer
+        return compose_maps(self.composer, map_size, color_levels, hydrology=hydrology, biomes=biomes, offset=offset,
+                            period=period, progress=job.progress, kernel=kernel)
+
+    def show_map(self, rgb_map):
+        if rgb_map is None:
+            self.viewport.show(None)
+        elif self.viewport.pyramid is not None or self.displayed_frame is self:
+            self.viewport.show(TilePyramid(self.MAP_SIZE, array_source(rgb_map)))
+            self.displayed_frame = self
@@ -0,0 +1,195 @@
+from gret_composite import PARALLEL_SIZE, row_blocks
+from gret_jit import generate_noise_array
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from numpy import add, arange, array, broadcast_arrays, clip, empty, float32, intp, maximum, multiply, rint, select, \
+    shape, take, uint8
+
+# default parameters of climate layers - noise layers as layers of the map (see MapSpec), with other bases
+DEFAULT_CLIMATE_LAYER = dict(scale=600.0, octaves=3, persistence=0.5, base=0.0)
+# default parameters of biome stage (see generate_biome_map)
+DEFAULT_BIOMES = dict(temperature=dict(DEFAULT_CLIMATE_LAYER, scale=900.0, base=101.0),
+                      moisture=dict(DEFAULT_CLIMATE_LAYER, scale=500.0, octaves=4, base=202.0),
+                      lapse_rate=0.35, contrast=1.5)
+# biomes - id of the biome is its index (biome map is uint8)
+BIOMES = (('deep ocean', (25, 45, 115)),
+          ('ocean', (40, 80, 165)),
+          ('beach', (225, 210, 155)),
+          ('desert', (215, 185, 120)),
+          ('savanna', (175, 170, 85)),
+          ('tropical forest', (45, 125, 40)),
+          ('grassland', (135, 175, 80)),
+          ('temperate forest', (65, 135, 60)),
+          ('rainforest', (30, 95, 60)),
+          ('taiga', (75, 110, 85)),
+          ('tundra', (155, 160, 130)),
+          ('bare rock', (125, 115, 105)),
+          ('snow', (240, 240, 245)))
+DEEP_OCEAN, OCEAN, BEACH, DESERT, SAVANNA, TROPICAL_FOREST, GRASSLAND, TEMPERATE_FOREST, RAINFOREST, TAIGA, \
+    TUNDRA, BARE_ROCK, SNOW = range(len(BIOMES))
+# number of steps of temperature and moisture in lookup table
+CLIMATE_STEPS = 64
+# number of elements of a block of rows classified at once (with its climate noise)
+BIOME_BLOCK = 1 << 18
+
+
+def biome_palette(brightness=1):
+    """
+    biome_palette - colors of biomes, indexed by id of the biome.
+    :param brightness: brightness of colors (range from 0 to 1)
+    :return: array of RGB elements (uint8)
+    """
+    brightness = brightness if 0 <= brightness <= 1 else 1
+    return (array([color for _, color in BIOMES], dtype=float) * brightness).astype(uint8)
+
+
+def absolute_levels(color_levels):
+    # relative sea, plains and hills levels (see build_color_lut) as heights of the heightmap
+    levels = [x if 0 <= x <= 1 else 0 for x in color_levels]
+    for i in range(1, len(levels)):
+        levels[i] = levels[i] * (1 - levels[i - 1]) + levels[i - 1]
+    return levels
+
+
+def whittaker_biomes(temperature, moisture):
+    # biomes of land by temperature and moisture (0-1), like Whittaker's diagram
+    return select([temperature < 0.1, temperature < 0.22, (temperature < 0.4) & (moisture < 0.35),
+                   temperature < 0.4,
+                   (temperature < 0.7) & (moisture < 0.2), (temperature < 0.7) & (moisture < 0.45),
+                   (temperature < 0.7) & (moisture < 0.75), temperature < 0.7,
+                   moisture < 0.35, moisture < 0.6],
+                  [SNOW, TUNDRA, TUNDRA, TAIGA, DESERT, GRASSLAND, TEMPERATE_FOREST, RAINFOREST, DESERT, SAVANNA],
+                  TROPICAL_FOREST)
+
+
+def build_biome_lut(levels=32, color_levels=(0.3, 0.5, 0.5), lapse_rate=0.35, contrast=1.5, steps=CLIMATE_STEPS):
+    """
+    build_biome_lut - lookup table of biomes for every level of quantized heightmap, temperature and moisture.
+    All the per-pixel math (climate contrast, cooling with altitude, classification) is done here, once per entry,
+    so the classification of the map is only indexing of the table.
+    :param levels: number of levels of quantized heightmap
+    :param color_levels: sea, plains and hills levels - below the sea is ocean, above hills are mountains
+    :param lapse_rate: how much colder are the highest mountains than the coast (0-1)
+    :param contrast: stretch of climate noise around its middle (fractal noise rarely gets close to -1 or 1)
+    :param steps: number of steps of temperature and moisture
+    :return: uint8 array of ids of biomes (levels + 1, steps, steps) - [height, temperature, moisture]
+    """
+    sea, _, hills = (absolute_levels(color_levels) + [1.0, 1.0])[:3]
+    heights = (arange(levels + 1) / levels)[:, None, None]
+    # climate noise (-1 to 1) of every step, stretched and clipped to 0-1
+    climate = clip(0.5 + contrast * (arange(steps) / (steps - 1) - 0.5), 0, 1)
+    # the higher above the sea, the colder
+    altitude = maximum(heights - sea, 0) / max(1 - sea, 1e-9)
+    heights, temperature, moisture = broadcast_arrays(heights, climate[None, :, None] - lapse_rate * altitude,
+                                                      climate[None, None, :])
+    lut = select([heights < sea * 0.6, heights <= sea, (heights > hills) & (temperature < 0.3), heights > hills,
+                  (heights <= sea + 1.0 / levels) & (temperature >= 0.3)],
+                 [DEEP_OCEAN, OCEAN, SNOW, BARE_ROCK, BEACH], whittaker_biomes(temperature, moisture))
+    return lut.astype(uint8)
+
+
+def climate_indexes(noise, steps, out):
+    # climate noise (-1 to 1) into indexes of steps of lookup table
+    multiply(add(noise, 1, dtype=float32), (steps - 1) / 2, out=out)
+    rint(out, out=out)
+    clip(out, 0, steps - 1, out=out)
+    return out.astype(intp)
+
+
+def classify_biomes(heightmap, temperature, moisture, lut, out=None):
+    """
+    classify_biomes - biomes of every cell, from lookup table (see build_biome_lut).
+    :param heightmap: 2D heightmap (quantized, 0-1)
+    :param temperature: climate noise (-1 to 1) of the same shape
+    :param moisture: climate noise (-1 to 1) of the same shape
+    :param lut: lookup table of biomes
+    :param out: optional uint8 array of the same shape for the output
+    :return: uint8 array of ids of biomes
+    """
+    if out is None:
+        out = empty(shape(heightmap), dtype=uint8)
+    levels, steps = lut.shape[0] - 1, lut.shape[1]
+    buffer = empty(shape(heightmap), dtype=float32)
+    # flat index of the table: (height * steps + temperature) * steps + moisture
+    multiply(heightmap, levels, out=buffer, casting='unsafe')
+    rint(buffer, out=buffer)
+    clip(buffer, 0, levels, out=buffer)
+    index = buffer.astype(intp)
+    index *= steps
+    index += climate_indexes(temperature, steps, buffer)
+    index *= steps
+    index += climate_indexes(moisture, steps, buffer)
+    take(lut.ravel(), index, out=out)
+    return out
+
+
+def climate_noise(layer, shape, offset, period, kernel='numpy'):
+    # raw climate noise (-1 to 1) - a function of position only, so tiles and windows of the world fit together,
+    # generated by the kernel of layers of the map in one thread (blocks of rows are generated by threads)
+    params = dict(scale=float(layer['scale']), octaves=int(layer['octaves']), persistence=float(layer['persistence']),
+                  base=float(layer['base']))
+    return generate_noise_array(shape, kernel, float32, workers=1, offset=offset, period=period, **params)
+
+
+def generate_biome_map(heightmap, biomes=None, levels=32, color_levels=(0.3, 0.5, 0.5), offset=(0, 0), period=None,
+                       out=None, workers=None, kernel='numpy'):
+    """
+    generate_biome_map - biome of every cell of the map, from its height and climate - temperature and moisture
+    noise layers (temperature falls with altitude). Climate noise is generated block by block of rows, each block
+    classified by lookup table at once, so no float array of size of the map is allocated (out may be memory-mapped).
+    Climate is a function of position in the noise plane, so tiles of bigger map (offset) fit together.
+    :param heightmap: 2D heightmap quantized into levels (0-1)
+    :param biomes: dictionary with temperature and moisture layers, lapse_rate and contrast (see DEFAULT_BIOMES)
+    :param levels: number of levels of quantized heightmap
+    :param color_levels: sea, plains and hills levels
+    :param offset: (row, column) of the heightmap in infinite noise plane
+    :param period: optional (rows, columns) after which noise repeats (tileable map)
+    :param out: optional uint8 array of the same shape for the output
+    :param workers: number of threads (all cores by default)
+    :param kernel: noise kernel of climate layers - 'numpy', 'snoise2' or 'numba' (see gret_core.generate_layer)
+    :return: uint8 array of ids of biomes (see BIOMES)
+    """
+    biomes = dict(DEFAULT_BIOMES, **(biomes or {}))
+    if out is None:
+        out = empty(shape(heightmap), dtype=uint8)
+    lut = build_biome_lut(levels, color_levels, biomes['lapse_rate'], biomes['contrast'])
+    map_size = shape(heightmap)
+
+    def classify(block):
+        start, stop = block
+        block_shape = (stop - start, map_size[1])
+        block_offset = (offset[0] + start, offset[1])
+        classify_biomes(heightmap[start:stop],
+                        climate_noise(biomes['temperature'], block_shape, block_offset, period, kernel),
+                        climate_noise(biomes['moisture'], block_shape, block_offset, period, kernel), lut,
+                        out=out[start:stop])
+
+    blocks = row_blocks(map_size, BIOME_BLOCK)
+    workers = workers or cpu_count()
+    if workers == 1 or len(blocks) == 1 or heightmap.size < PARALLEL_SIZE:
+        for block in blocks:
+            classify(block)
+    else:
+        with ThreadPool(min(workers, len(blocks))) as pool:
+            pool.map(classify, blocks)
+    return out
+
+
+def convert_biomes_into_RGB(biome_map, brightness=1, out=None, overlays=None):
+    """
+    convert_biomes_into_RGB - colors of biomes from the palette (see biome_palette).
+    :param biome_map: uint8 array of ids of biomes
+    :param brightness: brightness of colors (range from 0 to 1)
+    :param out: optional uint8 array of shape (rows, columns, 3) for the output
+    :param overlays: optional list of (boolean mask, (R, G, B)) painted over the colors in order
+                     (e.g. gret_hydrology.water_overlays)
+    :return: RGB array (uint8)
+    """
+    if out is None:
+        out = empty((shape(biome_map)[0], shape(biome_map)[1], 3), dtype=uint8)
+    brightness = brightness if 0 <= brightness <= 1 else 1
+    take(biome_palette(brightness), biome_map, axis=0, out=out)
+    # overlays are as bright as the colors under them
+    for mask, color in overlays or ():
+        out[mask] = [int(channel * brightness) for channel in color]
+    return out
@@ -0,0 +1,100 @@
+from hashlib import sha1
+from json import dumps
+from numpy import load, save
+from os import fdopen, listdir, makedirs, path, remove, replace, stat, utime
+from tempfile import mkstemp
+
+# version of generation algorithm - change it when output of generation changes, so old entries are not used
+CACHE_VERSION = 1
+
+
+class LayerCache(object):
+    """
+    LayerCache - content-addressed on-disk cache of generated arrays.
+    Array is stored as .npy file named by hash of parameters it was generated from,
+    and loaded as read-only memory-mapped array (only used parts of it are read from disk).
+    Least recently used files are removed when size of the cache exceeds max_bytes.
+    """
+    def __init__(self, directory, max_bytes=2 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(**params):
+        """
+        key - hash of parameters of the array.
+        :param params: all parameters the array is a pure function of (size, noise parameters, kernel...)
+        :return: hex digest
+        """
+        params['cache_version'] = CACHE_VERSION
+        return sha1(dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+    def filename(self, key):
+        return path.join(self.directory, key + '.npy')
+
+    def load(self, key):
+        """
+        load - memory-mapped array for given key.
+        :param key: key of the array
+        :return: read-only array or None if there is no such entry
+        """
+        filename = self.filename(key)
+        try:
+            array = load(filename, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        # mark as recently used - the file may be evicted meanwhile (by another thread), the mapped array stays valid
+        try:
+            utime(filename)
+        except OSError:
+            pass
+        return array
+
+    def store(self, key, array):
+        """
+        store - saves array in the cache and removes least recently used entries if cache is too big.
+        :param key: key of the array
+        :param array: array to be saved
+        :return: None
+        """
+        handle, tmp_filename = mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with fdopen(handle, 'wb') as file:
+                save(file, array)
+            # readers never see partially written file
+            replace(tmp_filename, self.filename(key))
+        except BaseException:
+            remove(tmp_filename)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        evict - removes least recently used entries until size of the cache fits max_bytes.
+        :return: None
+        """
+        entries = []
+        for name in listdir(self.directory):
+            if name.endswith('.npy'):
+                filename = path.join(self.directory, name)
+                try:
+                    file_stat = stat(filename)
+                except OSError:
+                    continue
+                entries.append((file_stat.st_mtime, file_stat.st_size, filename))
+        total = sum(entry[1] for entry in entries)
+        for _, size, filename in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                # on POSIX, arrays already mapping the file are still valid
+                remove(filename)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for name in listdir(self.directory):
+            if name.endswith('.npy'):
+                remove(path.join(self.directory, name))
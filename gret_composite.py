@@ -0,0 +1,270 @@
+from gret_convert import convert_heightmap_into_RGB
+from gret_trace import span
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from numpy import amax, amin, clip, divide, empty, float32, multiply, shape, subtract, trunc, uint8
+
+# number of elements of a block of rows processed at once - all arrays of the block fit in CPU cache
+BLOCK_SIZE = 1 << 16
+# smaller maps are composed by one thread (starting threads takes longer than the work)
+PARALLEL_SIZE = 1 << 20
+
+
+def row_blocks(map_size, block_size=BLOCK_SIZE):
+    """
+    row_blocks - divides map into blocks of whole rows, of about block_size elements.
+    :param map_size: size of the map (rows, columns)
+    :param block_size: number of elements of a block
+    :return: list of (first row, last row + 1) tuples
+    """
+    rows = max(1, block_size // max(1, map_size[1]))
+    return [(row, min(row + rows, map_size[0])) for row in range(0, map_size[0], rows)]
+
+
+class MapComposer(object):
+    """
+    MapComposer - cached composition of the map from layers, gradient and colors.
+    Stages of the composition (each one cached separately):
+     - weighted sum: sum of layers multiplied by their factors
+     - masked map: weighted sum multiplied by the gradient
+     - quantized map: masked map normalized to 0-1 and quantized into levels
+     - RGB map: colors of quantized map for sea, plains and hills levels (new array for every change)
+    Change recomputes only stages depending on it - new factor of the layer is applied as a delta
+    to the weighted sum, change of color levels only recolors quantized map.
+    Stages are fused - weighted sum, gradient and minimum/maximum are computed in one pass over blocks
+    of rows (small enough to stay in CPU cache), quantization in the second one. Blocks of big maps
+    are processed by threads (numpy releases the GIL). No temporary array of size of the map is allocated.
+    All buffers are of given dtype (float32 by default - map is quantized into levels anyway).
+    Masked map is normalized by its minimum and maximum, or by fixed value range (for windows of the world,
+    which have to fit together).
+    """
+    def __init__(self, levels=32, dtype=float32, workers=None, value_range=None):
+        self.levels = levels
+        self.dtype = dtype
+        # number of threads for big maps (all cores by default)
+        self.workers = workers or cpu_count()
+        # optional fixed (minimum, maximum) of masked map
+        self.value_range = value_range
+        # key -> (array, factor) of layers included in the weighted sum
+        self.layers = {}
+        self.gradient = None
+
+        self.weighted_sum = None
+        self.masked_map = None
+        self.quantized_map = None
+        self.rgb_map = None
+        # minimum and maximum of masked map (found during its computation)
+        self.masked_range = None
+        # validity of stages
+        self.sum_valid = False
+        self.masked_valid = False
+        self.quantized_valid = False
+        self.color_levels = None
+
+    def set_layer(self, key, array, factor):
+        """
+        set_layer - adds, updates or removes (if array is None) layer of the map.
+        :param key: any hashable object identifying the layer (e.g. generator kit)
+        :param array: array of the layer
+        :param factor: contribution of the layer in the whole map
+        :return: None
+        """
+        old = self.layers.get(key)
+        if array is None:
+            if old is not None:
+                del self.layers[key]
+                self.invalidate_sum()
+            return
+        self.layers[key] = (array, factor)
+        if old is None or old[0] is not array:
+            self.invalidate_sum()
+        elif old[1] != factor and self.sum_valid:
+            # only factor changed - apply the difference to the cached sum
+            self.map_blocks(lambda block: self.add_layer_block(block, array, factor - old[1]), shape(array))
+            self.masked_valid = False
+
+    def remove_missing_layers(self, keys):
+        """
+        remove_missing_layers - removes layers which keys are not in given collection.
+        :param keys: keys of existing layers
+        :return: None
+        """
+        for key in [key for key in self.layers if key not in keys]:
+            self.set_layer(key, None, 0)
+
+    def set_gradient(self, array):
+        if array is not self.gradient:
+            self.gradient = array
+            self.masked_valid = False
+
+    def set_levels(self, levels):
+        if levels != self.levels:
+            self.levels = levels
+            self.quantized_valid = False
+
+    def invalidate_sum(self):
+        self.sum_valid = False
+        self.masked_valid = False
+
+    def map_blocks(self, function, map_size):
+        """
+        map_blocks - calls function for every block of rows of the map, by threads for big maps.
+        :param function: function(block) of (first row, last row + 1) of the block
+        :param map_size: size of the map
+        :return: list of results, in order of blocks
+        """
+        blocks = row_blocks(map_size)
+        if self.workers == 1 or len(blocks) == 1 or map_size[0] * map_size[1] < PARALLEL_SIZE:
+            return [function(block) for block in blocks]
+        with ThreadPool(min(self.workers, len(blocks))) as pool:
+            return pool.map(function, blocks)
+
+    def add_layer_block(self, block, array, factor):
+        # factor * array added to the weighted sum (block of rows)
+        start, stop = block
+        scratch = empty((stop - start,) + shape(array)[1:], dtype=self.dtype)
+        multiply(array[start:stop], factor, out=scratch)
+        self.weighted_sum[start:stop] += scratch
+
+    def compose_block(self, block, layers, gradient, compute_sum):
+        """
+        compose_block - fused stages of one block of rows: weighted sum of layers (if needed)
+        and masked map (weighted sum multiplied by the gradient).
+        :param block: (first row, last row + 1)
+        :param layers: list of (array, factor) of layers
+        :param gradient: array of the gradient or None
+        :param compute_sum: False - cached weighted sum is valid
+        :return: tuple of minimum and maximum of weighted sum and minimum and maximum of masked map
+        """
+        start, stop = block
+        weighted_sum = self.weighted_sum[start:stop]
+        if compute_sum:
+            weighted_sum[:] = 0
+            scratch = empty(shape(weighted_sum), dtype=self.dtype)
+            for array, factor in layers:
+                # the only place of using 'factor' parameter - it wages influence of each array
+                multiply(array[start:stop], factor, out=scratch)
+                weighted_sum += scratch
+        masked_map = self.masked_map[start:stop]
+        if gradient is not None:
+            multiply(weighted_sum, gradient[start:stop], out=masked_map)
+        else:
+            masked_map[:] = weighted_sum
+        return amin(weighted_sum), amax(weighted_sum), amin(masked_map), amax(masked_map)
+
+    def normalize_block(self, block, low, high):
+        # masked map normalized to 0-1, in double precision - levels are the same as for float64 arrays
+        start, stop = block
+        band = subtract(self.masked_map[start:stop], low, dtype=float)
+        if high - low != 0:
+            divide(band, high - low, out=band)
+        if self.value_range is not None:
+            # values out of fixed range (if any) are in the lowest or the highest level
+            clip(band, 0, 1, out=band)
+        return band
+
+    def quantize_block(self, block, low, high):
+        # normalize values to 0-levels (in the same order as before caching)
+        start, stop = block
+        band = self.normalize_block(block, low, high)
+        band *= self.levels
+        trunc(band, out=band)
+        # rescale to 0-1 for colorful topology map
+        band /= self.levels
+        self.quantized_map[start:stop] = band
+
+    def get_quantized_map(self, map_size, progress=None):
+        """
+        get_quantized_map - map normalized into 0-1 range and quantized into levels.
+        :param map_size: size of the map (layers of different size are not included)
+        :param progress: optional function(done, total) called after each stage
+        :return: quantized map or None if map is flat (or has no layers)
+        """
+        map_size = tuple(map_size)
+        layers = {key: value for key, value in self.layers.items() if shape(value[0]) == map_size}
+        if len(layers) != len(self.layers):
+            self.layers = layers
+            self.invalidate_sum()
+        if self.weighted_sum is None or shape(self.weighted_sum) != map_size:
+            self.weighted_sum = empty(map_size, dtype=self.dtype)
+            self.invalidate_sum()
+        if progress is not None:
+            progress(1, 4)
+        if not self.masked_valid:
+            if self.masked_map is None or shape(self.masked_map) != map_size:
+                self.masked_map = empty(map_size, dtype=self.dtype)
+            # gradient of different size is not applied
+            gradient = self.gradient if self.gradient is not None and shape(self.gradient) == map_size else None
+            layers = list(self.layers.values())
+            compute_sum = not self.sum_valid
+            # pass 1 - weighted sum and masked map, with their minimum and maximum
+            with span('compose', layers=len(layers), gradient=gradient is not None, sum=compute_sum):
+                ranges = self.map_blocks(lambda block: self.compose_block(block, layers, gradient, compute_sum),
+                                         map_size)
+            self.sum_valid = True
+            if self.value_range is not None:
+                self.masked_range = self.value_range if self.value_range[1] > self.value_range[0] else None
+            elif max(block_range[1] for block_range in ranges) == min(block_range[0] for block_range in ranges):
+                # flat map
+                self.masked_range = None
+            else:
+                self.masked_range = (float(min(block_range[2] for block_range in ranges)),
+                                     float(max(block_range[3] for block_range in ranges)))
+            self.masked_valid = True
+            self.quantized_valid = False
+        if progress is not None:
+            progress(2, 4)
+        if not self.quantized_valid:
+            self.color_levels = None
+            if self.masked_range is None:
+                self.quantized_map = None
+            else:
+                if self.quantized_map is None or shape(self.quantized_map) != map_size:
+                    self.quantized_map = empty(map_size, dtype=self.dtype)
+                # pass 2 - quantization
+                with span('quantize', levels=self.levels):
+                    self.map_blocks(lambda block: self.quantize_block(block, *self.masked_range), map_size)
+            self.quantized_valid = True
+        if progress is not None:
+            progress(3, 4)
+        return self.quantized_map
+
+    def get_normalized_map(self, map_size, progress=None):
+        """
+        get_normalized_map - map normalized into 0-1 range, not quantized (e.g. for erosion, see gret_hydrology).
+        :param map_size: size of the map
+        :param progress: optional function(done, total) called after each stage
+        :return: new array of the map or None if map is flat (or has no layers)
+        """
+        if self.get_quantized_map(map_size, progress) is None:
+            return None
+        normalized_map = empty(tuple(map_size), dtype=self.dtype)
+
+        def normalize(block):
+            normalized_map[block[0]:block[1]] = self.normalize_block(block, *self.masked_range)
+        with span('normalize map'):
+            self.map_blocks(normalize, map_size)
+        return normalized_map
+
+    def get_rgb_map(self, map_size, color_levels, progress=None, brightness=1):
+        """
+        get_rgb_map - colors of the quantized map.
+        :param map_size: size of the map
+        :param color_levels: sea, plains and hills levels
+        :param brightness: brightness of colors (range from 0 to 1)
+        :param progress: optional function(done, total) called after each stage
+        :return: RGB map (uint8) or None if map is flat (or has no layers) - it is not changed by later calls
+        """
+        quantized_map = self.get_quantized_map(map_size, progress)
+        if quantized_map is None:
+            return None
+        if self.color_levels != (tuple(color_levels), brightness):
+            # colors are written into a fresh buffer - the previous RGB map may still be displayed (see gret_app)
+            self.rgb_map = empty((map_size[0], map_size[1], 3), dtype=uint8)
+            # map is quantized into 'levels' steps, so the same number of steps of color table gives exact colors
+            # with fixed value range, quantized map may not reach 0 or 1 - colors of levels are kept anyway
+            convert_heightmap_into_RGB(quantized_map, brightness=brightness, levels=list(color_levels),
+                                       steps=self.levels, out=self.rgb_map,
+                                       value_range=None if self.value_range is None else (0.0, 1.0))
+            self.color_levels = (tuple(color_levels), brightness)
+        return self.rgb_map
@@ -1,29 +1,23 @@
-from numpy import shape, zeros, amin, uint8
+from gret_trace import span
+from numpy import arange, amin, amax, divide, empty, intp, multiply, rint, shape, subtract, take, trunc, uint8, zeros
 
+# default number of steps of color lookup table - colors are exact for heightmaps quantized
+# into number of levels dividing it (like 32 levels of the sandbox), close enough for others
+LUT_STEPS = 4096
+# number of rows converted at once - keeps temporary arrays small
+BAND_ROWS = 256
 
-def convert_heightmap_into_RGB(heightmap, brightness=1, levels=None, rgb_dict=None):
+
+def build_color_lut(brightness=1, levels=None, rgb_dict=None, steps=LUT_STEPS):
     """
-    convert_heightmap_into_RGB - converter of 2D array of float values into same size 2D array of [R,G,B] elements
-    :param heightmap: 2D heightmap
+    build_color_lut - lookup table of colors for heightmap values from 0 to 1.
+    Colors are computed for values: 0, 1/steps, 2/steps, ..., 1.
     :param brightness: brightness of colors for output (range from 0 to 1)
-    :param levels: relative points of next levels for color gradient change
-                    from 0 - 1 (values out of range are normalized)
-                    Don't put 0 at the start as basic 0 level
-    :param rgb_dict: dictionary with tuples for levels for each color
-                    each tuple represents (multiplier for heightmap values, offset for multiplied values)
-                    Default setup for dictionary:
-                    'R': [(2, -1), (0.95, -0.3), (0.1, 0.65), (-0.75, 0.75)],
-                    'G': [(1, 0), (0.55, 0.1), (-0.25, 0.65), (-0.4, 0.4)],
-                    'B': [(2, 0), (0, 0), (0, 0), (0, 0)]
-                    Each tuple is corresponding to each level from [0-level1-level2-...-1] list
-    :return: 2D array of same size as heightmap, with RGB elements ([R, G, B])
+    :param levels: relative points of next levels for color gradient change (see convert_heightmap_into_RGB)
+    :param rgb_dict: dictionary with tuples for levels for each color (see convert_heightmap_into_RGB)
+    :param steps: number of steps of the table
+    :return: array of (steps + 1) RGB elements (uint8)
     """
-    try:
-        heightmap[2, 2]
-    except IndexError:
-        print("Shape of the heightmap need to be greater than (1x1)")
-        return None
-
     # default values
     if levels is None:
         levels = [0.3, 0.5, 0.5]
@@ -36,11 +30,6 @@ def convert_heightmap_into_RGB(heightmap, brightness=1, levels=None, rgb_dict=No
             'B': [(2, 0), (0, 0), (0, 0), (0, 0)]
         }
 
-    if heightmap.ptp() == 0:
-        return zeros((shape(heightmap)[0], shape(heightmap)[1], 3), dtype=uint8)
-    # normalize heightmap values to be in range 0-1
-    heightmap = (heightmap.astype(float) - amin(heightmap)) / heightmap.ptp()
-
     # convert relative values of levels into absolute values between 0-1
     if len(levels) > 1:
         for i in range(1, len(levels)):
@@ -52,29 +41,104 @@ def convert_heightmap_into_RGB(heightmap, brightness=1, levels=None, rgb_dict=No
     # that assures that colors are properly displayed
     brightness = brightness if 0 <= brightness <= 1 else 1
 
-    RGB_map = zeros((shape(heightmap)[0], shape(heightmap)[1], 3), dtype=float)
-
+    values = arange(steps + 1) / steps
+    lut = zeros((steps + 1, 3), dtype=float)
     for i in range(1, len(levels)):
-        basic_map = heightmap.copy()
-        basic_map[heightmap > levels[i]] = levels[i]
-        basic_map[heightmap < levels[i-1]] = levels[i-1]
-        if basic_map.ptp() != 0:
-            basic_map = (basic_map - amin(basic_map)) / basic_map.ptp()
-        for key in rgb_dict:
+        basic_map = values.copy()
+        basic_map[values > levels[i]] = levels[i]
+        basic_map[values < levels[i-1]] = levels[i-1]
+        # values are in range 0-1, so level's values are between its borders
+        if levels[i] - levels[i-1] != 0:
+            basic_map = (basic_map - levels[i-1]) / (levels[i] - levels[i-1])
+        for channel, key in enumerate(('R', 'G', 'B')):
+            if key not in rgb_dict:
+                continue
             tmp_map = basic_map * rgb_dict[key][i-1][0] + rgb_dict[key][i-1][1]
             # going over 0-1 range causes glitches with colors
             tmp_map[tmp_map < 0] = 0
             tmp_map[tmp_map > 1] = 1
             # zero values out of level so all of them can be added easily
-            tmp_map[heightmap > levels[i]] = 0
-            tmp_map[heightmap <= levels[i-1]] = 0
-            if key == 'R':
-                RGB_map[:, :, 0] += tmp_map
-            elif key == 'G':
-                RGB_map[:, :, 1] += tmp_map
-            elif key == 'B':
-                RGB_map[:, :, 2] += tmp_map
+            tmp_map[values > levels[i]] = 0
+            tmp_map[values <= levels[i-1]] = 0
+            lut[:, channel] += tmp_map
+
+    lut *= brightness * 255
 
-    RGB_map *= brightness * 255
+    return lut.astype(uint8)
 
-    return RGB_map.astype(uint8)
+
+def convert_heightmap_into_RGB(heightmap, brightness=1, levels=None, rgb_dict=None, value_range=None,
+                               steps=LUT_STEPS, out=None, overlays=None):
+    """
+    convert_heightmap_into_RGB - converter of 2D array of float values into same size 2D array of [R,G,B] elements
+    Heightmap is quantized once and mapped through lookup table of colors (see build_color_lut).
+    :param heightmap: 2D heightmap
+    :param brightness: brightness of colors for output (range from 0 to 1)
+    :param levels: relative points of next levels for color gradient change
+                    from 0 - 1 (values out of range are normalized)
+                    Don't put 0 at the start as basic 0 level
+    :param rgb_dict: dictionary with tuples for levels for each color
+                    each tuple represents (multiplier for heightmap values, offset for multiplied values)
+                    Default setup for dictionary:
+                    'R': [(2, -1), (0.95, -0.3), (0.1, 0.65), (-0.75, 0.75)],
+                    'G': [(1, 0), (0.55, 0.1), (-0.25, 0.65), (-0.4, 0.4)],
+                    'B': [(2, 0), (0, 0), (0, 0), (0, 0)]
+                    Each tuple is corresponding to each level from [0-level1-level2-...-1] list
+    :param value_range: (minimum, maximum) of the whole heightmap - needed when converting tiles of bigger map,
+                    so all tiles are normalized the same way (by default taken from given heightmap)
+    :param steps: number of steps of the lookup table - for heightmap quantized into N levels,
+                    N (or its multiple) gives exactly the same colors as computing them pixel by pixel
+    :param out: optional uint8 array of shape (rows, columns, 3) for the output
+    :param overlays: optional list of (boolean mask, (R, G, B)) painted over the colors in order,
+                    e.g. lakes and rivers (see gret_hydrology.water_overlays)
+    :return: 2D array of same size as heightmap, with RGB elements ([R, G, B])
+    """
+    try:
+        heightmap[2, 2]
+    except IndexError:
+        print("Shape of the heightmap need to be greater than (1x1)")
+        return None
+
+    if out is None:
+        out = empty((shape(heightmap)[0], shape(heightmap)[1], 3), dtype=uint8)
+    if value_range is None:
+        value_range = (amin(heightmap), amax(heightmap))
+    if value_range[1] - value_range[0] == 0:
+        out[:] = 0
+        return out
+
+    with span('colorize', shape=shape(heightmap), overlays=len(overlays or ())):
+        lut = build_color_lut(brightness, levels, rgb_dict, steps)
+        # overlays are as bright as the colors under them
+        overlays = [(mask, [int(channel * (brightness if 0 <= brightness <= 1 else 1)) for channel in color])
+                    for mask, color in overlays or ()]
+        # normalize heightmap values into indexes of lookup table - band by band
+        factor = steps / (value_range[1] - value_range[0])
+        for row in range(0, shape(heightmap)[0], BAND_ROWS):
+            band = subtract(heightmap[row:row + BAND_ROWS], value_range[0], dtype=float)
+            multiply(band, factor, out=band)
+            rint(band, out=band)
+            take(lut, band.astype(intp), axis=0, out=out[row:row + BAND_ROWS], mode='clip')
+            for mask, color in overlays:
+                out[row:row + BAND_ROWS][mask[row:row + BAND_ROWS]] = color
+    return out
+
+
+def convert_heightmap_into_gray(heightmap, levels=32, out=None):
+    """
+    convert_heightmap_into_gray - heightmap (values 0-1) quantized into levels and rescaled to 0-255 (grayscale).
+    Computed band by band, so no full-size temporary arrays are allocated.
+    :param heightmap: 2D heightmap with values from 0 to 1
+    :param levels: number of levels of quantization
+    :param out: optional uint8 array of the same shape as heightmap, for the output
+    :return: uint8 array of grayscale values
+    """
+    if out is None:
+        out = empty(shape(heightmap), dtype=uint8)
+    for row in range(0, shape(heightmap)[0], BAND_ROWS):
+        band = multiply(heightmap[row:row + BAND_ROWS], levels, dtype=float)
+        trunc(band, out=band)
+        divide(band, levels, out=band)
+        band *= 255
+        out[row:row + BAND_ROWS] = band
+    return out
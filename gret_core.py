@@ -0,0 +1,429 @@
+from copy import deepcopy
+from functools import partial
+from gret_biomes import DEFAULT_BIOMES, biome_palette, convert_biomes_into_RGB, generate_biome_map
+from gret_cache import LayerCache
+from gret_composite import MapComposer
+from gret_export import export_chunked, export_npy, export_png, export_xyz_tiles
+from gret_convert import convert_heightmap_into_RGB
+from gret_gradient import gradient_tile
+from gret_hydrology import DEFAULT_HYDROLOGY, apply_hydrology, water_overlays
+from gret_jit import effective_kernel, generate_noise_array
+from gret_noise import generate_mapped_noise_array, release_mapped_file
+from gret_trace import span
+from numpy import amax, amin, dtype as np_dtype, float32, trunc
+from os import makedirs, path
+
+# default parameters of noise layer (the same as in generator kit of the sandbox)
+DEFAULT_LAYER = dict(scale=400.0, octaves=6, persistence=0.5, base=0.0, factor=1.0)
+# default parameters of gradient (the same as in gradient kit of the sandbox)
+DEFAULT_GRADIENT = dict(min_value_radius=0.0, max_value_radius=1.0, pattern='circle')
+# formats of saved maps (see save_map)
+EXPORT_FORMATS = ('npy', 'png', 'png16', 'chunked', 'xyz', 'biomes')
+DEFAULT_FORMATS = ('npy', 'png')
+
+
+class MapSpec(object):
+    """
+    MapSpec - full description of the map, the map is a pure function of it.
+    Parameters:
+     - map_size: size of the map (rows, columns)
+     - layers: list of dictionaries with noise parameters (scale, octaves, persistence, base) and factor
+     - gradient: dictionary with min_value_radius, max_value_radius and pattern, or None for no gradient
+     - levels: number of levels of quantized heightmap
+     - color_levels: sea, plains and hills levels for colorization
+     - brightness: brightness of colors (range from 0 to 1)
+     - kernel: 'numpy' - vectorized noise, 'snoise2' - noise computed pixel by pixel,
+       'numba' - compiled noise (snoise2 if Numba is not installed, see gret_jit) - of layers and climate of biomes
+     - dtype: type of arrays of the whole pipeline - 'float32' (default) or 'float64'
+     - offset: (row, column) of the map in infinite noise plane - the map is a window of the world
+     - period: optional (rows, columns) after which noise repeats - tileable maps (e.g. map_size)
+     - fixed_range: False - layers and heightmap are normalized by their minimum and maximum,
+       True - by fixed range of noise, so adjacent windows of the world fit together without seams
+     - hydrology: dictionary with parameters of erosion, rivers and lakes (see gret_hydrology.apply_hydrology),
+       or None for no hydrology - it is computed for the whole map (a window of the world gets its own rivers)
+     - biomes: dictionary with temperature and moisture noise layers, lapse_rate and contrast
+       (see gret_biomes.DEFAULT_BIOMES), or None - the map is colored by biomes instead of height only
+    Missing parameters of layers, gradient, hydrology and biomes are filled with defaults.
+    """
+    def __init__(self, map_size=(800, 800), layers=None, gradient=None, levels=32, color_levels=(0.3, 0.5, 0.5),
+                 brightness=1, kernel='numpy', dtype='float32', offset=(0, 0), period=None, fixed_range=False,
+                 hydrology=None, biomes=None):
+        self.map_size = (int(map_size[0]), int(map_size[1]))
+        self.layers = [dict(DEFAULT_LAYER, **layer) for layer in ([{}] if layers is None else layers)]
+        self.gradient = None if gradient is None else dict(DEFAULT_GRADIENT, **gradient)
+        self.levels = int(levels)
+        self.color_levels = tuple(float(level) for level in color_levels)
+        self.brightness = float(brightness)
+        self.kernel = kernel
+        self.dtype = np_dtype(dtype).name
+        self.offset = (int(offset[0]), int(offset[1]))
+        self.period = None if period is None else (int(period[0]), int(period[1]))
+        self.fixed_range = bool(fixed_range)
+        self.hydrology = None if hydrology is None else dict(DEFAULT_HYDROLOGY, **hydrology)
+        self.biomes = None
+        if biomes is not None:
+            self.biomes = dict(DEFAULT_BIOMES, **biomes)
+            for name in ('temperature', 'moisture'):
+                self.biomes[name] = dict(DEFAULT_BIOMES[name], **self.biomes[name])
+
+        checked = [('layer', layer, DEFAULT_LAYER) for layer in self.layers] \
+            + [('gradient', self.gradient or {}, DEFAULT_GRADIENT),
+               ('hydrology', self.hydrology or {}, DEFAULT_HYDROLOGY), ('biomes', self.biomes or {}, DEFAULT_BIOMES)]
+        if self.biomes is not None:
+            checked += [(name, self.biomes[name], DEFAULT_BIOMES[name]) for name in ('temperature', 'moisture')]
+        for name, params, defaults in checked:
+            unknown = set(params) - set(defaults)
+            if unknown:
+                raise ValueError("Unknown parameters of {0}: {1}".format(name, ', '.join(sorted(unknown))))
+        if self.kernel not in ('numpy', 'snoise2', 'numba'):
+            raise ValueError("Unknown noise kernel: {0}".format(self.kernel))
+        if self.dtype not in ('float32', 'float64'):
+            raise ValueError("Unsupported dtype: {0}".format(self.dtype))
+        if self.period is not None and min(self.period) <= 0:
+            raise ValueError("Period has to be positive: {0}".format(self.period))
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        from_dict - spec from dictionary (e.g. loaded from JSON or TOML file).
+        :param data: dictionary with parameters of MapSpec
+        :return: MapSpec
+        """
+        unknown = set(data) - {'map_size', 'layers', 'gradient', 'levels', 'color_levels', 'brightness', 'kernel',
+                            'dtype', 'offset', 'period', 'fixed_range', 'hydrology', 'biomes'}
+        if unknown:
+            raise ValueError("Unknown parameters of map: {0}".format(', '.join(sorted(unknown))))
+        return cls(**data)
+
+    def to_dict(self):
+        return dict(map_size=list(self.map_size), layers=deepcopy(self.layers), gradient=deepcopy(self.gradient),
+                    levels=self.levels, color_levels=list(self.color_levels), brightness=self.brightness,
+                    kernel=self.kernel, dtype=self.dtype, offset=list(self.offset),
+                    period=None if self.period is None else list(self.period), fixed_range=self.fixed_range,
+                    hydrology=deepcopy(self.hydrology), biomes=deepcopy(self.biomes))
+
+    def with_seed(self, seed):
+        """
+        with_seed - the same map for another seed.
+        :param seed: number added to base of every layer (and of climate layers of biomes)
+        :return: new MapSpec
+        """
+        data = self.to_dict()
+        climate = [] if self.biomes is None else [data['biomes']['temperature'], data['biomes']['moisture']]
+        for layer in data['layers'] + climate:
+            layer['base'] = float(layer['base']) + seed
+        return MapSpec.from_dict(data)
+
+    def with_window(self, x, y, width, height):
+        """
+        with_window - window of the world described by the spec (e.g. chunk of a game world).
+        Windows are normalized by fixed range of noise, so adjacent windows generated separately
+        fit together without seams (gradient, if any, is a function of the window, not of the world).
+        :param x: first column of the window
+        :param y: first row of the window
+        :param width: number of columns
+        :param height: number of rows
+        :return: new MapSpec
+        """
+        data = self.to_dict()
+        data.update(map_size=[height, width], offset=[self.offset[0] + y, self.offset[1] + x], fixed_range=True)
+        return MapSpec.from_dict(data)
+
+
+def noise_params(layer, offset=(0, 0), period=None):
+    """
+    noise_params - parameters of noise generation from parameters of layer (without factor).
+    :param layer: dictionary with scale, octaves, persistence and base
+    :param offset: (row, column) of the array in infinite noise plane
+    :param period: optional (rows, columns) after which noise repeats (tileable noise)
+    :return: dictionary of noise parameters with proper types
+    """
+    params = dict(scale=float(layer['scale']),
+                  octaves=int(layer['octaves']),
+                  persistence=float(layer['persistence']),
+                  base=float(layer['base']))
+    # default offset and period are left out - keys of layers cached before stay the same
+    if tuple(offset) != (0, 0):
+        params['offset'] = (int(offset[0]), int(offset[1]))
+    if period is not None:
+        params['period'] = (int(period[0]), int(period[1]))
+    return params
+
+
+def layer_cache_key(map_size, kernel, params, dtype=float32, fixed_range=False):
+    # array is a pure function of these parameters
+    if fixed_range:
+        params = dict(params, fixed_range=True)
+    return LayerCache.key(map_size=tuple(map_size), kernel=effective_kernel(kernel), dtype=np_dtype(dtype).name,
+                          **params)
+
+
+def generate_layer(map_size, params, kernel='numpy', pool=None, progress=None, dtype=float32, fixed_range=False,
+                   workers=None):
+    """
+    generate_layer - noise array of the layer, normalized to the range: 0-1.
+    :param map_size: size of the array (rows, columns)
+    :param params: noise parameters (see noise_params)
+    :param kernel: 'numpy' - vectorized noise, 'snoise2' - noise computed pixel by pixel,
+                   'numba' - compiled noise generated by threads (snoise2 if Numba is not installed)
+    :param pool: optional multiprocessing pool - array is generated by its workers into memory-mapped file
+                 (not used by 'numba' kernel - its threads need no pickling)
+    :param progress: optional function(done, total) called during generation
+                    (exception raised by it cancels the generation)
+    :param dtype: type of the array (noise is computed in float32, so float32 loses nothing)
+    :param fixed_range: False - normalized by minimum and maximum of the array,
+                        True - by range of noise (-1 to 1), the same for every window of the noise plane
+    :param workers: number of threads of 'numba' kernel (all cores by default)
+    :return: tuple of (name of mapped file or None, array) - mapped file has to be removed
+             with release_mapped_file, after array is not used anymore
+    """
+    array_file = None
+    kernel = effective_kernel(kernel)
+    with span('noise', kernel=kernel if pool is None or kernel == 'numba' else kernel + ' (pool)',
+              shape=tuple(map_size), octaves=params.get('octaves')):
+        if pool is not None and kernel != 'numba':
+            # workers fill bands of rows straight in memory-mapped file - no copying of results
+            array_file, array = generate_mapped_noise_array(pool, map_size, kernel=kernel, dtype=dtype,
+                                                            progress=progress, **params)
+        else:
+            array = generate_noise_array(map_size, kernel, dtype, progress, workers, **params)
+
+    # normalize values to the range: 0-1 (in place - array may be memory-mapped)
+    with span('normalize', shape=tuple(map_size)):
+        low, high = (-1, 1) if fixed_range else (amin(array), amax(array))
+        if high > low:
+            array -= low
+            array /= high - low
+    return array_file, array
+
+
+def generate_gradient(map_size, gradient, dtype=float32):
+    """
+    generate_gradient - gradient array of the map.
+    :param map_size: size of the map (rows, columns)
+    :param gradient: dictionary with min_value_radius, max_value_radius and pattern
+    :param dtype: type of the array
+    :return: array of gradient values (0-1)
+    """
+    with span('gradient', shape=tuple(map_size)):
+        return gradient_tile(map_size, gradient['min_value_radius'], gradient['max_value_radius'],
+                             pattern=gradient['pattern'], dtype=dtype)
+
+
+def generate_map(spec, pool=None, cache=None, workers=None):
+    """
+    generate_map - heightmap and colorized map described by the spec.
+    :param spec: MapSpec
+    :param pool: optional multiprocessing pool for generation of layers
+    :param cache: optional LayerCache - layers generated before are loaded from it
+    :param workers: number of threads of composition (all cores by default)
+    :return: tuple of (heightmap quantized into levels (0-1), RGB map (uint8)) or (None, None) if map is flat
+    """
+    heightmap, rgb_map, _ = generate_map_with_biomes(spec, pool, cache, workers)
+    return heightmap, rgb_map
+
+
+def generate_map_with_biomes(spec, pool=None, cache=None, workers=None):
+    """
+    generate_map_with_biomes - heightmap, colorized map and biome map described by the spec (see generate_map).
+    :param spec: MapSpec
+    :param pool: optional multiprocessing pool for generation of layers
+    :param cache: optional LayerCache - layers generated before are loaded from it
+    :param workers: number of threads of composition (all cores by default)
+    :return: tuple of (heightmap quantized into levels (0-1), RGB map (uint8), biome map (uint8 ids of biomes,
+             None if spec has no biomes)) or (None, None, None) if map is flat
+    """
+    value_range = None
+    if spec.fixed_range:
+        # range of weighted sum of layers (0-1) - the same for every window of the world
+        factors = [float(layer['factor']) for layer in spec.layers]
+        value_range = (sum(min(0.0, factor) for factor in factors), sum(max(0.0, factor) for factor in factors))
+    composer = MapComposer(spec.levels, spec.dtype, workers, value_range)
+    mapped_files = []
+    try:
+        for index, layer in enumerate(spec.layers):
+            params = noise_params(layer, spec.offset, spec.period)
+            array = None
+            if cache is not None:
+                key = layer_cache_key(spec.map_size, spec.kernel, params, spec.dtype, spec.fixed_range)
+                array = cache.load(key)
+            if array is None:
+                array_file, array = generate_layer(spec.map_size, params, spec.kernel, pool, dtype=spec.dtype,
+                                                   fixed_range=spec.fixed_range)
+                if array_file is not None:
+                    mapped_files.append(array_file)
+                if cache is not None:
+                    cache.store(key, array)
+            composer.set_layer(index, array, float(layer['factor']))
+        if spec.gradient is not None:
+            composer.set_gradient(generate_gradient(spec.map_size, spec.gradient, spec.dtype))
+
+        return compose_maps(composer, spec.map_size, spec.color_levels, spec.brightness, spec.hydrology, spec.biomes,
+                           spec.offset, spec.period, kernel=spec.kernel)
+    finally:
+        # layers are not needed after composition
+        composer.layers = {}
+        for array_file in mapped_files:
+            release_mapped_file(array_file)
+
+
+def compose_maps(composer, map_size, color_levels, brightness=1, hydrology=None, biomes=None, offset=(0, 0),
+                 period=None, progress=None, kernel='numpy'):
+    """
+    compose_maps - heightmap, colorized map and biome map from layers and gradient of the composer.
+    Without hydrology and biomes, cached stages of the composer are used (see MapComposer.get_rgb_map).
+    :param composer: MapComposer with layers and gradient of the map
+    :param map_size: size of the map
+    :param color_levels: sea, plains and hills levels
+    :param brightness: brightness of colors (range from 0 to 1)
+    :param hydrology: optional dictionary with parameters of hydrology (see compose_hydrology)
+    :param biomes: optional dictionary with parameters of biomes (see gret_biomes.generate_biome_map)
+    :param offset: (row, column) of the map in infinite noise plane (climate of biomes)
+    :param period: optional (rows, columns) after which noise repeats
+    :param progress: optional function(done, total) called after each stage
+    :param kernel: noise kernel of climate layers of biomes - the kernel of layers of the map (see generate_layer)
+    :return: tuple of (heightmap quantized into levels (0-1), RGB map (uint8), biome map (uint8 or None))
+             or (None, None, None) if map is flat
+    """
+    if hydrology is None and biomes is None:
+        rgb_map = composer.get_rgb_map(map_size, color_levels, progress, brightness)
+        if rgb_map is None:
+            return None, None, None
+        return composer.quantized_map, rgb_map, None
+    overlays = None
+    if hydrology is not None:
+        heightmap, overlays = compose_hydrology(composer, map_size, color_levels, hydrology, progress)
+    else:
+        heightmap = composer.get_quantized_map(map_size, progress)
+    if heightmap is None:
+        return None, None, None
+    if biomes is None:
+        # the same colors as of the composer (levels are the same), with water painted over them
+        rgb_map = convert_heightmap_into_RGB(heightmap, brightness=brightness, levels=list(color_levels),
+                                             steps=composer.levels, value_range=(0.0, 1.0), overlays=overlays)
+        return heightmap, rgb_map, None
+    with span('biomes', shape=tuple(map_size)):
+        biome_map = generate_biome_map(heightmap, biomes, composer.levels, color_levels, offset, period,
+                                       workers=composer.workers, kernel=kernel)
+    with span('colorize', shape=tuple(map_size), biomes=True):
+        rgb_map = convert_biomes_into_RGB(biome_map, brightness, overlays=overlays)
+    return heightmap, rgb_map, biome_map
+
+
+def compose_hydrology(composer, map_size, color_levels, hydrology, progress=None):
+    """
+    compose_hydrology - heightmap with erosion, rivers and lakes (see gret_hydrology).
+    Hydrology works with the map before quantization, eroded map is quantized into levels of the composer.
+    :param composer: MapComposer with layers and gradient of the map
+    :param map_size: size of the map
+    :param color_levels: sea, plains and hills levels - rivers end in the sea (unless hydrology sets sea_level)
+    :param hydrology: dictionary with parameters of hydrology
+    :param progress: optional function(done, total) called after each stage
+    :return: tuple of (heightmap quantized into levels (0-1), overlays of rivers and lakes for colorization)
+             or (None, None) if map is flat
+    """
+    normalized_map = composer.get_normalized_map(map_size, progress)
+    if normalized_map is None:
+        return None, None
+    params = dict(hydrology)
+    if params.get('sea_level') is None:
+        params['sea_level'] = color_levels[0]
+    heightmap, rivers, lakes = apply_hydrology(normalized_map, composer.workers, **params)
+    del normalized_map
+    heightmap *= composer.levels
+    trunc(heightmap, out=heightmap)
+    heightmap /= composer.levels
+    return heightmap, water_overlays(rivers, lakes)
+
+
+def save_map(directory, name, heightmap, rgb_map, formats=DEFAULT_FORMATS, workers=None, biome_map=None):
+    """
+    save_map - saves heightmap and colorized map in given formats (see gret_export), band by band.
+    Formats:
+     - npy: heightmap as name.npy
+     - png: colorized map as name.png
+     - png16: heightmap as 16-bit grayscale name_height.png
+     - chunked: both maps as compressed, chunked stores name_height.zarr and name_rgb.zarr
+     - xyz: colorized map as web-map tiles name_tiles/z/x/y.png
+     - biomes: biome map as indexed (palette) PNG name_biomes.png - values of pixels are ids of biomes
+    :param directory: output directory
+    :param name: name of files (without extension)
+    :param heightmap: heightmap array (may be memory-mapped)
+    :param rgb_map: RGB array (uint8, may be memory-mapped)
+    :param formats: collection of formats
+    :param workers: number of threads for compression (all cores by default)
+    :param biome_map: uint8 array of ids of biomes (may be memory-mapped), needed by biomes format
+    :return: list of names of saved files (and directories)
+    """
+    unknown = set(formats) - set(EXPORT_FORMATS)
+    if unknown:
+        raise ValueError("Unknown export formats: {0}".format(', '.join(sorted(unknown))))
+    if 'biomes' in formats and biome_map is None:
+        raise ValueError("Biomes format needs biome map (biomes in the spec)")
+    makedirs(directory, exist_ok=True)
+    base = path.join(directory, name)
+    files = []
+    if 'npy' in formats:
+        with span('export npy', 'export'):
+            files.append(export_npy(heightmap, base + '.npy'))
+    if 'png' in formats:
+        with span('export png', 'export'):
+            files.append(export_png(rgb_map, base + '.png', workers=workers))
+    if 'png16' in formats:
+        with span('export png16', 'export'):
+            files.append(export_png(heightmap, base + '_height.png', workers=workers))
+    if 'chunked' in formats:
+        with span('export chunked', 'export'):
+            files.append(export_chunked(heightmap, base + '_height.zarr', workers=workers))
+            files.append(export_chunked(rgb_map, base + '_rgb.zarr', workers=workers))
+    if 'xyz' in formats:
+        with span('export xyz', 'export'):
+            export_xyz_tiles(rgb_map, base + '_tiles', workers=workers)
+        files.append(base + '_tiles')
+    if 'biomes' in formats:
+        with span('export biomes', 'export'):
+            files.append(export_png(biome_map, base + '_biomes.png', workers=workers, palette=biome_palette()))
+    return files
+
+
+def seed_job(seed, spec, directory, name_format='map_{seed}', formats=DEFAULT_FORMATS):
+    """
+    seed_job - generates and saves map for one seed (job of the pool for batch generation).
+    :param seed: seed of the map (see MapSpec.with_seed)
+    :param spec: MapSpec
+    :param directory: output directory
+    :param name_format: format of names of output files, with {seed} field
+    :param formats: formats of saved maps (see save_map)
+    :return: tuple of (seed, names of saved files or None if map is flat)
+    """
+    # one map per worker process - composition and compression in one thread, all cores are busy anyway
+    heightmap, rgb_map, biome_map = generate_map_with_biomes(spec.with_seed(seed), workers=1)
+    if heightmap is None:
+        return seed, None
+    return seed, save_map(directory, name_format.format(seed=seed), heightmap, rgb_map, formats, workers=1,
+                          biome_map=biome_map)
+
+
+def generate_batch(spec, seeds, directory, pool=None, name_format='map_{seed}', progress=None,
+                   formats=DEFAULT_FORMATS):
+    """
+    generate_batch - generates and saves maps for many seeds.
+    Every map is generated by one worker of the pool, so all cores are busy without splitting the maps.
+    :param spec: MapSpec
+    :param seeds: iterable of seeds
+    :param directory: output directory
+    :param pool: optional multiprocessing pool
+    :param name_format: format of names of output files, with {seed} field
+    :param progress: optional function(done, total) called after each map
+    :param formats: formats of saved maps (see save_map)
+    :return: list of (seed, names of saved files or None) in order of seeds
+    """
+    seeds = list(seeds)
+    job = partial(seed_job, spec=spec, directory=directory, name_format=name_format, formats=formats)
+    results = map(job, seeds) if pool is None else pool.imap_unordered(job, seeds)
+    done = {}
+    for count, (seed, files) in enumerate(results, 1):
+        done[seed] = files
+        if progress is not None:
+            progress(count, len(seeds))
+    return [(seed, done[seed]) for seed in seeds]
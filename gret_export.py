@@ -0,0 +1,246 @@
+import json
+
+from collections import deque
+from gret_pyramid import TilePyramid, array_source
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from numpy import asarray, clip, dtype as np_dtype, empty, frombuffer, multiply, rint, shape, uint8, uint16, zeros
+from numpy.lib.format import open_memmap
+from os import makedirs, path
+from PIL import Image
+from struct import pack
+from zlib import adler32, compress, compressobj, crc32, decompress, DEFLATED, Z_FINISH, Z_SYNC_FLUSH
+
+# number of rows read from the source at once
+BAND_ROWS = 256
+# size of side of XYZ web-map tiles
+XYZ_TILE_SIZE = 256
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+
+def bands(rows, band_rows=BAND_ROWS):
+    return [(row, min(row + band_rows, rows)) for row in range(0, rows, band_rows)]
+
+
+def bounded_imap(pool, function, iterable, window):
+    """
+    bounded_imap - ordered results of function for every item, computed by the pool.
+    Unlike pool.imap, at most window items are taken from iterable at once - bands of big maps
+    are read only when there is a free place for them.
+    :param pool: pool of workers (threads)
+    :param function: function of one item
+    :param iterable: items
+    :param window: maximum number of items being processed
+    :return: generator of results
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(function, (item,)))
+        if len(pending) >= window:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def export_npy(array, filename, band_rows=BAND_ROWS):
+    """
+    export_npy - saves array as .npy file, band by band (source may be bigger than RAM).
+    :param array: array to be saved (e.g. memory-mapped array of the tiled store)
+    :param filename: name of the output file
+    :param band_rows: number of rows copied at once
+    :return: filename
+    """
+    out = open_memmap(filename, mode='w+', dtype=array.dtype, shape=shape(array))
+    for start, stop in bands(shape(array)[0], band_rows):
+        out[start:stop] = array[start:stop]
+    out.flush()
+    del out
+    return filename
+
+
+def export_chunked(array, directory, chunks=(512, 512), level=6, workers=None):
+    """
+    export_chunked - saves array as chunked, zlib-compressed store (layout of Zarr v2 array,
+    so it can be opened with zarr.open(directory) as well as with load_chunked).
+    Chunks are compressed and written by a pool of threads, one band of chunks is read at a time.
+    :param array: 2D or 3D array (third dimension is not chunked)
+    :param directory: directory of the store
+    :param chunks: (rows, columns) of chunk
+    :param level: zlib compression level
+    :param workers: number of threads (all cores by default)
+    :return: directory
+    """
+    makedirs(directory, exist_ok=True)
+    array_shape = shape(array)
+    chunk_shape = tuple(chunks) + tuple(array_shape[2:])
+    dtype = np_dtype(array.dtype)
+    with open(path.join(directory, '.zarray'), 'w') as file:
+        json.dump(dict(zarr_format=2, shape=list(array_shape), chunks=list(chunk_shape), dtype=dtype.str,
+                       compressor=dict(id='zlib', level=level), fill_value=0, order='C', filters=None), file)
+
+    def write_chunk(item):
+        key, data = item
+        # chunks at the borders are padded to the full size of the chunk
+        if data.shape != chunk_shape:
+            padded = zeros(chunk_shape, dtype=dtype)
+            padded[tuple(slice(0, size) for size in data.shape)] = data
+            data = padded
+        with open(path.join(directory, key), 'wb') as file:
+            file.write(compress(data.tobytes(), level))
+
+    def chunk_items():
+        for chunk_row, (start, stop) in enumerate(bands(array_shape[0], chunks[0])):
+            band = array[start:stop]
+            for chunk_column, column in enumerate(range(0, array_shape[1], chunks[1])):
+                key = '.'.join(str(index) for index in (chunk_row, chunk_column) + (0,) * (len(array_shape) - 2))
+                yield key, band[:, column:column + chunks[1]]
+
+    workers = workers or cpu_count()
+    with ThreadPool(workers) as pool:
+        for _ in bounded_imap(pool, write_chunk, chunk_items(), 2 * workers):
+            pass
+    return directory
+
+
+def load_chunked(directory, rows=None):
+    """
+    load_chunked - reads array (or band of rows of it) saved by export_chunked.
+    :param directory: directory of the store
+    :param rows: optional (first row, last row + 1) - only chunks of these rows are read
+    :return: array
+    """
+    with open(path.join(directory, '.zarray')) as file:
+        meta = json.load(file)
+    array_shape, chunk_shape, dtype = tuple(meta['shape']), tuple(meta['chunks']), np_dtype(meta['dtype'])
+    start, stop = (0, array_shape[0]) if rows is None else rows
+    out = empty((stop - start,) + array_shape[1:], dtype=dtype)
+    for chunk_row in range(start // chunk_shape[0], -(-stop // chunk_shape[0])):
+        for chunk_column in range(-(-array_shape[1] // chunk_shape[1])):
+            key = '.'.join(str(index) for index in (chunk_row, chunk_column) + (0,) * (len(array_shape) - 2))
+            with open(path.join(directory, key), 'rb') as file:
+                chunk = frombuffer(decompress(file.read()), dtype=dtype).reshape(chunk_shape)
+            row0 = chunk_row * chunk_shape[0]
+            column0 = chunk_column * chunk_shape[1]
+            # part of the chunk inside requested rows and the array
+            first, last = max(start, row0), min(stop, row0 + chunk_shape[0])
+            columns = min(chunk_shape[1], array_shape[1] - column0)
+            out[first - start:last - start, column0:column0 + columns] = \
+                chunk[first - row0:last - row0, :columns]
+    return out
+
+
+def png_chunk(kind, data):
+    return pack('>I', len(data)) + kind + data + pack('>I', crc32(kind + data))
+
+
+def heightmap_to_uint16(heightmap, value_range=(0.0, 1.0)):
+    """
+    heightmap_to_uint16 - values of heightmap scaled to full range of 16-bit integers.
+    :param heightmap: heightmap (or band of it)
+    :param value_range: (minimum, maximum) of the whole heightmap
+    :return: uint16 array
+    """
+    band = heightmap - float(value_range[0])
+    if value_range[1] > value_range[0]:
+        multiply(band, 65535 / (value_range[1] - value_range[0]), out=band)
+    rint(band, out=band)
+    clip(band, 0, 65535, out=band)
+    return band.astype(uint16)
+
+
+def export_png(array, filename, value_range=(0.0, 1.0), band_rows=BAND_ROWS, level=6, workers=None, palette=None):
+    """
+    export_png - streaming PNG writer - the image is never materialized as a whole.
+    Bands of rows are deflated in parallel by a pool of threads (each band ends with sync flush,
+    so compressed bands simply follow each other in one zlib stream).
+    Supported arrays:
+     - uint8 (rows, columns, 3) - RGB, 8 bits
+     - uint8 (rows, columns) - grayscale, 8 bits (or indexes of colors of the palette)
+     - float (rows, columns) - heightmap saved as 16-bit grayscale (see heightmap_to_uint16)
+    :param array: array to be saved (e.g. memory-mapped array of the tiled store)
+    :param filename: name of the output file
+    :param value_range: (minimum, maximum) of float heightmap
+    :param band_rows: number of rows compressed at once
+    :param level: zlib compression level
+    :param workers: number of threads (all cores by default)
+    :param palette: optional RGB colors (uint8 array of up to 256 colors) of indexed uint8 array (e.g. biome map)
+    :return: filename
+    """
+    rows, columns = shape(array)[:2]
+    if palette is not None:
+        bit_depth, color_type = 8, 3
+    elif len(shape(array)) == 3:
+        bit_depth, color_type = 8, 2
+    elif array.dtype == uint8:
+        bit_depth, color_type = 8, 0
+    else:
+        bit_depth, color_type = 16, 0
+
+    def encode_band(band):
+        start, stop = band
+        data = array[start:stop]
+        if bit_depth == 16:
+            data = heightmap_to_uint16(data, value_range).astype('>u2')
+        # every row starts with filter type byte (0 - no filtering)
+        raw = empty((stop - start, 1 + data[0].nbytes), dtype=uint8)
+        raw[:, 0] = 0
+        raw[:, 1:] = data.reshape(stop - start, -1).view(uint8)
+        raw = raw.tobytes()
+        compressor = compressobj(level, DEFLATED, -15)
+        return raw, compressor.compress(raw) + compressor.flush(Z_FINISH if stop == rows else Z_SYNC_FLUSH)
+
+    workers = workers or cpu_count()
+    checksum = 1
+    with open(filename, 'wb') as file, ThreadPool(workers) as pool:
+        file.write(PNG_SIGNATURE)
+        file.write(png_chunk(b'IHDR', pack('>IIBBBBB', columns, rows, bit_depth, color_type, 0, 0, 0)))
+        if palette is not None:
+            file.write(png_chunk(b'PLTE', asarray(palette, dtype=uint8).tobytes()))
+        # zlib header - deflate with 32K window
+        file.write(png_chunk(b'IDAT', b'\x78\x9c'))
+        for raw, compressed in bounded_imap(pool, encode_band, bands(rows, band_rows), 2 * workers):
+            checksum = adler32(raw, checksum)
+            file.write(png_chunk(b'IDAT', compressed))
+        file.write(png_chunk(b'IDAT', pack('>I', checksum)))
+        file.write(png_chunk(b'IEND', b''))
+    return filename
+
+
+def export_xyz_tiles(array, directory, tile_size=XYZ_TILE_SIZE, workers=None):
+    """
+    export_xyz_tiles - saves map as web-map tiles: directory/z/x/y.png.
+    The highest zoom is the full resolution, each lower zoom is downsampled twice, zoom 0 fits in one tile.
+    Tiles at the borders are padded (transparent) to the full size of the tile.
+    :param array: uint8 RGB (or grayscale) array of the map
+    :param directory: output directory
+    :param tile_size: size of tile's side
+    :param workers: number of threads (all cores by default)
+    :return: the highest zoom
+    """
+    pyramid = TilePyramid(shape(array), array_source(array), tile_size=tile_size)
+    # tiles of lower zooms are made of tiles of higher zooms - all of them are kept (tiles of the highest zoom are
+    # views of the array, all other zooms take a third of memory of the array)
+    pyramid.max_tiles = sum(rows * columns for rows, columns in map(pyramid.tile_grid, range(pyramid.levels)))
+    max_zoom = pyramid.levels - 1
+
+    def save_tile(key):
+        level, row, column = key
+        tile = pyramid.tile(level, row, column)
+        image = Image.new('RGBA' if tile.ndim == 3 else 'LA', (tile_size, tile_size))
+        image.paste(Image.fromarray(tile), (0, 0))
+        tile_directory = path.join(directory, str(max_zoom - level), str(column))
+        makedirs(tile_directory, exist_ok=True)
+        image.save(path.join(tile_directory, '%d.png' % row))
+
+    def tile_keys():
+        for level in range(pyramid.levels):
+            grid = pyramid.tile_grid(level)
+            for row in range(grid[0]):
+                for column in range(grid[1]):
+                    yield level, row, column
+
+    workers = workers or cpu_count()
+    with ThreadPool(workers) as pool:
+        for _ in bounded_imap(pool, save_tile, tile_keys(), 2 * workers):
+            pass
+    return max_zoom
@@ -0,0 +1,198 @@
+"""
+gret_generate - generation of maps without GUI.
+
+Usage:
+    python gret_generate.py spec.json -o output_dir
+    python gret_generate.py spec.toml -o output_dir --seeds 0:500 --workers 8
+    python gret_generate.py big.json -o output_dir --store /tmp/store --formats png,png16,xyz
+    python gret_generate.py world.json -o chunks --window 2048,1024,512,512
+    python gret_generate.py spec.json -o sweep --sweep '{"scale": [200, 400], "octaves": [4, 6]}' --seeds 0:50
+    python gret_generate.py spec.json -o output_dir --trace trace.json
+
+Spec file (JSON or TOML) contains parameters of MapSpec (see gret_core), e.g.:
+    {"map_size": [800, 800],
+     "layers": [{"scale": 400, "octaves": 6, "persistence": 0.5, "base": 0, "factor": 1}],
+     "gradient": {"min_value_radius": 0.2, "max_value_radius": 0.8, "pattern": "circle"},
+     "color_levels": [0.3, 0.5, 0.5]}
+For every map, heightmap is saved as .npy and colorized map as .png file (other formats with --formats).
+With --store, the map is generated tile by tile into disk-backed store (maps bigger than RAM),
+and exported from it band by band.
+With --window, only given window of the world is generated (see MapSpec.with_window) - adjacent windows
+(chunks of the world) generated separately fit together without seams.
+With "hydrology" in the spec (e.g. {"hydrology": {"droplets": 0.2}}), the map is eroded and gets rivers
+and lakes (see gret_hydrology).
+With "biomes" in the spec (e.g. {"biomes": {}}), the map is colored by biomes (see gret_biomes),
+--formats biomes saves ids of biomes as indexed PNG (with --store as well).
+With --sweep (JSON grid or file with it), maps are generated for every combination of values of the grid
+(and seeds) - thumbnails and statistics (land/sea ratio, height histogram) are written to sweep.csv,
+full maps only with --formats (see gret_sweep).
+With --trace, timings of stages of the pipeline (noise, composition, colors, export...) and memory are saved
+as Chrome trace (open in chrome://tracing or https://ui.perfetto.dev, see gret_trace).
+"""
+import json
+import sys
+
+from argparse import ArgumentParser
+from gret_cache import LayerCache
+from gret_core import EXPORT_FORMATS, MapSpec, generate_batch, generate_map_with_biomes, save_map
+from gret_sweep import THUMBNAIL_SIZE, generate_sweep
+from gret_tiles import generate_tiled_map, open_store_array
+from gret_trace import TRACER, span
+from multiprocessing import cpu_count, Pool
+
+try:
+    import tomllib
+except ImportError:
+    # Python < 3.11
+    tomllib = None
+
+
+def load_spec(filename):
+    """
+    load_spec - MapSpec from JSON or TOML file (chosen by extension).
+    Profiles saved by the sandbox (see gret_profile) are accepted as well - only their parameters are used.
+    :param filename: name of the spec file
+    :return: MapSpec
+    """
+    if filename.endswith('.toml'):
+        if tomllib is None:
+            raise ValueError("TOML specs need Python 3.11 or newer, use JSON instead")
+        with open(filename, 'rb') as file:
+            return MapSpec.from_dict(tomllib.load(file))
+    with open(filename) as file:
+        data = json.load(file)
+    if 'profile_version' in data:
+        data = data['spec']
+    return MapSpec.from_dict(data)
+
+
+def load_grid(text):
+    """
+    load_grid - grid of the sweep from JSON text or JSON/TOML file (see gret_sweep.grid_path for its keys).
+    :param text: JSON object or name of the file
+    :return: dictionary of key -> list of values
+    """
+    if text.lstrip().startswith('{'):
+        return json.loads(text)
+    if text.endswith('.toml'):
+        if tomllib is None:
+            raise ValueError("TOML grids need Python 3.11 or newer, use JSON instead")
+        with open(text, 'rb') as file:
+            return tomllib.load(file)
+    with open(text) as file:
+        return json.load(file)
+
+
+def parse_seeds(text):
+    """
+    parse_seeds - list of seeds from text: "5", "0:100" (range) or "1,7,42".
+    :param text: text of seeds
+    :return: list of seeds
+    """
+    if ':' in text:
+        start, stop = text.split(':')
+        return list(range(int(start), int(stop)))
+    return [int(seed) for seed in text.split(',')]
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Generation of maps from spec file, without GUI.")
+    parser.add_argument('spec', help="JSON or TOML file with parameters of the map")
+    parser.add_argument('-o', '--output', default='.', help="output directory (default: current directory)")
+    parser.add_argument('-s', '--seeds', type=parse_seeds, default=None,
+                        help="seeds added to base of every layer: N, START:STOP or N,N,N (default: spec as is)")
+    parser.add_argument('-n', '--name', default='map_{seed}', help="format of names of output files")
+    parser.add_argument('-w', '--workers', type=int, default=cpu_count(), help="number of worker processes")
+    parser.add_argument('-f', '--formats', type=lambda text: text.split(','), default=None,
+                        help="comma separated formats of output: " + ', '.join(EXPORT_FORMATS) +
+                             " (default: npy,png - with --sweep only thumbnails)")
+    parser.add_argument('--cache', default=None, help="directory of layer cache (single map only)")
+    parser.add_argument('--store', default=None,
+                        help="directory of disk-backed store for tiled generation (single map only)")
+    parser.add_argument('--memory-budget', type=int, default=None,
+                        help="memory for tiles processed at once in MB (with --store)")
+    parser.add_argument('--window', type=lambda text: [int(x) for x in text.split(',')], default=None,
+                        help="X,Y,WIDTH,HEIGHT - window of the world to be generated (e.g. chunk of a game world)")
+    parser.add_argument('--sweep', default=None,
+                        help="grid of parameters (JSON object or JSON/TOML file) - a map for every combination")
+    parser.add_argument('--thumbnail-size', type=int, default=THUMBNAIL_SIZE,
+                        help="size of thumbnails of the sweep (default: %d)" % THUMBNAIL_SIZE)
+    parser.add_argument('--trace', default=None,
+                        help="file of Chrome trace of stages of the pipeline (stages run in this process only - "
+                             "work of worker processes is the span of the stage waiting for it)")
+    args = parser.parse_args(argv)
+    if args.formats is None:
+        args.formats = [] if args.sweep is not None else ['npy', 'png']
+
+    try:
+        spec = load_spec(args.spec)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    if set(args.formats) - set(EXPORT_FORMATS):
+        parser.error("unknown formats: " + ', '.join(sorted(set(args.formats) - set(EXPORT_FORMATS))))
+    if (args.seeds is not None or args.sweep is not None) and (args.store is not None or args.cache is not None):
+        parser.error("--store and --cache can be used for single map only")
+    grid = None
+    if args.sweep is not None:
+        try:
+            grid = load_grid(args.sweep)
+        except (OSError, ValueError) as error:
+            parser.error("--sweep: " + str(error))
+        if args.seeds is not None:
+            grid['seed'] = args.seeds
+    if args.window is not None:
+        if len(args.window) != 4:
+            parser.error("--window needs X,Y,WIDTH,HEIGHT")
+        spec = spec.with_window(*args.window)
+    if spec.fixed_range and args.store is not None:
+        parser.error("--store does not support fixed range (--window)")
+    if spec.hydrology is not None and args.store is not None:
+        parser.error("--store does not support hydrology (it needs the whole map in memory)")
+    if 'biomes' in args.formats and spec.biomes is None:
+        parser.error("biomes format needs \"biomes\" in the spec")
+
+    with span('pool start', workers=args.workers):
+        pool = Pool(args.workers) if args.workers > 1 else None
+    try:
+        if grid is not None:
+            try:
+                print(generate_sweep(spec, grid, args.output, pool, args.thumbnail_size, args.formats,
+                                     progress=lambda done, total: print("%d/%d" % (done, total), file=sys.stderr)))
+            except ValueError as error:
+                parser.error("--sweep: " + str(error))
+            return 0
+        if args.seeds is not None:
+            # one map per worker - the pool is shared by all seeds
+            results = generate_batch(spec, args.seeds, args.output, pool, args.name,
+                                     progress=lambda done, total: print("%d/%d" % (done, total), file=sys.stderr),
+                                     formats=args.formats)
+            for seed, files in results:
+                print(seed, *(files or ["flat map - nothing saved"]), sep='\t')
+            return 0
+
+        if args.store is not None:
+            heightmap, rgb_map = generate_tiled_map(
+                args.store, spec.map_size, spec.layers, spec.gradient, spec.levels, spec.color_levels,
+                spec.brightness, dtype=spec.dtype, pool=pool, offset=spec.offset, period=spec.period,
+                memory_budget=None if args.memory_budget is None else args.memory_budget * 1024 ** 2,
+                biomes=spec.biomes, kernel=spec.kernel)
+            biome_map = None if spec.biomes is None else open_store_array(args.store, 'biomes', mode='r')
+        else:
+            heightmap, rgb_map, biome_map = generate_map_with_biomes(
+                spec, pool, None if args.cache is None else LayerCache(args.cache))
+        if heightmap is None:
+            print("Map is flat - nothing saved", file=sys.stderr)
+            return 1
+        print(*save_map(args.output, args.name.format(seed=0), heightmap, rgb_map, args.formats,
+                        biome_map=biome_map), sep='\n')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if args.trace is not None:
+            TRACER.export_chrome_trace(args.trace)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,30 +1,15 @@
 from functools import partial
+from gret_core import generate_layer, layer_cache_key, noise_params
+from gret_gradient import *
+from gret_noise import *
+from gret_pyramid import TilePyramid, gray_source
+from gret_trace import span
 from gret_tkinter_widgets import *
-from multiprocessing import cpu_count, Pool
-from numpy import empty, array, shape, sqrt, amin
-from noise import snoise2
-from PIL import Image, ImageTk
-from tkinter import Frame, Button, Scale, SUNKEN, HORIZONTAL
+from numpy import shape, amin, amax
+from tkinter import Frame, Button, Radiobutton, Scale, StringVar, SUNKEN, HORIZONTAL
 
-
-def generate_simplex_row(x, size, scale=100.0, octaves=6, persistence=0.5, base=0.0):
-    """
-    generate_simplex_row - function of generating one row of simplex noise.
-    :param x: number of row, just for purposes of generation 2d array
-    :param size: size of the main array, here it is size of the row
-    :param scale: for controlling speed of changes in the array
-    :param octaves: number of layers, each with more detail
-    :param persistence: influence of each octave on the main one
-    :param base: seed for the array generation (same seed - same output)
-    :return: list of simplex noise values, of given size
-    """
-    noise_row = []
-    x_scale = x / scale
-    for y in range(size):
-        noise_row.append(snoise2(x_scale, y / scale,
-                                 octaves=octaves, persistence=persistence,
-                                 base=base))
-    return noise_row
+# downsampling factors of previews shown before array of full resolution is generated
+PREVIEW_STEPS = (8, 4, 2)
 
 
 class GeneratorKit(Frame):
@@ -47,6 +32,8 @@ class GeneratorKit(Frame):
         self.config(bg=self.main_bg)
 
         self.array = None
+        # file mapped by the array (if array was generated by pool of workers)
+        self.array_file = None
 
         # generator menu
         # base = seed for generator
@@ -65,7 +52,7 @@ class GeneratorKit(Frame):
         self.factor_entry = LabeledEntry(self, text="Factor: ", validate_for='float', value=1)
         self.factor_entry.grid(row=1, column=2, sticky='e')
 
-        self.generate_btn = Button(self, text="Generate", command=self.generate_array)
+        self.generate_btn = Button(self, text="Generate", command=self.generate_array_progressive)
         self.generate_btn.grid(row=2, column=0, padx=5, pady=5, sticky='we')
 
         self.show_btn = Button(self, text="Show", command=self.show_array)
@@ -75,43 +62,126 @@ class GeneratorKit(Frame):
         self.destroy_btn = Button(self, text="Delete", command=self.self_destroy, bg='darkred', fg='lightgray')
         self.destroy_btn.grid(row=2, column=2, padx=5, pady=5, sticky='we')
 
-    def generate_array(self, refresh_map=True):
-        self.array = empty(self.root.MAP_SIZE, dtype=float)
-
-        if cpu_count() > 6:
-            p = Pool(6)
-        else:
-            p = Pool()
-        simplex_row_partial = partial(generate_simplex_row,
-                                      size=self.root.MAP_SIZE[1],
-                                      scale=float(self.scale_entry.get()),
-                                      octaves=int(self.octaves_entry.get()),
-                                      persistence=float(self.persistence_entry.get()),
-                                      base=float(self.base_entry.get()))
-        list_tmp = p.map(simplex_row_partial, range(self.root.MAP_SIZE[0]))
-        self.array = array(list_tmp)
-
-        # normalize values to the range: 0-1
-        if self.array.ptp():
-            self.array = ((self.array - amin(self.array)) / self.array.ptp())
-
+    def get_layer(self):
+        # parameters of the layer in the form of MapSpec's layers
+        return dict(scale=float(self.scale_entry.get()),
+                    octaves=int(self.octaves_entry.get()),
+                    persistence=float(self.persistence_entry.get()),
+                    base=float(self.base_entry.get()),
+                    factor=float(self.factor_entry.get()))
+
+    def set_layer(self, layer):
+        # entries from parameters of MapSpec's layer (base and scale entries take integers)
+        self.base_entry.set('%d' % layer['base'])
+        self.scale_entry.set('%d' % layer['scale'])
+        self.octaves_entry.set('%d' % layer['octaves'])
+        self.persistence_entry.set('%g' % layer['persistence'])
+        self.factor_entry.set('%g' % layer['factor'])
+
+    def get_noise_params(self):
+        # window of the noise plane and period are common for all layers of the map
+        return noise_params(self.get_layer(), self.root.offset, self.root.period)
+
+    def generate_array(self, refresh_map=True, previews=False):
+        """
+        Generation runs in the background (job of the scheduler), so the window stays responsive.
+        With previews, arrays of lower resolution (the same noise, sampled every few pixels) are shown
+        as soon as they are ready, until array of full resolution is generated.
+        Generating again cancels generation in progress.
+        """
+        pool = self.root.get_pool() if self.root.workers > 1 else None
+        self.root.scheduler.submit(self, self.compute_array, tuple(self.root.MAP_SIZE), self.get_noise_params(),
+                                   self.root.noise_kernel, pool, previews, self.root.dtype,
+                                   on_done=partial(self.set_array, refresh_map=refresh_map),
+                                   on_partial=self.show_preview, on_discard=self.discard_array)
+
+    def generate_array_progressive(self):
+        self.generate_array(previews=True)
+
+    def compute_array(self, job, map_size, params, kernel, pool, previews, dtype):
+        # runs in the background thread - no access to widgets here
+        # the same array may be already in the cache
+        cache_key = layer_cache_key(map_size, kernel, params, dtype)
+        with span('layer cache', 'cache', operation='load') as cache_span:
+            array = self.root.layer_cache.load(cache_key)
+            cache_span.args['hit'] = array is not None
+        if array is not None:
+            return None, array
+
+        progress = job.progress
+        if pool is not None and previews:
+            # previews are queued first, so they are computed before bands of the full array
+            preview_results = [(step, pool.apply_async(generate_preview_array, (map_size, step), params))
+                               for step in PREVIEW_STEPS]
+            step, result = preview_results.pop(0)
+            with span('preview', step=step):
+                job.partial((map_size, step, result.get()))
+
+            def progress(done, total):
+                # the most detailed preview ready so far (less detailed ones are skipped)
+                ready = [index for index, (_, result) in enumerate(preview_results) if result.ready()]
+                if ready:
+                    step, result = preview_results[ready[-1]]
+                    job.partial((map_size, step, result.get()))
+                    del preview_results[:ready[-1] + 1]
+                job.progress(done, total)
+        elif previews:
+            for step in PREVIEW_STEPS:
+                with span('preview', step=step):
+                    job.partial((map_size, step, generate_preview_array(map_size, step, **params)))
+
+        array_file, array = generate_layer(map_size, params, kernel, pool, progress, dtype)
+        with span('layer cache', 'cache', operation='store'):
+            self.root.layer_cache.store(cache_key, array)
+        return array_file, array
+
+    def set_array(self, result, refresh_map=True):
+        self.release_array()
+        self.array_file, self.array = result
         if refresh_map:
-            if self.root.img is None or self.root.displayed_frame is self:
+            if self.root.viewport.pyramid is None or self.root.displayed_frame is self:
                 self.show_array()
             elif self.root.displayed_frame is self.root:
                 self.root.display_map()
 
         self.show_btn.grid()
 
+    @staticmethod
+    def discard_array(result):
+        # result of cancelled generation
+        if result[0] is not None:
+            release_mapped_file(result[0])
+
+    def cancel_generation(self):
+        self.root.scheduler.cancel(self)
+
+    def release_array(self):
+        # mapped file can be removed only after the array using it is removed
+        self.array = None
+        if self.array_file is not None:
+            release_mapped_file(self.array_file)
+            self.array_file = None
+
+    def show_preview(self, result):
+        if self.root.viewport.pyramid is not None and self.root.displayed_frame is not self:
+            return
+        map_size, step, preview = result
+        low, high = amin(preview), amax(preview)
+        if high > low:
+            preview = (preview - low) / (high - low)
+        # preview is stretched to the size of the map - only for visible tiles
+        self.root.viewport.show(TilePyramid(map_size, gray_source(preview, self.root.levels, step)))
+        self.root.displayed_frame = self
+
     def show_array(self):
-        # normalize values to 0-levels and rescale to 0-255 (grayscale)
-        noise_map = (self.array * self.root.levels).astype(int) / self.root.levels * 255
-        self.root.img = ImageTk.PhotoImage(image=Image.fromarray(noise_map))
-        self.root.canvas.itemconfig(self.root.map_img, image=self.root.img)
+        # only visible tiles are rendered (grayscale of levels)
+        self.root.viewport.show(TilePyramid(shape(self.array), gray_source(self.array, self.root.levels)))
         self.root.displayed_frame = self
 
     def self_destroy(self):
         self.root.dynamic_frames.remove(self)
+        self.cancel_generation()
+        self.release_array()
         self.destroy()
         self.root.group_generation_kits()
         self.root.display_map()
@@ -124,6 +194,7 @@ class GradientKit(Frame):
     Parameters:
      - Minimum value gradient's radius: radius for max weakening of array's values
      - Maximum value gradient's radius: radius for max magnifying of array's values
+     - Pattern: circle or square
     """
     def __init__(self, parent):
         Frame.__init__(self, parent, bd=1, relief=SUNKEN)
@@ -132,7 +203,8 @@ class GradientKit(Frame):
         self.main_bg = parent['bg']
         self.config(bg=self.main_bg)
         # basic array for faster response of changing pattern's parameters, but it takes 2x RAM!
-        self.circle_basic_array = None
+        self.basic_array = None
+        self.basic_array_pattern = None
         self.array = None
         self.slider_events = ["<ButtonRelease-1>",
                               "<ButtonRelease-3>"]
@@ -161,55 +233,62 @@ class GradientKit(Frame):
             self.max_value_radius.bind(event, self.change_factor_event)
         self.max_value_radius.set(1)
 
+        # pattern of the gradient - circle or square
+        self.pattern = StringVar(self, value='circle')
+        self.pattern_frame = Frame(self, bg=self.main_bg)
+        self.pattern_frame.grid(row=3, column=0, padx=5, pady=5, columnspan=3, sticky='w')
+        for column, pattern in enumerate(('circle', 'square')):
+            Radiobutton(self.pattern_frame, text=pattern.capitalize(), value=pattern, variable=self.pattern,
+                        bg=self.main_bg, command=self.change_pattern_event).grid(row=0, column=column, padx=5)
+
     def change_factor_event(self, event):
         if self.array is not None:
             self.generate_gradient()
 
-    def generate_gradient(self, refresh_map=True):
-        if self.circle_basic_array is None \
-                or shape(self.circle_basic_array)[0] != self.root.MAP_SIZE[0]\
-                or shape(self.circle_basic_array)[1] != self.root.MAP_SIZE[1]:
-            self.circle_basic_array = empty(self.root.MAP_SIZE, dtype=float)
-            for i in range(self.root.MAP_SIZE[0] // 2):
-                a = self.root.MAP_SIZE[0] // 2 - i
-                for j in range(self.root.MAP_SIZE[1] // 2):
-                    # old squared gradient formula: x = i if i < j else j
-                    b = self.root.MAP_SIZE[1] // 2 - j
-                    x = - sqrt(a*a + b*b)
-                    self.circle_basic_array[i][j] = x
-                    self.circle_basic_array[i][self.root.MAP_SIZE[1]-j-1] = x
-                    self.circle_basic_array[self.root.MAP_SIZE[0]-i-1][j] = x
-                    self.circle_basic_array[self.root.MAP_SIZE[0]-i-1][self.root.MAP_SIZE[1]-j-1] = x
-
-        if self.max_value_radius.get() < self.min_value_radius.get():
-            # allowing reversing gradient pattern (middle is suppressed instead of borders)
-            self.array = 1 - self.circle_basic_array
-        else:
-            self.array = self.circle_basic_array.copy()
-
-        # convert radius into array index
-        x_of_border = int(self.root.MAP_SIZE[0] * (1 - self.max_value_radius.get()) / 2)
-        y_of_border = int(self.root.MAP_SIZE[1] * (1 - self.max_value_radius.get()) / 2)
-        self.array[self.array < self.array[x_of_border, y_of_border]] = \
-            self.array[x_of_border, y_of_border]
-
-        if self.max_value_radius.get() == self.min_value_radius.get():
-            # in case of equal values, make sure indexes differ at least by 1 (pattern gets blank otherwise)
-            x_of_border += 1
-            y_of_border += 1
-        else:
-            x_of_border = int(self.root.MAP_SIZE[0] * (1 - self.min_value_radius.get()) / 2)
-            y_of_border = int(self.root.MAP_SIZE[1] * (1 - self.min_value_radius.get()) / 2)
-
-        self.array[self.array > self.array[x_of_border, y_of_border]] = \
-            self.array[x_of_border, y_of_border]
-
-        # normalize values to the range: 0-1
-        if self.array.ptp():
-            self.array = ((self.array - amin(self.array)) / self.array.ptp())
+    def change_pattern_event(self):
+        if self.array is not None:
+            self.generate_gradient()
+
+    def get_gradient(self):
+        # parameters of the gradient in the form of MapSpec's gradient
+        return dict(min_value_radius=self.min_value_radius.get(), max_value_radius=self.max_value_radius.get(),
+                    pattern=self.pattern.get())
 
+    def set_gradient_params(self, gradient):
+        self.min_value_radius.set(gradient['min_value_radius'])
+        self.max_value_radius.set(gradient['max_value_radius'])
+        self.pattern.set(gradient['pattern'])
+
+    def generate_gradient(self, refresh_map=True):
+        # computed in the background - moving the slider cancels computation for its previous value
+        self.root.scheduler.submit(self, self.compute_gradient, tuple(self.root.MAP_SIZE),
+                                   self.min_value_radius.get(), self.max_value_radius.get(), self.pattern.get(),
+                                   self.root.dtype,
+                                   on_done=partial(self.set_gradient, refresh_map=refresh_map))
+
+    def compute_gradient(self, job, map_size, min_value_radius, max_value_radius, pattern, dtype):
+        # runs in the background thread - no access to widgets here
+        if self.basic_array is None \
+                or shape(self.basic_array)[0] != map_size[0]\
+                or shape(self.basic_array)[1] != map_size[1]\
+                or self.basic_array_pattern != pattern \
+                or self.basic_array.dtype != dtype:
+            with span('gradient base', shape=tuple(map_size), pattern=pattern):
+                self.basic_array = gradient_base(map_size, pattern=pattern, dtype=dtype)
+            self.basic_array_pattern = pattern
+        job.check()
+
+        # the only copy of the basic array, clipping and normalization are done in place
+        with span('gradient', shape=tuple(map_size)):
+            array = self.basic_array.copy()
+            apply_gradient_thresholds(array, *gradient_thresholds(map_size, min_value_radius, max_value_radius,
+                                                                  pattern=pattern))
+        return array
+
+    def set_gradient(self, array, refresh_map=True):
+        self.array = array
         if refresh_map:
-            if self.root.img is None or self.root.displayed_frame is self:
+            if self.root.viewport.pyramid is None or self.root.displayed_frame is self:
                 self.show_array()
             elif self.root.displayed_frame is self.root:
                 self.root.display_map()
@@ -218,14 +297,14 @@ class GradientKit(Frame):
         self.clear_btn.grid()
 
     def show_array(self):
-        # normalize values to 0-levels and rescale to 0-255 (grayscale)
-        noise_map = (self.array * self.root.levels).astype(int) / self.root.levels * 255
-        self.root.img = ImageTk.PhotoImage(image=Image.fromarray(noise_map))
-        self.root.canvas.itemconfig(self.root.map_img, image=self.root.img)
+        # only visible tiles are rendered (grayscale of levels)
+        self.root.viewport.show(TilePyramid(shape(self.array), gray_source(self.array, self.root.levels)))
         self.root.displayed_frame = self
 
-    def clear_gradient(self):
+    def clear_gradient(self, refresh_map=True):
+        self.root.scheduler.cancel(self)
         self.show_btn.grid_remove()
         self.clear_btn.grid_remove()
         self.array = None
-        self.root.display_map()
+        if refresh_map:
+            self.root.display_map()
@@ -0,0 +1,99 @@
+from numpy import arange, hypot, maximum, minimum
+
+
+def gradient_base(map_size, offset=(0, 0), shape=None, pattern='circle', dtype=float):
+    """
+    gradient_base - closed form of gradient's base values (minus distance from the middle of the map).
+    Any tile of the map can be computed separately - values depend only on position in the whole map.
+    :param map_size: size of the whole map (rows, columns)
+    :param offset: (row, column) of the first element of the tile
+    :param shape: shape of the tile, whole map if not given
+    :param pattern: 'circle' - euclidean distance, 'square' - distance of the bigger of both axes
+    :param dtype: type of returned array
+    :return: array of base gradient values
+    """
+    if shape is None:
+        shape = map_size
+    rows = arange(offset[0], offset[0] + shape[0])
+    columns = arange(offset[1], offset[1] + shape[1])
+    # distance in rows/columns from the middle, same for both halves of the map
+    a = (map_size[0] // 2 - minimum(rows, map_size[0] - 1 - rows)).astype(dtype)
+    b = (map_size[1] // 2 - minimum(columns, map_size[1] - 1 - columns)).astype(dtype)
+    if pattern == 'square':
+        array = maximum(a[:, None], b[None, :])
+    elif pattern == 'circle':
+        array = hypot(a[:, None], b[None, :])
+    else:
+        raise ValueError("Unknown gradient pattern: {0}".format(pattern))
+    array *= -1
+    return array
+
+
+def gradient_thresholds(map_size, min_value_radius, max_value_radius, pattern='circle'):
+    """
+    gradient_thresholds - values for clipping the gradient, set by radius parameters.
+    :param map_size: size of the whole map (rows, columns)
+    :param min_value_radius: radius (0-1) for max weakening of array's values
+    :param max_value_radius: radius (0-1) for max magnifying of array's values
+    :param pattern: 'circle' or 'square'
+    :return: tuple of (low value, high value, reversed) - reversed if pattern is 1 - base
+    """
+    reverse = max_value_radius < min_value_radius
+
+    def value_at(x, y):
+        value = gradient_base(map_size, offset=(x, y), shape=(1, 1), pattern=pattern)[0, 0]
+        return 1 - value if reverse else value
+
+    # convert radius into array index
+    x_of_border = int(map_size[0] * (1 - max_value_radius) / 2)
+    y_of_border = int(map_size[1] * (1 - max_value_radius) / 2)
+    low = value_at(x_of_border, y_of_border)
+
+    if max_value_radius == min_value_radius:
+        # in case of equal values, make sure indexes differ at least by 1 (pattern gets blank otherwise)
+        x_of_border += 1
+        y_of_border += 1
+    else:
+        x_of_border = int(map_size[0] * (1 - min_value_radius) / 2)
+        y_of_border = int(map_size[1] * (1 - min_value_radius) / 2)
+    high = value_at(x_of_border, y_of_border)
+    return low, high, reverse
+
+
+def apply_gradient_thresholds(array, low, high, reverse):
+    """
+    apply_gradient_thresholds - clips and normalizes (0-1) gradient's base values, all in place.
+    :param array: array of base values (or tile of it), it will be modified
+    :param low: lower clipping value
+    :param high: upper clipping value
+    :param reverse: if True, pattern is reversed (middle is suppressed instead of borders)
+    :return: given array
+    """
+    if reverse:
+        array *= -1
+        array += 1
+    maximum(array, low, out=array)
+    minimum(array, high, out=array)
+    # normalize values to the range: 0-1 (low and high are minimum and maximum of the whole map)
+    if high > low:
+        array -= low
+        array /= high - low
+    return array
+
+
+def gradient_tile(map_size, min_value_radius, max_value_radius, offset=(0, 0), shape=None,
+                  pattern='circle', dtype=float):
+    """
+    gradient_tile - normalized (0-1) gradient pattern for given tile of the map (or whole map).
+    Clipping values and normalization are computed for the whole map, so tiles fit together without seams.
+    :param map_size: size of the whole map (rows, columns)
+    :param min_value_radius: radius (0-1) for max weakening of array's values
+    :param max_value_radius: radius (0-1) for max magnifying of array's values
+    :param offset: (row, column) of the first element of the tile
+    :param shape: shape of the tile, whole map if not given
+    :param pattern: 'circle' or 'square'
+    :param dtype: type of returned array
+    :return: array of gradient values
+    """
+    return apply_gradient_thresholds(gradient_base(map_size, offset, shape, pattern, dtype),
+                                     *gradient_thresholds(map_size, min_value_radius, max_value_radius, pattern))
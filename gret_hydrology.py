@@ -0,0 +1,411 @@
+from gret_composite import row_blocks
+from gret_trace import span
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from numpy import add, arange, argsort, array, asarray, ascontiguousarray, bincount, clip, copyto, empty, \
+    flatnonzero, float32, float64, full, inf, int8, int32, int64, intp, maximum, minimum, ones, shape, sqrt, subtract, \
+    where, zeros
+from numpy.random import default_rng
+
+# default parameters of hydrology stage (see apply_hydrology)
+DEFAULT_HYDROLOGY = dict(droplets=0.1, lifetime=30, inertia=0.05, capacity=4.0, min_capacity=0.01, erosion_rate=0.3,
+                         deposition_rate=0.3, evaporation=0.01, gravity=4.0, seed=0, river_threshold=0.002,
+                         lake_depth=0.005, sea_level=None)
+# colors of water painted over the colorized map (see water_overlays)
+LAKE_COLOR = (40, 80, 200)
+RIVER_COLOR = (60, 115, 230)
+# minimal slope of filled depressions - every cell of filled map has lower neighbour, so water flows out of lakes
+EPSILON = 1e-7
+# narrower strips of columns are not swept by separate threads
+MIN_STRIP = 512
+# number of elements of a block of rows processed by a thread at once
+HYDROLOGY_BLOCK = 1 << 18
+# droplets moving at once - one per DROPLET_SPACING cells of the map, at most DROPLET_ROUND
+DROPLET_SPACING = 256
+DROPLET_ROUND = 1 << 18
+# number of droplets moved by a thread at once
+DROPLET_BATCH = 1 << 14
+# neighbours of a cell (row, column) and distances to them
+NEIGHBOURS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+DISTANCES = tuple(2 ** 0.5 if dy and dx else 1.0 for dy, dx in NEIGHBOURS)
+
+
+def parallel_map(pool, function, items):
+    # map by the pool of threads (numpy releases the GIL), or in this thread
+    if pool is None or len(items) == 1:
+        return [function(item) for item in items]
+    return pool.map(function, items)
+
+
+def border_outlets(heightmap, sea_level=None):
+    """
+    border_outlets - cells where water leaves the map: borders of the map and the sea.
+    :param heightmap: 2D heightmap
+    :param sea_level: cells of height up to sea level are the sea (None - only borders)
+    :return: boolean array
+    """
+    outlets = zeros(shape(heightmap), dtype=bool) if sea_level is None else heightmap <= sea_level
+    outlets[[0, -1], :] = True
+    outlets[:, [0, -1]] = True
+    return outlets
+
+
+def sweep_rows(padded, heightmap, epsilon, reverse, strip):
+    """
+    sweep_rows - one sweep of depression filling through rows (top-down or bottom-up), in place.
+    Every row is lowered to 3 neighbours in the previous (already swept) row plus epsilon, but not below the heightmap,
+    so the surface is lowered along whole paths going down (or up) in one sweep - row by row, vectorized along rows.
+    :param padded: surface of water padded by infinity
+    :param heightmap: 2D heightmap (of type of the surface)
+    :param epsilon: minimal slope of the surface
+    :param reverse: False - top-down, True - bottom-up
+    :param strip: (first column, last column + 1) of swept part of rows
+    :return: True if the surface was lowered
+    """
+    start, stop = strip
+    rows = shape(heightmap)[0]
+    lowest = empty(stop - start, dtype=padded.dtype)
+    step = 1 if reverse else -1
+    lowered = False
+    for row in (range(rows - 1, -1, -1) if reverse else range(rows)):
+        previous = padded[row + 1 + step, start:stop + 2]
+        minimum(previous[:-2], previous[1:-1], out=lowest)
+        minimum(lowest, previous[2:], out=lowest)
+        lowest += epsilon
+        maximum(lowest, heightmap[row, start:stop], out=lowest)
+        current = padded[row + 1, start + 1:stop + 1]
+        if not lowered:
+            lowered = (lowest < current).any()
+        minimum(current, lowest, out=current)
+    return bool(lowered)
+
+
+def fill_depressions(heightmap, outlets, epsilon=EPSILON, pool=None, workers=1):
+    """
+    fill_depressions - surface of water filling all depressions of the heightmap (lakes),
+    with slope of at least epsilon towards outlets, so water flows out of every cell.
+    Surface (Planchon-Darboux) starts at infinity out of outlets and is lowered by sweeps down and up (see sweep_rows),
+    then left and right (sweeps through rows of transposed surface) - the surface is found when two phases
+    in a row change nothing, so every cell is at most epsilon above its lowest neighbour (or on the heightmap).
+    Few phases are enough for usual maps. The surface and its transposed copy are allocated once,
+    in type of the heightmap (float64 if epsilon would be lost in its precision).
+    :param heightmap: 2D heightmap
+    :param outlets: boolean array of cells where water leaves the map (have to include borders)
+    :param epsilon: minimal slope of the surface
+    :param pool: optional ThreadPool - strips of columns are swept by threads
+    :param workers: number of strips swept at once
+    :return: surface of water (of type of the heightmap), the same as heightmap out of depressions
+    """
+    rows, columns = shape(heightmap)
+    float_type = heightmap.dtype.type if heightmap.dtype.kind == 'f' else float64
+    top = float_type(heightmap.max())
+    if epsilon and not top + float_type(epsilon) > top:
+        float_type = float64
+    heightmap = asarray(heightmap, dtype=float_type)
+    padded = full((rows + 2, columns + 2), inf, dtype=float_type)
+    surface = padded[1:-1, 1:-1]
+    surface[outlets] = heightmap[outlets]
+    # left-right sweeps are sweeps through rows of transposed surface (rows are contiguous), kept equal to padded
+    transposed = ascontiguousarray(padded.T)
+    # (swept surface, its heightmap, the other copy of the surface) of both phases
+    phases = ((padded, heightmap, transposed), (transposed, ascontiguousarray(heightmap.T), padded))
+
+    def sweep(padded, heightmap, reverse):
+        # threads sweeping neighbouring strips see each other's values - old or new, both are above the result
+        columns = shape(heightmap)[1]
+        width = max(MIN_STRIP, -(-columns // (workers if pool is not None else 1)))
+        strips = [(column, min(column + width, columns)) for column in range(0, columns, width)]
+        return any(parallel_map(pool, lambda strip: sweep_rows(padded, heightmap, epsilon, reverse, strip), strips))
+
+    phase = unchanged = 0
+    while unchanged < 2:
+        swept, swept_heightmap, other = phases[phase % 2]
+        if any([sweep(swept, swept_heightmap, False), sweep(swept, swept_heightmap, True)]):
+            unchanged = 0
+            copyto(other, swept.T)
+        else:
+            unchanged += 1
+        phase += 1
+    return surface
+
+
+def receivers_block(padded, outlets, block, out):
+    # flat index of the lowest (by slope) neighbour of every cell of the block, outlets drain to themselves
+    start, stop = block
+    rows, columns = stop - start, shape(outlets)[1]
+    window = padded[start:stop + 2]
+    centre = window[1:-1, 1:-1]
+    steepest = zeros((rows, columns))
+    direction = full((rows, columns), -1, dtype=int8)
+    for index, (dy, dx) in enumerate(NEIGHBOURS):
+        slope = subtract(centre, window[1 + dy:rows + 1 + dy, 1 + dx:columns + 1 + dx])
+        slope /= DISTANCES[index]
+        steeper = slope > steepest
+        steepest[steeper] = slope[steeper]
+        direction[steeper] = index
+    direction[outlets[start:stop]] = -1
+    # offsets of flat index for every direction, the last one (-1) is the cell itself
+    offsets = array([dy * columns + dx for dy, dx in NEIGHBOURS] + [0])
+    out[start:stop] = (arange(start * columns, stop * columns).reshape(rows, columns) + offsets[direction])
+
+
+def flow_receivers(surface, outlets, pool=None):
+    """
+    flow_receivers - cell into which water flows from every cell (steepest descent among 8 neighbours).
+    :param surface: surface of water without depressions (see fill_depressions)
+    :param outlets: boolean array of cells where water leaves the map
+    :param pool: optional ThreadPool for blocks of rows
+    :return: array of flat indexes of receivers, of shape of the surface (outlets are their own receivers)
+    """
+    rows, columns = shape(surface)
+    padded = full((rows + 2, columns + 2), inf)
+    padded[1:-1, 1:-1] = surface
+    receivers = empty((rows, columns), dtype=int32 if rows * columns < 2 ** 31 else int64)
+    parallel_map(pool, lambda block: receivers_block(padded, outlets, block, receivers),
+                 row_blocks((rows, columns), HYDROLOGY_BLOCK))
+    return receivers
+
+
+def flow_accumulation(receivers):
+    """
+    flow_accumulation - number of cells draining through every cell (including itself).
+    Cells are peeled from sources downstream (topological order) - every round adds flow of cells
+    without remaining donors to their receivers, so every cell is touched once, by vectorized operations.
+    :param receivers: array of flat indexes of receivers (see flow_receivers)
+    :return: array of numbers of cells, of shape of receivers
+    """
+    flat = receivers.ravel()
+    cells = arange(flat.size, dtype=flat.dtype)
+    accumulation = ones(flat.size, dtype=flat.dtype)
+    draining = flat != cells
+    donors = bincount(flat[draining], minlength=flat.size).astype(flat.dtype)
+    frontier = flatnonzero(draining & (donors == 0))
+    # add.at with array of values is much faster than with scalar
+    decrements = full(frontier.size, -1, dtype=flat.dtype)
+    # position of the last occurrence of cell in targets - for removing duplicates without sorting
+    stamp = empty(flat.size, dtype=flat.dtype)
+    while frontier.size:
+        targets = flat[frontier]
+        add.at(accumulation, targets, accumulation[frontier])
+        add.at(donors, targets, decrements[:targets.size])
+        targets = targets[donors[targets] == 0]
+        positions = cells[:targets.size]
+        stamp[targets] = positions
+        targets = targets[stamp[targets] == positions]
+        # outlets collect water, they do not pass it on
+        frontier = targets[flat[targets] != targets]
+    return accumulation.reshape(shape(receivers))
+
+
+def droplets_step(heightmap, droplets, params):
+    """
+    droplets_step - moves droplets of water one cell along the slope, they erode or deposit sediment.
+    :param heightmap: 2D heightmap (read only)
+    :param droplets: dictionary of arrays: x, y, dx, dy, speed, water, sediment - updated in place
+    :param params: parameters of erosion (see DEFAULT_HYDROLOGY)
+    :return: tuple of (flat indexes of changed cells, changes of height, span of changed cells (first, last),
+             boolean array of living droplets)
+    """
+    rows, columns = shape(heightmap)
+    flat = heightmap.ravel()
+    x, y = droplets['x'], droplets['y']
+    corners, u, v, (h00, h10, h01, h11) = cell_corners(flat, columns, x, y)
+    # bilinear interpolation of height and its gradient
+    gradient_x = (h10 - h00) * (1 - v) + (h11 - h01) * v
+    gradient_y = (h01 - h00) * (1 - u) + (h11 - h10) * u
+    height = (h00 * (1 - u) + h10 * u) * (1 - v) + (h01 * (1 - u) + h11 * u) * v
+
+    inertia = params['inertia']
+    dx = droplets['dx'] * inertia - gradient_x * (1 - inertia)
+    dy = droplets['dy'] * inertia - gradient_y * (1 - inertia)
+    length = sqrt(dx * dx + dy * dy)
+    alive = length > 0
+    length[~alive] = 1
+    dx /= length
+    dy /= length
+    new_x, new_y = x + dx, y + dy
+    alive &= (new_x >= 0) & (new_x < columns - 1) & (new_y >= 0) & (new_y < rows - 1)
+    # droplets which left the map (or stopped on flat) stay where they are - without changes
+    new_x = where(alive, new_x, x)
+    new_y = where(alive, new_y, y)
+    _, new_u, new_v, (n00, n10, n01, n11) = cell_corners(flat, columns, new_x, new_y)
+    delta = (n00 * (1 - new_u) + n10 * new_u) * (1 - new_v) + (n01 * (1 - new_u) + n11 * new_u) * new_v
+    delta -= height
+
+    speed, water, sediment = droplets['speed'], droplets['water'], droplets['sediment']
+    capacity = maximum(-delta * speed * water * params['capacity'], params['min_capacity'])
+    # uphill - the hole is filled (as much as sediment allows), over capacity - part of sediment is deposited,
+    # otherwise terrain is eroded (not deeper than the way down)
+    change = where(delta > 0, minimum(delta, sediment),
+                   where(sediment > capacity, (sediment - capacity) * params['deposition_rate'],
+                         -minimum((capacity - sediment) * params['erosion_rate'], -delta)))
+    change *= alive
+    sediment -= change
+
+    speed[:] = sqrt(maximum(speed * speed - delta * params['gravity'], 0))
+    water *= 1 - params['evaporation']
+    droplets.update(x=new_x, y=new_y, dx=dx, dy=dy)
+    # change is spread over corners of the previous position (bilinear weights)
+    indexes = (corners, corners + 1, corners + columns, corners + columns + 1)
+    weights = ((1 - u) * (1 - v), u * (1 - v), (1 - u) * v, u * v)
+    # changes of the type of the heightmap - add.at is much faster without casting
+    changes = tuple((change * weight).astype(flat.dtype, copy=False) for weight in weights)
+    return indexes, changes, (int(corners.min()), int(corners.max()) + columns + 1), alive
+
+
+def cell_corners(flat, columns, x, y):
+    """
+    cell_corners - heights of corners of cells of given positions.
+    :param flat: flattened heightmap
+    :param columns: number of columns of the heightmap
+    :param x: columns of positions (float)
+    :param y: rows of positions (float)
+    :return: tuple of (flat indexes of top left corners, fractions of x, fractions of y,
+             tuple of heights of top left, top right, bottom left and bottom right corners)
+    """
+    ix, iy = x.astype(intp), y.astype(intp)
+    corners = iy * columns + ix
+    return corners, x - ix, y - iy, (flat[corners], flat[corners + 1], flat[corners + columns],
+                                     flat[corners + columns + 1])
+
+
+def erode(heightmap, droplets=DEFAULT_HYDROLOGY['droplets'], seed=0, pool=None, **params):
+    """
+    erode - hydraulic erosion of the heightmap by droplets of water (in place).
+    Droplets are simulated in rounds - all droplets of a round move one step at a time (vectorized, parts
+    of the round by threads) and changes of terrain are applied after each step, always in the same order,
+    so the result does not depend on the number of threads. Droplets of a round are sparse (one per
+    DROPLET_SPACING cells), so they rarely erode the same cells at once. Parts of the round start in separate
+    bands of rows, so changes of every other part are applied by threads at once (see apply_changes).
+    :param heightmap: 2D heightmap (float), modified in place
+    :param droplets: number of droplets per cell of the map
+    :param seed: seed of random starting positions of droplets
+    :param pool: optional ThreadPool for parts of rounds
+    :param params: parameters of erosion (see DEFAULT_HYDROLOGY)
+    :return: given heightmap
+    """
+    params = dict(DEFAULT_HYDROLOGY, **params)
+    rows, columns = shape(heightmap)
+    if rows < 2 or columns < 2:
+        return heightmap
+    flat = heightmap.ravel()
+    # droplets are computed in precision of the heightmap (float32 is precise enough for maps of any size)
+    float_type = float32 if heightmap.dtype == float32 else float64
+    rng = default_rng(seed)
+    remaining = int(droplets * rows * columns)
+    round_size = min(DROPLET_ROUND, max(1, rows * columns // DROPLET_SPACING))
+    while remaining > 0:
+        # droplets of the round start in random positions
+        size = min(round_size, remaining)
+        remaining -= size
+        x = rng.random(size, dtype=float_type) * (columns - 1)
+        y = rng.random(size, dtype=float_type) * (rows - 1)
+        # droplets in order of their cells - neighbouring droplets read neighbouring parts of the map (cache)
+        order = argsort(y.astype(intp) * columns + x.astype(intp))
+        x, y = x[order], y[order]
+        parts = [(start, min(start + DROPLET_BATCH, size)) for start in range(0, size, DROPLET_BATCH)]
+        batches = [dict(x=x[start:stop], y=y[start:stop], dx=zeros(stop - start, float_type),
+                        dy=zeros(stop - start, float_type), speed=ones(stop - start, float_type),
+                        water=ones(stop - start, float_type), sediment=zeros(stop - start, float_type))
+                   for start, stop in parts]
+        for _ in range(int(params['lifetime'])):
+            results = parallel_map(pool, lambda batch: droplets_step(heightmap, batch, params), batches)
+            apply_changes(pool, flat, results)
+            for batch, (_, _, _, alive) in zip(batches, results):
+                for key in batch:
+                    batch[key] = batch[key][alive]
+            batches = [batch for batch in batches if batch['x'].size]
+            if not batches:
+                break
+    return heightmap
+
+
+def apply_changes(pool, flat, results):
+    """
+    apply_changes - applies changes of terrain by parts of the round of droplets (see droplets_step).
+    Changes of even parts are applied first, then changes of odd parts, part by part and corner by corner.
+    Parts of a phase are applied by threads at once when their spans do not overlap - the order of changes
+    of every cell stays the same, so does the result.
+    :param pool: optional ThreadPool
+    :param flat: flattened heightmap, modified in place
+    :param results: results of droplets_step of parts of the round
+    :return: None
+    """
+    def apply(result):
+        indexes, changes, _, _ = result
+        for corner in range(4):
+            add.at(flat, indexes[corner], changes[corner])
+
+    for phase in (results[::2], results[1::2]):
+        spans = [bounds for _, _, bounds, _ in phase]
+        if all(previous[1] < following[0] for previous, following in zip(spans, spans[1:])):
+            parallel_map(pool, apply, phase)
+        else:
+            for result in phase:
+                apply(result)
+
+
+def water_masks(heightmap, surface, accumulation, outlets, river_threshold, lake_depth):
+    """
+    water_masks - rivers and lakes of the map.
+    :param heightmap: 2D heightmap
+    :param surface: surface of water (see fill_depressions)
+    :param accumulation: numbers of cells draining through cells (see flow_accumulation)
+    :param outlets: boolean array of cells where water leaves the map (sea is neither river nor lake)
+    :param river_threshold: part of the map (0-1) which has to drain through a cell of river
+    :param lake_depth: minimal depth of water of lakes (shallower depressions are just wet)
+    :return: tuple of boolean arrays (rivers, lakes)
+    """
+    lakes = subtract(surface, heightmap) > lake_depth
+    lakes &= ~outlets
+    rivers = accumulation >= max(1.0, river_threshold * accumulation.size)
+    rivers &= ~lakes
+    rivers &= ~outlets
+    return rivers, lakes
+
+
+def apply_hydrology(heightmap, workers=None, **params):
+    """
+    apply_hydrology - hydraulic erosion of the heightmap, then rivers (flow accumulation)
+    and lakes (filled depressions). Every stage is vectorized (by blocks of rows or batches of droplets),
+    run by threads for big maps.
+    :param heightmap: 2D heightmap with values from 0 to 1 (not quantized, e.g. MapComposer.get_normalized_map)
+    :param workers: number of threads (all cores by default)
+    :param params: parameters of hydrology (see DEFAULT_HYDROLOGY):
+                   - droplets, lifetime, inertia, capacity, min_capacity, erosion_rate, deposition_rate,
+                     evaporation, gravity, seed - erosion (droplets per cell of the map, 0 - no erosion)
+                   - river_threshold - part of the map draining through a cell of river
+                   - lake_depth - minimal depth of lakes
+                   - sea_level - cells up to sea level are the sea, where rivers end (None - only borders of the map)
+    :return: tuple of (eroded heightmap clipped to 0-1, river mask, lake mask)
+    """
+    params = dict(DEFAULT_HYDROLOGY, **params)
+    unknown = set(params) - set(DEFAULT_HYDROLOGY)
+    if unknown:
+        raise ValueError("Unknown parameters of hydrology: {0}".format(', '.join(sorted(unknown))))
+    workers = workers or cpu_count()
+    # eroded copy - float32 heightmaps stay float32
+    heightmap = array(heightmap, dtype=heightmap.dtype if heightmap.dtype.kind == 'f' else float64)
+    pool = ThreadPool(workers) if workers > 1 and heightmap.size >= HYDROLOGY_BLOCK else None
+    try:
+        erosion = {key: params[key] for key in ('lifetime', 'inertia', 'capacity', 'min_capacity', 'erosion_rate',
+                                                 'deposition_rate', 'evaporation', 'gravity')}
+        with span('erosion', droplets=params['droplets']):
+            erode(heightmap, params['droplets'], params['seed'], pool, **erosion)
+            clip(heightmap, 0, 1, out=heightmap)
+        outlets = border_outlets(heightmap, params['sea_level'])
+        with span('fill depressions'):
+            surface = fill_depressions(heightmap, outlets, pool=pool, workers=workers)
+        with span('flow accumulation'):
+            accumulation = flow_accumulation(flow_receivers(surface, outlets, pool))
+        rivers, lakes = water_masks(heightmap, surface, accumulation, outlets, params['river_threshold'],
+                                    params['lake_depth'])
+    finally:
+        if pool is not None:
+            pool.close()
+    return heightmap, rivers, lakes
+
+
+def water_overlays(rivers, lakes):
+    # masks painted over the colorized map (see convert_heightmap_into_RGB)
+    return [(lakes, LAKE_COLOR), (rivers, RIVER_COLOR)]
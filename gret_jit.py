@@ -0,0 +1,171 @@
+"""
+gret_jit - noise kernels compiled with Numba (optional dependency).
+
+Kernels fill preallocated array (or a region of it) in compiled loops - no Python call per pixel
+and no temporary arrays. They release the GIL, so bands of rows are generated by threads, sharing
+the output array - nothing is pickled or copied between processes.
+Kernels are in gret_jit_kernels, imported with Numba on first generation - importing Numba takes longer
+than the rest of the startup, so it is not done by processes which never use the 'numba' kernel.
+Without Numba, the same functions fall back to noise package (snoise2 / pnoise2 called pixel by pixel).
+"""
+from gret_noise import BAND_ROWS, generate_simplex_array, generate_simplex_row, split_into_bands, torus_coordinates
+from importlib.util import find_spec
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from noise import pnoise2, snoise2
+from numpy import arange, asarray, empty, float32
+
+# Numba is installed - without it, pure Python fallback (noise package)
+NUMBA_AVAILABLE = find_spec('numba') is not None
+# default period of Perlin noise (the same as in pnoise2)
+PERLIN_REPEAT = 1024.0
+
+NOISE_TYPES = ('simplex', 'perlin')
+
+
+def noise_backend():
+    """
+    noise_backend - name and version of backend of compiled kernels.
+    :return: e.g. 'numba 0.60.0' or 'noise (pure Python fallback)'
+    """
+    if not NUMBA_AVAILABLE:
+        return 'noise (pure Python fallback)'
+    import numba
+    return 'numba ' + numba.__version__
+
+
+def effective_kernel(kernel):
+    """
+    effective_kernel - kernel actually used for generation: 'numba' falls back to 'snoise2'
+    when Numba is not installed.
+    :param kernel: 'numpy', 'snoise2' or 'numba'
+    :return: kernel
+    """
+    if kernel == 'numba' and not NUMBA_AVAILABLE:
+        return 'snoise2'
+    return kernel
+
+
+def fill_noise_band(out, row, column, scale, octaves, persistence, base, noise_type='simplex', lacunarity=2.0,
+                    period=None):
+    """
+    fill_noise_band - fills array with noise, element [i, j] is noise at ((row + i) / scale, (column + j) / scale).
+    :param out: array (or view of bigger array) to be filled
+    :param row: row of the first element in the whole array
+    :param column: column of the first element in the whole array
+    :param scale: for controlling speed of changes in the array
+    :param octaves: number of layers, each with more detail
+    :param persistence: influence of each octave on the main one
+    :param base: seed for the array generation (same seed - same output)
+    :param noise_type: 'simplex' (same as snoise2) or 'perlin' (same as pnoise2)
+    :param lacunarity: frequency multiplier of each next octave
+    :param period: optional (rows, columns) after which noise repeats - tileable noise (Perlin noise
+                   is tileable only if period is a multiple of scale)
+    :return: None
+    """
+    rows, columns = out.shape
+    if period is None:
+        repeat = {} if noise_type == 'simplex' else dict(repeatx=PERLIN_REPEAT, repeaty=PERLIN_REPEAT)
+    else:
+        repeat = dict(repeatx=period[0] / scale, repeaty=period[1] / scale)
+    if not NUMBA_AVAILABLE:
+        # pnoise2 takes integer seed
+        noise_function, seed = (snoise2, base) if noise_type == 'simplex' else (pnoise2, int(base))
+        for x in range(rows):
+            out[x] = [noise_function((row + x) / scale, (column + y) / scale, octaves=octaves,
+                                     persistence=persistence, lacunarity=lacunarity, base=seed, **repeat)
+                      for y in range(columns)]
+        return
+    # the first call imports Numba and loads compiled kernels
+    from gret_jit_kernels import fill_fractal_perlin, fill_fractal_simplex, fill_fractal_tileable
+    # coordinates are computed in double precision and then cast (as done when passing them to snoise2)
+    xs = (arange(row, row + rows) / scale).astype(float32)
+    ys = (arange(column, column + columns) / scale).astype(float32)
+    # memory-mapped arrays are passed as plain arrays (the same memory)
+    if noise_type == 'perlin':
+        fill_fractal_perlin(asarray(out), xs, ys, int(octaves), float32(persistence), float32(lacunarity),
+                            float32(repeat['repeatx']), float32(repeat['repeaty']), int(base))
+    elif period is None:
+        fill_fractal_simplex(asarray(out), xs, ys, int(octaves), float32(persistence), float32(lacunarity),
+                             float32(base))
+    else:
+        # wrapping of coordinates is computed once for every row and column
+        xs, zs = torus_coordinates(xs, repeat['repeatx'], base)
+        ys, ws = torus_coordinates(ys, repeat['repeaty'], base)
+        fill_fractal_tileable(asarray(out), xs, zs, ys, ws, int(octaves), float32(persistence),
+                              float32(lacunarity))
+
+
+def generate_jit_array(shape, scale=100.0, octaves=6, persistence=0.5, base=0.0, offset=(0, 0), out=None,
+                       dtype=float32, progress=None, workers=None, noise_type='simplex', period=None):
+    """
+    generate_jit_array - noise array generated by compiled kernels, bands of rows are filled by threads.
+    Same values as generate_simplex_array (within NOISE_TOLERANCE of gret_noise).
+    :param shape: shape of the array (rows, columns)
+    :param scale: for controlling speed of changes in the array
+    :param octaves: number of layers, each with more detail
+    :param persistence: influence of each octave on the main one
+    :param base: seed for the array generation (same seed - same output)
+    :param offset: (row, column) of the first element - for generating tiles of bigger array
+    :param out: optional array of given shape, to be filled with noise values
+    :param dtype: type of returned array (used only if out is not given)
+    :param progress: optional function(done bands, all bands) called after each band
+                    (exception raised by it cancels the generation)
+    :param workers: number of threads (all cores by default, one without Numba - the fallback holds the GIL)
+    :param noise_type: 'simplex' or 'perlin'
+    :param period: optional (rows, columns) after which noise repeats - tileable noise
+    :return: array of noise values
+    """
+    if noise_type not in NOISE_TYPES:
+        raise ValueError("Unknown noise type: {0}".format(noise_type))
+    if out is None:
+        out = empty(shape, dtype=dtype)
+    workers = 1 if not NUMBA_AVAILABLE else workers or cpu_count()
+    bands = split_into_bands(shape[0], max(workers * 4, -(-shape[0] // BAND_ROWS)))
+
+    def fill(band):
+        fill_noise_band(out[band[0]:band[1]], offset[0] + band[0], offset[1], scale, octaves, persistence, base,
+                        noise_type, period=period)
+
+    if workers == 1:
+        for done, band in enumerate(bands, 1):
+            fill(band)
+            if progress is not None:
+                progress(done, len(bands))
+        return out
+    with ThreadPool(workers) as pool:
+        for done, _ in enumerate(pool.imap_unordered(fill, bands), 1):
+            if progress is not None:
+                progress(done, len(bands))
+    return out
+
+
+def generate_noise_array(shape, kernel='numpy', dtype=float32, progress=None, workers=None, out=None, **params):
+    """
+    generate_noise_array - noise array generated by given kernel in this process (see gret_core.generate_layer).
+    :param shape: shape of the array (rows, columns)
+    :param kernel: 'numpy' - vectorized noise, 'snoise2' - noise computed pixel by pixel,
+                   'numba' - compiled noise generated by threads (snoise2 if Numba is not installed)
+    :param dtype: type of the array
+    :param progress: optional function(done, total) called during generation
+                    (exception raised by it cancels the generation)
+    :param workers: number of threads of 'numba' kernel (all cores by default)
+    :param out: optional array of given shape, to be filled with noise values (e.g. tile of memory-mapped array)
+    :param params: noise parameters - scale, octaves, persistence, base, offset and period
+    :return: array of noise values (-1 to 1)
+    """
+    kernel = effective_kernel(kernel)
+    if kernel == 'numba':
+        # compiled kernels release the GIL - bands of rows are filled by threads, in place
+        return generate_jit_array(shape, dtype=dtype, progress=progress, workers=workers, out=out, **params)
+    if kernel == 'numpy':
+        # vectorized simplex noise - whole array in a few array operations
+        return generate_simplex_array(shape, dtype=dtype, progress=progress, out=out, **params)
+    array = empty(shape, dtype=dtype) if out is None else out
+    params = dict(params)
+    row, column = params.pop('offset', (0, 0))
+    for x in range(shape[0]):
+        array[x] = generate_simplex_row(row + x, shape[1], column=column, **params)
+        if progress is not None:
+            progress(x + 1, shape[0])
+    return array
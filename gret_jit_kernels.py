@@ -0,0 +1,204 @@
+"""
+gret_jit_kernels - noise kernels compiled with Numba (see gret_jit).
+
+Numba is imported (and kernels are loaded from its cache) with this module - gret_jit imports it on first use,
+so processes which never generate noise with the 'numba' kernel (GUI startup, workers of pools) do not pay for it.
+"""
+from gret_noise import F2, F4, G2, G4, GRAD3_X, GRAD3_Y, GRAD4, PERM, SIMPLEX4
+from math import floor
+from numba import njit
+from numpy import array, float32, fmod, int64
+
+# gradients of Perlin noise - the same as GRAD3 table of noise package (hash taken modulo 16)
+PERLIN_GRAD_X = array([1, -1, 1, -1, 1, -1, 1, -1, 0, 0, 0, 0, 1, -1, 0, 0], dtype=float32)
+PERLIN_GRAD_Y = array([1, 1, -1, -1, 0, 0, 0, 0, 1, -1, 1, -1, 0, 0, -1, 1], dtype=float32)
+# constants of kernels - float32, so that compiled code computes in single precision, as C code does
+ZERO = float32(0)
+HALF = float32(0.5)
+ONE = float32(1)
+TWO = float32(2)
+
+
+@njit(nogil=True, cache=True)
+def simplex2(x, y):
+    # single octave of 2D simplex noise - line by line the same as simplex_noise2 of gret_noise
+    s = (x + y) * F2
+    i = float32(floor(x + s))
+    j = float32(floor(y + s))
+    t = (i + j) * G2
+    x0 = x - (i - t)
+    y0 = y - (j - t)
+    if x0 > y0:
+        i1, j1 = 1, 0
+    else:
+        i1, j1 = 0, 1
+    x1 = x0 - float32(i1) + G2
+    y1 = y0 - float32(j1) + G2
+    x2 = x0 + G2 * TWO - ONE
+    y2 = y0 + G2 * TWO - ONE
+
+    ii = int64(i) & 255
+    jj = int64(j) & 255
+    g0 = PERM[ii + PERM[jj]] % 12
+    g1 = PERM[ii + i1 + PERM[jj + j1]] % 12
+    g2 = PERM[ii + 1 + PERM[jj + 1]] % 12
+
+    # contribution of each corner of simplex, zero if out of its radius
+    f0 = max(HALF - x0 * x0 - y0 * y0, ZERO)
+    f0 *= f0
+    f0 *= f0
+    f0 *= GRAD3_X[g0] * x0 + GRAD3_Y[g0] * y0
+    f1 = max(HALF - x1 * x1 - y1 * y1, ZERO)
+    f1 *= f1
+    f1 *= f1
+    f1 *= GRAD3_X[g1] * x1 + GRAD3_Y[g1] * y1
+    f2 = max(HALF - x2 * x2 - y2 * y2, ZERO)
+    f2 *= f2
+    f2 *= f2
+    f2 *= GRAD3_X[g2] * x2 + GRAD3_Y[g2] * y2
+    return (f0 + f1 + f2) * float32(70)
+
+
+@njit(nogil=True, cache=True)
+def simplex4(x, y, z, w):
+    # single octave of 4D simplex noise - the same as simplex_noise4 of gret_noise
+    s = (x + y + z + w) * F4
+    i = float32(floor(x + s))
+    j = float32(floor(y + s))
+    k = float32(floor(z + s))
+    l = float32(floor(w + s))
+    t = (i + j + k + l) * G4
+    x0 = x - (i - t)
+    y0 = y - (j - t)
+    z0 = z - (k - t)
+    w0 = w - (l - t)
+
+    c = (x0 > y0) * 32 + (x0 > z0) * 16 + (y0 > z0) * 8 + (x0 > w0) * 4 + (y0 > w0) * 2 + (z0 > w0)
+    ii = int64(i) & 255
+    jj = int64(j) & 255
+    kk = int64(k) & 255
+    ll = int64(l) & 255
+    total = ZERO
+    for corner in range(5):
+        # offsets of the corner: 0 for the first corner, 1 for the last one, from ranks for the others
+        if corner == 0:
+            i1 = j1 = k1 = l1 = 0
+        elif corner == 4:
+            i1 = j1 = k1 = l1 = 1
+        else:
+            i1 = int64(SIMPLEX4[c, 0] >= 4 - corner)
+            j1 = int64(SIMPLEX4[c, 1] >= 4 - corner)
+            k1 = int64(SIMPLEX4[c, 2] >= 4 - corner)
+            l1 = int64(SIMPLEX4[c, 3] >= 4 - corner)
+        offset = G4 * float32(corner)
+        xx = x0 - float32(i1) + offset
+        yy = y0 - float32(j1) + offset
+        zz = z0 - float32(k1) + offset
+        ww = w0 - float32(l1) + offset
+        g = PERM[ii + i1 + PERM[jj + j1 + PERM[kk + k1 + PERM[ll + l1]]]] & 31
+        # contribution of the corner, zero if out of its radius
+        f = max(float32(0.6) - xx * xx - yy * yy - zz * zz - ww * ww, ZERO)
+        f *= f
+        f *= f
+        f *= GRAD4[g, 0] * xx + GRAD4[g, 1] * yy + GRAD4[g, 2] * zz + GRAD4[g, 3] * ww
+        total += f
+    return total * float32(27)
+
+
+@njit(nogil=True, cache=True)
+def perlin2(x, y, repeat_x, repeat_y, base):
+    # single octave of 2D (improved) Perlin noise - the same as noise2 of _perlin.c of noise package
+    i = int64(floor(fmod(x, repeat_x)))
+    j = int64(floor(fmod(y, repeat_y)))
+    ii = int64(fmod(float32(i + 1), repeat_x))
+    jj = int64(fmod(float32(j + 1), repeat_y))
+    i = (i & 255) + base
+    j = (j & 255) + base
+    ii = (ii & 255) + base
+    jj = (jj & 255) + base
+
+    x -= float32(floor(x))
+    y -= float32(floor(y))
+    fx = x * x * x * (x * (x * float32(6) - float32(15)) + float32(10))
+    fy = y * y * y * (y * (y * float32(6) - float32(15)) + float32(10))
+
+    a = PERM[i]
+    aa = PERM[a + j]
+    ab = PERM[a + jj]
+    b = PERM[ii]
+    ba = PERM[b + j]
+    bb = PERM[b + jj]
+    h = PERM[aa] & 15
+    n00 = x * PERLIN_GRAD_X[h] + y * PERLIN_GRAD_Y[h]
+    h = PERM[ba] & 15
+    n10 = (x - ONE) * PERLIN_GRAD_X[h] + y * PERLIN_GRAD_Y[h]
+    h = PERM[ab] & 15
+    n01 = x * PERLIN_GRAD_X[h] + (y - ONE) * PERLIN_GRAD_Y[h]
+    h = PERM[bb] & 15
+    n11 = (x - ONE) * PERLIN_GRAD_X[h] + (y - ONE) * PERLIN_GRAD_Y[h]
+    bottom = n00 + fx * (n10 - n00)
+    top = n01 + fx * (n11 - n01)
+    return bottom + fy * (top - bottom)
+
+
+@njit(nogil=True, cache=True)
+def fill_fractal_simplex(out, xs, ys, octaves, persistence, lacunarity, base):
+    # out[r, c] = sum of octaves of simplex noise at (xs[r], ys[c]) - as snoise2 does
+    for r in range(out.shape[0]):
+        for c in range(out.shape[1]):
+            x = xs[r]
+            y = ys[c]
+            freq = ONE
+            amp = ONE
+            max_amp = ONE
+            total = simplex2(x + base, y + base)
+            for _ in range(1, octaves):
+                freq *= lacunarity
+                amp *= persistence
+                max_amp += amp
+                total += simplex2(x * freq + base, y * freq + base) * amp
+            out[r, c] = total / max_amp
+
+
+@njit(nogil=True, cache=True)
+def fill_fractal_tileable(out, xs, zs, ys, ws, octaves, persistence, lacunarity):
+    # out[r, c] = sum of octaves of 4D simplex noise at (xs[r], ys[c], zs[r], ws[c]) - coordinates
+    # wrapped around a torus (see torus_coordinates of gret_noise) - as snoise2 with repeatx and repeaty does
+    for r in range(out.shape[0]):
+        for c in range(out.shape[1]):
+            x = xs[r]
+            y = ys[c]
+            z = zs[r]
+            w = ws[c]
+            freq = ONE
+            amp = ONE
+            max_amp = ONE
+            total = simplex4(x, y, z, w)
+            for _ in range(1, octaves):
+                freq *= lacunarity
+                amp *= persistence
+                max_amp += amp
+                total += simplex4(x * freq, y * freq, z * freq, w * freq) * amp
+            out[r, c] = total / max_amp
+
+
+@njit(nogil=True, cache=True)
+def fill_fractal_perlin(out, xs, ys, octaves, persistence, lacunarity, repeat_x, repeat_y, base):
+    # out[r, c] = sum of octaves of Perlin noise at (xs[r], ys[c]) - as pnoise2 does
+    for r in range(out.shape[0]):
+        for c in range(out.shape[1]):
+            x = xs[r]
+            y = ys[c]
+            if octaves == 1:
+                out[r, c] = perlin2(x, y, repeat_x, repeat_y, base)
+                continue
+            freq = ONE
+            amp = ONE
+            max_amp = ZERO
+            total = ZERO
+            for _ in range(octaves):
+                total += perlin2(x * freq, y * freq, repeat_x * freq, repeat_y * freq, base) * amp
+                max_amp += amp
+                freq *= lacunarity
+                amp *= persistence
+            out[r, c] = total / max_amp
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from queue import Empty, Queue
+from threading import Condition, Thread
+from traceback import print_exception
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job(object):
+    """
+    Job - one task of the scheduler.
+    Function of the job gets the job as the first argument and should call job.progress(done, total)
+    from time to time - it reports progress and stops the job (raises JobCancelled) if job was cancelled.
+    """
+    def __init__(self, channel, function, args, kwargs, on_done=None, on_partial=None, on_discard=None):
+        self.channel = channel
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.on_done = on_done
+        self.on_partial = on_partial
+        self.on_discard = on_discard
+        self.cancelled = False
+        self.done = 0
+        self.total = 0
+        self.results = None
+
+    def cancel(self):
+        self.cancelled = True
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    def progress(self, done, total):
+        self.done = done
+        self.total = total
+        self.check()
+
+    def partial(self, result):
+        # intermediate result (e.g. preview) - handled by on_partial in the GUI thread
+        self.check()
+        self.results.put((self, 'partial', result))
+
+
+class JobScheduler(object):
+    """
+    JobScheduler - runs heavy jobs in the background thread, one after another.
+    Jobs are submitted to channels - new job of the channel replaces the one waiting in the queue
+    and cancels the one running, so only the latest request is completed (e.g. the last value of the slider).
+    Results are passed back to the GUI thread by polling with Tk's after() - callbacks (on_done, on_partial)
+    are always called in the GUI thread.
+    """
+    def __init__(self, widget, poll_time=50, on_progress=None):
+        self.widget = widget
+        self.poll_time = poll_time
+        # called in the GUI thread with (done, total) of running job, or None if there is no job
+        self.on_progress = on_progress
+        self.pending = OrderedDict()
+        self.running = None
+        self.closed = False
+        self.condition = Condition()
+        self.results = Queue()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.widget.after(self.poll_time, self.poll)
+
+    def submit(self, channel, function, *args, on_done=None, on_partial=None, on_discard=None, **kwargs):
+        """
+        submit - queues the job, replacing the one of the same channel.
+        :param channel: any hashable object, jobs of the same channel supersede each other
+        :param function: function(job, *args, **kwargs) run in the background thread
+        :param on_done: function(result) called in the GUI thread when job is done
+        :param on_partial: function(result) called in the GUI thread for intermediate results
+        :param on_discard: function(result) called instead of on_done if job was cancelled after it finished
+                            (e.g. to release resources of the result)
+        :return: the job
+        """
+        job = Job(channel, function, args, kwargs, on_done, on_partial, on_discard)
+        job.results = self.results
+        with self.condition:
+            old = self.pending.pop(channel, None)
+            if old is not None:
+                old.cancel()
+            if self.running is not None and self.running.channel == channel:
+                self.running.cancel()
+            # job goes to the end of the queue - it may depend on jobs submitted before it
+            self.pending[channel] = job
+            self.condition.notify()
+        return job
+
+    def cancel(self, channel=None):
+        """
+        cancel - cancels jobs of the channel (all jobs if channel is None).
+        :param channel: channel of jobs to cancel
+        :return: None
+        """
+        with self.condition:
+            for key in list(self.pending):
+                if channel is None or key == channel:
+                    self.pending.pop(key).cancel()
+            if self.running is not None and (channel is None or self.running.channel == channel):
+                self.running.cancel()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                _, job = self.pending.popitem(last=False)
+                self.running = job
+            try:
+                job.check()
+                self.results.put((job, 'done', job.function(job, *job.args, **job.kwargs)))
+            except JobCancelled:
+                pass
+            except Exception as error:
+                self.results.put((job, 'error', error))
+            finally:
+                with self.condition:
+                    self.running = None
+
+    def poll(self):
+        if self.closed:
+            return
+        while True:
+            try:
+                job, kind, result = self.results.get_nowait()
+            except Empty:
+                break
+            if job.cancelled:
+                if kind == 'done' and job.on_discard is not None:
+                    job.on_discard(result)
+                continue
+            if kind == 'error':
+                print_exception(type(result), result, result.__traceback__)
+            elif kind == 'partial':
+                if job.on_partial is not None:
+                    job.on_partial(result)
+            elif job.on_done is not None:
+                job.on_done(result)
+        if self.on_progress is not None:
+            running = self.running
+            self.on_progress(None if running is None else (running.done, running.total))
+        self.widget.after(self.poll_time, self.poll)
+
+    def close(self):
+        self.cancel()
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
@@ -0,0 +1,410 @@
+from functools import partial
+from noise import snoise2
+from numpy import arange, array, dtype as np_dtype, empty, floor, float32, int64, maximum, memmap, uint8
+from os import close, remove
+from tempfile import mkstemp
+
+# Tables and skew factors below are the same as used by the 'noise' package (_noise.h and _simplex.c),
+# so that vectorized output follows snoise2 closely.
+# Tolerance: computations are done in float32, in the same order as in C code - difference between
+# generate_simplex_array and snoise2 is not greater than 1e-5 for coordinates used by the generator kits
+# (it grows with distance from the origin, as float32 loses precision for big coordinates).
+NOISE_TOLERANCE = 1e-5
+
+PERM = array([
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225, 140, 36, 103, 30, 69, 142, 8, 99, 37,
+    240, 21, 10, 23, 190, 6, 148, 247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117, 35, 11, 32, 57, 177,
+    33, 88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68, 175, 74, 165, 71, 134, 139, 48, 27, 166, 77, 146,
+    158, 231, 83, 111, 229, 122, 60, 211, 133, 230, 220, 105, 92, 41, 55, 46, 245, 40, 244, 102, 143, 54, 65, 25,
+    63, 161, 1, 216, 80, 73, 209, 76, 132, 187, 208, 89, 18, 169, 200, 196, 135, 130, 116, 188, 159, 86, 164, 100,
+    109, 198, 173, 186, 3, 64, 52, 217, 226, 250, 124, 123, 5, 202, 38, 147, 118, 126, 255, 82, 85, 212, 207, 206,
+    59, 227, 47, 16, 58, 17, 182, 189, 28, 42, 223, 183, 170, 213, 119, 248, 152, 2, 44, 154, 163, 70, 221, 153,
+    101, 155, 167, 43, 172, 9, 129, 22, 39, 253, 19, 98, 108, 110, 79, 113, 224, 232, 178, 185, 112, 104, 218, 246,
+    97, 228, 251, 34, 242, 193, 238, 210, 144, 12, 191, 179, 162, 241, 81, 51, 145, 235, 249, 14, 239, 107, 49, 192,
+    214, 31, 181, 199, 106, 157, 184, 84, 204, 176, 115, 121, 50, 45, 127, 4, 150, 254, 138, 236, 205, 93, 222, 114,
+    67, 29, 24, 72, 243, 141, 128, 195, 78, 66, 215, 61, 156, 180] * 2, dtype=uint8).astype(int64)
+
+# gradients (only x and y components are needed for 2D noise), taken modulo 12 - same as in C code
+GRAD3_X = array([1, -1, 1, -1, 1, -1, 1, -1, 0, 0, 0, 0], dtype=float32)
+GRAD3_Y = array([1, 1, -1, -1, 0, 0, 0, 0, 1, -1, 1, -1], dtype=float32)
+
+# 2D simplex skew factors
+F2 = float32(0.3660254037844386)
+G2 = float32(0.21132486540518713)
+
+# 4D noise (used for tileable noise) - gradients, simplex traversal table and skew factors, as in C code
+GRAD4 = array([
+    [0, 1, 1, 1], [0, 1, 1, -1], [0, 1, -1, 1], [0, 1, -1, -1], [0, -1, 1, 1], [0, -1, 1, -1], [0, -1, -1, 1],
+    [0, -1, -1, -1], [1, 0, 1, 1], [1, 0, 1, -1], [1, 0, -1, 1], [1, 0, -1, -1], [-1, 0, 1, 1], [-1, 0, 1, -1],
+    [-1, 0, -1, 1], [-1, 0, -1, -1], [1, 1, 0, 1], [1, 1, 0, -1], [1, -1, 0, 1], [1, -1, 0, -1], [-1, 1, 0, 1],
+    [-1, 1, 0, -1], [-1, -1, 0, 1], [-1, -1, 0, -1], [1, 1, 1, 0], [1, 1, -1, 0], [1, -1, 1, 0], [1, -1, -1, 0],
+    [-1, 1, 1, 0], [-1, 1, -1, 0], [-1, -1, 1, 0], [-1, -1, -1, 0]], dtype=float32)
+SIMPLEX4 = array([
+    [0, 1, 2, 3], [0, 1, 3, 2], [0, 0, 0, 0], [0, 2, 3, 1], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [1, 2, 3, 0],
+    [0, 2, 1, 3], [0, 0, 0, 0], [0, 3, 1, 2], [0, 3, 2, 1], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [1, 3, 2, 0],
+    [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0],
+    [1, 2, 0, 3], [0, 0, 0, 0], [1, 3, 0, 2], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [2, 3, 0, 1], [2, 3, 1, 0],
+    [1, 0, 2, 3], [1, 0, 3, 2], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [2, 0, 3, 1], [0, 0, 0, 0], [2, 1, 3, 0],
+    [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0],
+    [2, 0, 1, 3], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [3, 0, 1, 2], [3, 0, 2, 1], [0, 0, 0, 0], [3, 1, 2, 0],
+    [2, 1, 0, 3], [0, 0, 0, 0], [0, 0, 0, 0], [0, 0, 0, 0], [3, 1, 0, 2], [0, 0, 0, 0], [3, 2, 0, 1], [3, 2, 1, 0]],
+    dtype=int64)
+F4 = float32(0.30901699437494745)
+G4 = float32(0.1381966011250105)
+# constants of fast_sin of C code (sine of x * pi, computed without wrapping to radians)
+SINE_WRAP = float32(25165824)
+SINE_Q = float32(3.1)
+SINE_P = float32(3.6)
+# M_1_PI of C code
+INVERSE_PI = 0.3183098861837907
+
+# number of rows computed at once - keeps temporary arrays small (band of rows instead of the whole map)
+BAND_ROWS = 128
+
+
+def generate_simplex_row(x, size, scale=100.0, octaves=6, persistence=0.5, base=0.0, column=0, period=None):
+    """
+    generate_simplex_row - function of generating one row of simplex noise.
+    :param x: number of row, just for purposes of generation 2d array
+    :param size: size of the main array, here it is size of the row
+    :param scale: for controlling speed of changes in the array
+    :param octaves: number of layers, each with more detail
+    :param persistence: influence of each octave on the main one
+    :param base: seed for the array generation (same seed - same output)
+    :param column: number of the first column of the row (for rows of a window of bigger array)
+    :param period: optional (rows, columns) after which noise repeats - tileable noise
+    :return: list of simplex noise values, of given size
+    """
+    noise_row = []
+    x_scale = x / scale
+    repeat = {} if period is None else dict(repeatx=period[0] / scale, repeaty=period[1] / scale)
+    for y in range(column, column + size):
+        noise_row.append(snoise2(x_scale, y / scale,
+                                 octaves=octaves, persistence=persistence,
+                                 base=base, **repeat))
+    return noise_row
+
+
+def simplex_noise2(x, y):
+    """
+    simplex_noise2 - vectorized version of 2D simplex noise (single octave).
+    :param x: float32 array of first coordinates
+    :param y: float32 array of second coordinates (must broadcast with x)
+    :return: float32 array of noise values in range -1 to 1
+    """
+    s = (x + y) * F2
+    i = floor(x + s)
+    j = floor(y + s)
+    t = (i + j) * G2
+
+    x0 = x - (i - t)
+    y0 = y - (j - t)
+    i1 = x0 > y0
+    j1 = ~i1
+    x1 = x0 - i1 + G2
+    y1 = y0 - j1 + G2
+    x2 = x0 + G2 * float32(2) - float32(1)
+    y2 = y0 + G2 * float32(2) - float32(1)
+
+    ii = i.astype(int64) & 255
+    jj = j.astype(int64) & 255
+    g0 = PERM[ii + PERM[jj]] % 12
+    g1 = PERM[ii + i1 + PERM[jj + j1]] % 12
+    g2 = PERM[ii + 1 + PERM[jj + 1]] % 12
+
+    total = None
+    for xx, yy, g in ((x0, y0, g0), (x1, y1, g1), (x2, y2, g2)):
+        # contribution of each corner of simplex, zero if out of its radius
+        f = maximum(float32(0.5) - xx * xx - yy * yy, float32(0))
+        f *= f
+        f *= f
+        f *= GRAD3_X[g] * xx + GRAD3_Y[g] * yy
+        if total is None:
+            total = f
+        else:
+            total += f
+    return total * float32(70)
+
+
+def simplex_noise4(x, y, z, w):
+    """
+    simplex_noise4 - vectorized version of 4D simplex noise (single octave), the same as noise4 of C code.
+    :param x: float32 array of first coordinates
+    :param y: float32 array of second coordinates
+    :param z: float32 array of third coordinates
+    :param w: float32 array of fourth coordinates (all four must broadcast)
+    :return: float32 array of noise values in range -1 to 1
+    """
+    s = (x + y + z + w) * F4
+    i = floor(x + s)
+    j = floor(y + s)
+    k = floor(z + s)
+    l = floor(w + s)
+    t = (i + j + k + l) * G4
+    x0 = x - (i - t)
+    y0 = y - (j - t)
+    z0 = z - (k - t)
+    w0 = w - (l - t)
+
+    # which of 24 simplices contains the point - order of coordinates by magnitude
+    c = (x0 > y0) * 32 + (x0 > z0) * 16 + (y0 > z0) * 8 + (x0 > w0) * 4 + (y0 > w0) * 2 + (z0 > w0)
+    ranks = SIMPLEX4[c]
+    ii = i.astype(int64) & 255
+    jj = j.astype(int64) & 255
+    kk = k.astype(int64) & 255
+    ll = l.astype(int64) & 255
+
+    total = None
+    for corner in range(5):
+        # offsets of the corner: 0 for the first corner, 1 for the last one, from ranks for the others
+        if corner == 0:
+            i1 = j1 = k1 = l1 = 0
+        elif corner == 4:
+            i1 = j1 = k1 = l1 = 1
+        else:
+            i1, j1, k1, l1 = (ranks[..., axis] >= 4 - corner for axis in range(4))
+        offset = G4 * float32(corner)
+        xx = x0 - i1 + offset
+        yy = y0 - j1 + offset
+        zz = z0 - k1 + offset
+        ww = w0 - l1 + offset
+        g = PERM[ii + i1 + PERM[jj + j1 + PERM[kk + k1 + PERM[ll + l1]]]] & 31
+        # contribution of the corner, zero if out of its radius
+        f = maximum(float32(0.6) - xx * xx - yy * yy - zz * zz - ww * ww, float32(0))
+        f *= f
+        f *= f
+        f *= GRAD4[g, 0] * xx + GRAD4[g, 1] * yy + GRAD4[g, 2] * zz + GRAD4[g, 3] * ww
+        if total is None:
+            total = f
+        else:
+            total += f
+    return total * float32(27)
+
+
+def fast_sine(x):
+    # sine of x * pi - the same approximation as fast_sin of C code (float32 array)
+    x = x - ((x + SINE_WRAP) - SINE_WRAP)
+    y = x - x * abs(x)
+    return y * (SINE_Q + SINE_P * abs(y))
+
+
+def torus_coordinates(x, repeat, base):
+    """
+    torus_coordinates - coordinate wrapped around circle, noise of 4D coordinates of two such circles
+    repeats along both axes (the same mapping as in snoise2 with repeatx and repeaty).
+    :param x: float32 array of coordinates
+    :param repeat: period of the coordinate
+    :param base: seed of the noise
+    :return: tuple of two float32 arrays of coordinates on the circle
+    """
+    angle = (x.astype(float) * 2.0 / float(float32(repeat))).astype(float32)
+    radius = float32(float(float32(repeat)) * INVERSE_PI * 0.5)
+    return fast_sine(angle) * radius, float32(base) + fast_sine(angle + float32(0.5)) * radius
+
+
+def fractal_simplex_noise2(x, y, octaves=6, persistence=0.5, lacunarity=2.0, base=0.0):
+    """
+    fractal_simplex_noise2 - vectorized counterpart of noise.snoise2 (sum of octaves of simplex noise).
+    :param x: float32 array of first coordinates
+    :param y: float32 array of second coordinates (must broadcast with x)
+    :param octaves: number of layers, each with more detail
+    :param persistence: influence of each octave on the main one
+    :param lacunarity: frequency multiplier of each next octave
+    :param base: seed for the array generation (same seed - same output)
+    :return: float32 array of noise values in range -1 to 1
+    """
+    if octaves <= 0:
+        raise ValueError("Expected octaves value > 0")
+    base = float32(base)
+    persistence = float32(persistence)
+    lacunarity = float32(lacunarity)
+    freq = float32(1)
+    amp = float32(1)
+    max_amp = float32(1)
+    total = simplex_noise2(x + base, y + base)
+    for _ in range(1, octaves):
+        freq *= lacunarity
+        amp *= persistence
+        max_amp += amp
+        octave = simplex_noise2(x * freq + base, y * freq + base)
+        octave *= amp
+        total += octave
+    total /= max_amp
+    return total
+
+
+def fractal_tileable_noise2(x, y, repeat_x, repeat_y, octaves=6, persistence=0.5, lacunarity=2.0, base=0.0):
+    """
+    fractal_tileable_noise2 - vectorized counterpart of noise.snoise2 with repeatx and repeaty - noise repeating
+    along both axes (sum of octaves of 4D simplex noise of coordinates wrapped around a torus).
+    :param x: float32 array of first coordinates
+    :param y: float32 array of second coordinates (must broadcast with x)
+    :param repeat_x: period along first axis (in coordinates of noise)
+    :param repeat_y: period along second axis
+    :param octaves: number of layers, each with more detail
+    :param persistence: influence of each octave on the main one
+    :param lacunarity: frequency multiplier of each next octave
+    :param base: seed for the array generation (same seed - same output)
+    :return: float32 array of noise values in range -1 to 1
+    """
+    if octaves <= 0:
+        raise ValueError("Expected octaves value > 0")
+    y, w = torus_coordinates(y, repeat_y, base)
+    x, z = torus_coordinates(x, repeat_x, base)
+    persistence = float32(persistence)
+    lacunarity = float32(lacunarity)
+    freq = float32(1)
+    amp = float32(1)
+    max_amp = float32(1)
+    total = simplex_noise4(x, y, z, w)
+    for _ in range(1, octaves):
+        freq *= lacunarity
+        amp *= persistence
+        max_amp += amp
+        octave = simplex_noise4(x * freq, y * freq, z * freq, w * freq)
+        octave *= amp
+        total += octave
+    total /= max_amp
+    return total
+
+
+def generate_simplex_array(shape, scale=100.0, octaves=6, persistence=0.5, base=0.0,
+                           offset=(0, 0), out=None, dtype=float, progress=None, period=None):
+    """
+    generate_simplex_array - vectorized generation of the whole array (or a tile of it) of simplex noise.
+    Array is computed in bands of rows, so temporary arrays are small even for big maps.
+    Noise is a function of position only - any window of infinite noise plane may be generated (offset),
+    adjacent windows fit together without seams.
+    :param shape: shape of the array (rows, columns)
+    :param scale: for controlling speed of changes in the array
+    :param octaves: number of layers, each with more detail
+    :param persistence: influence of each octave on the main one
+    :param base: seed for the array generation (same seed - same output)
+    :param offset: (row, column) of the first element - for generating tiles of bigger array
+    :param out: optional array of given shape, to be filled with noise values
+    :param dtype: type of returned array (used only if out is not given)
+    :param progress: optional function(done rows, all rows) called after each band of rows
+    :param period: optional (rows, columns) after which noise repeats - tileable noise (4D noise, as snoise2
+                   with repeatx and repeaty, about twice slower)
+    :return: array of simplex noise values, same values as from generate_simplex_row
+    """
+    if out is None:
+        out = empty(shape, dtype=dtype)
+    if period is None:
+        noise_function = partial(fractal_simplex_noise2, octaves=octaves, persistence=persistence, base=base)
+    else:
+        noise_function = partial(fractal_tileable_noise2, repeat_x=period[0] / scale, repeat_y=period[1] / scale,
+                                 octaves=octaves, persistence=persistence, base=base)
+    # coordinates are computed in double precision and then cast (as done when passing them to snoise2)
+    ys = (arange(offset[1], offset[1] + shape[1]) / scale).astype(float32)[None, :]
+    for row in range(0, shape[0], BAND_ROWS):
+        rows = min(BAND_ROWS, shape[0] - row)
+        xs = (arange(offset[0] + row, offset[0] + row + rows) / scale).astype(float32)[:, None]
+        out[row:row + rows] = noise_function(xs, ys)
+        if progress is not None:
+            progress(row + rows, shape[0])
+    return out
+
+
+def fill_mapped_band(band, filename, shape, dtype, kernel='numpy', **noise_params):
+    """
+    fill_mapped_band - worker's function, it writes rows of noise straight into memory-mapped array.
+    :param band: (first row, last row + 1) to be generated
+    :param filename: file mapped by the whole array
+    :param shape: shape of the whole array
+    :param dtype: type of the whole array
+    :param kernel: 'numpy' - vectorized noise, 'snoise2' - noise computed pixel by pixel
+    :param noise_params: scale, octaves, persistence and base of noise, optional offset and period
+    :return: None
+    """
+    try:
+        out = memmap(filename, dtype=dtype, mode='r+', shape=shape)
+    except FileNotFoundError:
+        # file is removed when generation is cancelled - rest of the bands are skipped
+        return
+    # offset of the whole array in the noise plane
+    row, column = noise_params.pop('offset', (0, 0))
+    if kernel == 'numpy':
+        generate_simplex_array((band[1] - band[0], shape[1]), offset=(row + band[0], column),
+                               out=out[band[0]:band[1]], **noise_params)
+    else:
+        for x in range(band[0], band[1]):
+            out[x] = generate_simplex_row(row + x, shape[1], column=column, **noise_params)
+    out.flush()
+
+
+def split_into_bands(rows, parts):
+    """
+    split_into_bands - divides range of rows into bands of (almost) equal size.
+    :param rows: number of rows
+    :param parts: number of bands wanted
+    :return: list of (first row, last row + 1) tuples
+    """
+    band = max(1, -(-rows // parts))
+    return [(start, min(start + band, rows)) for start in range(0, rows, band)]
+
+
+def generate_mapped_noise_array(pool, shape, kernel='numpy', dtype=float, bands_per_worker=4, progress=None,
+                                **noise_params):
+    """
+    generate_mapped_noise_array - generation of noise array by pool of workers.
+    Workers write directly into memory-mapped temporary file, shared with the main process,
+    so no rows are pickled and sent back, and returned array is not copied.
+    File has to be removed with release_mapped_file, after returned array is not used anymore.
+    :param pool: multiprocessing pool
+    :param shape: shape of the array (rows, columns)
+    :param kernel: 'numpy' - vectorized noise, 'snoise2' - noise computed pixel by pixel
+    :param dtype: type of the array
+    :param bands_per_worker: number of bands of rows for each worker (for balancing the work)
+    :param progress: optional function(done bands, all bands) called after each band is generated
+                    (exception raised by it cancels the generation)
+    :param noise_params: scale, octaves, persistence and base of noise, optional offset and period
+    :return: tuple of (name of mapped file, array mapping the file)
+    """
+    dtype = np_dtype(dtype)
+    handle, filename = mkstemp(prefix='gret_', suffix='.raw')
+    close(handle)
+    try:
+        out = memmap(filename, dtype=dtype, mode='w+', shape=tuple(shape))
+        band_partial = partial(fill_mapped_band, filename=filename, shape=tuple(shape),
+                               dtype=dtype.str, kernel=kernel, **noise_params)
+        bands = split_into_bands(shape[0], pool._processes * bands_per_worker)
+        for done, _ in enumerate(pool.imap_unordered(band_partial, bands), 1):
+            if progress is not None:
+                progress(done, len(bands))
+    except BaseException:
+        # removing the file makes workers skip bands not started yet
+        release_mapped_file(filename)
+        raise
+    return filename, out
+
+
+def generate_preview_array(shape, step, scale=100.0, offset=(0, 0), period=None, **noise_params):
+    """
+    generate_preview_array - array of lower resolution, sampling the same noise as generate_simplex_array.
+    Element [i, j] of preview is the same as element [i * step, j * step] of the full array.
+    :param shape: shape of the full array
+    :param step: downsampling factor
+    :param scale: scale of the full array
+    :param offset: offset of the full array
+    :param period: period of the full array (tileable noise)
+    :param noise_params: octaves, persistence and base of noise
+    :return: array of shape (rows / step, columns / step), rounded up
+    """
+    return generate_simplex_array((-(-shape[0] // step), -(-shape[1] // step)), scale=scale / step,
+                                  offset=(offset[0] / step, offset[1] / step),
+                                  period=None if period is None else (period[0] / step, period[1] / step),
+                                  **noise_params)
+
+
+def release_mapped_file(filename):
+    """
+    release_mapped_file - removes file of memory-mapped array.
+    :param filename: name of the file (arrays mapping it should be removed first)
+    :return: None
+    """
+    try:
+        remove(filename)
+    except OSError:
+        # still mapped (Windows) or already removed
+        pass
@@ -0,0 +1,85 @@
+import json
+
+from gret_core import MapSpec
+from gret_export import export_npy
+from numpy import dtype as np_dtype, load
+from os import makedirs, path, remove, replace
+
+# version of profile format - change it when format changes
+PROFILE_VERSION = 1
+
+
+def sidecar_directory(filename):
+    # arrays of profile.json are saved in profile.arrays/
+    return path.splitext(filename)[0] + '.arrays'
+
+
+def save_profile(filename, spec, layer_arrays=None, gradient_array=None):
+    """
+    save_profile - saves parameters of the map (MapSpec) as JSON file and, optionally, generated arrays
+    as .npy sidecar files (in directory named after the profile, e.g. island.json -> island.arrays/).
+    :param filename: name of the profile file
+    :param spec: MapSpec
+    :param layer_arrays: optional list of arrays of layers (in order of spec.layers, None for not generated)
+    :param gradient_array: optional array of the gradient
+    :return: None
+    """
+    directory = sidecar_directory(filename)
+
+    def save_array(name, array):
+        if array is None:
+            return None
+        makedirs(directory, exist_ok=True)
+        target = path.join(directory, name + '.npy')
+        # array loaded from the same profile is already there (and it maps the file being replaced)
+        if getattr(array, 'filename', None) is None or path.abspath(array.filename) != path.abspath(target):
+            # copied band by band - arrays may be memory-mapped and bigger than RAM
+            export_npy(array, target)
+        return path.join(path.basename(directory), name + '.npy')
+
+    layer_arrays = list(layer_arrays or []) + [None] * (len(spec.layers) - len(layer_arrays or []))
+    arrays = dict(layers=[save_array('layer_%d' % index, array) for index, array in enumerate(layer_arrays)],
+                  gradient=save_array('gradient', gradient_array))
+
+    # readers never see partially written file
+    tmp_filename = filename + '.tmp'
+    try:
+        with open(tmp_filename, 'w') as file:
+            json.dump(dict(profile_version=PROFILE_VERSION, spec=spec.to_dict(), arrays=arrays), file, indent=2)
+        replace(tmp_filename, filename)
+    except BaseException:
+        if path.exists(tmp_filename):
+            remove(tmp_filename)
+        raise
+
+
+def load_profile(filename, load_arrays=True):
+    """
+    load_profile - parameters and (lazily) arrays of the map saved by save_profile.
+    Arrays are memory-mapped in read-only mode - only parts in use are read from disk.
+    Missing arrays and arrays not matching the spec (size, dtype) are returned as None - they have to be generated.
+    :param filename: name of the profile file
+    :param load_arrays: if False, only parameters are loaded
+    :return: tuple of (MapSpec, list of arrays of layers, array of gradient)
+    """
+    with open(filename) as file:
+        data = json.load(file)
+    if data.get('profile_version') != PROFILE_VERSION:
+        raise ValueError("Unsupported profile version: {0}".format(data.get('profile_version')))
+    spec = MapSpec.from_dict(data['spec'])
+    arrays = data.get('arrays') or {}
+
+    def load_array(relative):
+        if not load_arrays or relative is None:
+            return None
+        try:
+            array = load(path.join(path.dirname(path.abspath(filename)), relative), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        if array.shape != spec.map_size or array.dtype != np_dtype(spec.dtype):
+            return None
+        return array
+
+    layer_arrays = [load_array(relative) for relative in (arrays.get('layers') or [])]
+    layer_arrays += [None] * (len(spec.layers) - len(layer_arrays))
+    return spec, layer_arrays[:len(spec.layers)], load_array(arrays.get('gradient'))
@@ -0,0 +1,145 @@
+from collections import OrderedDict
+from gret_convert import convert_heightmap_into_gray
+from numpy import arange, concatenate, uint8, uint16
+from threading import Lock
+
+# size of tile's side (pixels)
+TILE_SIZE = 256
+# number of tiles kept in memory (256 tiles of 256x256 RGB pixels - 48 MB)
+MAX_TILES = 256
+
+
+class TilePyramid(object):
+    """
+    TilePyramid - tiles of the map (or any array) at levels of downsampling, rendered on demand.
+    Level 0 is the full resolution, each next level is downsampled twice (2x2 mean of pixels of the level below),
+    the last level fits in one tile. Only requested tiles are rendered - tiles of level 0 straight from the source
+    (which may be memory-mapped), tiles of higher levels from (kept or rendered) tiles of the level below,
+    recently used ones are kept in memory. Tiles may be requested by several threads at once.
+    """
+    def __init__(self, shape, render_region, tile_size=TILE_SIZE, max_tiles=MAX_TILES):
+        """
+        :param shape: shape of the source (rows, columns)
+        :param render_region: function(rows, columns) returning uint8 array (grayscale or RGB) of given region
+                            of the source, rows and columns are slices (see array_source and gray_source)
+        :param tile_size: size of tile's side (pixels)
+        :param max_tiles: number of tiles kept in memory
+        """
+        self.shape = (shape[0], shape[1])
+        self.render_region = render_region
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.tiles = OrderedDict()
+        self.lock = Lock()
+        self.levels = 1
+        while max(self.level_shape(self.levels - 1)) > tile_size:
+            self.levels += 1
+
+    def level_shape(self, level):
+        # shape of the whole map at given level
+        step = 2 ** level
+        return -(-self.shape[0] // step), -(-self.shape[1] // step)
+
+    def tile_grid(self, level):
+        # number of tiles (rows, columns) at given level
+        rows, columns = self.level_shape(level)
+        return -(-rows // self.tile_size), -(-columns // self.tile_size)
+
+    def tile_region(self, level, row, column):
+        # rows and columns of the source covered by the tile (slices with step of the level)
+        step = 2 ** level
+        span = self.tile_size * step
+        return (slice(row * span, min((row + 1) * span, self.shape[0]), step),
+                slice(column * span, min((column + 1) * span, self.shape[1]), step))
+
+    def tile(self, level, row, column):
+        """
+        tile - tile of the pyramid (rendered or taken from memory).
+        :param level: level of the pyramid
+        :param row: row of the tile
+        :param column: column of the tile
+        :return: uint8 array of the tile (tiles at the right and bottom border may be smaller)
+        """
+        key = (level, row, column)
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+                return tile
+        # rendered outside of the lock - other threads may render the same tile meanwhile (with the same result)
+        if level == 0:
+            tile = self.render_region(*self.tile_region(level, row, column))
+        else:
+            grid = self.tile_grid(level - 1)
+            children = [[self.tile(level - 1, child_row, child_column)
+                         for child_column in range(2 * column, min(2 * column + 2, grid[1]))]
+                        for child_row in range(2 * row, min(2 * row + 2, grid[0]))]
+            tile = box_mean(concatenate([concatenate(tiles, axis=1) for tiles in children], axis=0))
+        with self.lock:
+            self.tiles[key] = tile
+            if len(self.tiles) > self.max_tiles:
+                self.tiles.popitem(last=False)
+        return tile
+
+    def tiles_in_region(self, level, top, left, height, width):
+        """
+        tiles_in_region - tiles covering given region of the level.
+        :param level: level of the pyramid
+        :param top: first row of the region (in pixels of the level)
+        :param left: first column of the region
+        :param height: height of the region
+        :param width: width of the region
+        :return: list of (row, column) of tiles
+        """
+        grid = self.tile_grid(level)
+        rows = range(max(0, int(top // self.tile_size)),
+                     min(grid[0], int(-(-(top + height) // self.tile_size))))
+        columns = range(max(0, int(left // self.tile_size)),
+                        min(grid[1], int(-(-(left + width) // self.tile_size))))
+        return [(row, column) for row in rows for column in columns]
+
+
+def box_mean(pixels):
+    """
+    box_mean - pixels downsampled twice, each pixel is the mean of 2x2 pixels (rounded).
+    The last row (column) of odd number of rows (columns) is averaged alone.
+    :param pixels: uint8 array (rows, columns) or (rows, columns, 3)
+    :return: uint8 array of halved shape (rounded up)
+    """
+    pixels = pixels.astype(uint16)
+    if pixels.shape[0] % 2:
+        pixels = concatenate((pixels, pixels[-1:]), axis=0)
+    if pixels.shape[1] % 2:
+        pixels = concatenate((pixels, pixels[:, -1:]), axis=1)
+    total = pixels[0::2, 0::2] + pixels[1::2, 0::2] + pixels[0::2, 1::2] + pixels[1::2, 1::2]
+    total += 2
+    total //= 4
+    return total.astype(uint8)
+
+
+def array_source(array):
+    """
+    array_source - render function of TilePyramid for array of pixels (e.g. RGB map).
+    :param array: uint8 array (rows, columns) or (rows, columns, 3)
+    :return: render function
+    """
+    return lambda rows, columns: array[rows, columns]
+
+
+def gray_source(heightmap, levels, step=1):
+    """
+    gray_source - render function of TilePyramid for heightmap shown in grayscale (see convert_heightmap_into_gray).
+    :param heightmap: heightmap with values 0-1
+    :param levels: number of levels of quantization
+    :param step: downsampling factor of the heightmap (for previews) - element [i, j] of the heightmap
+                is shown as pixel [i * step, j * step] of the map
+    :return: render function
+    """
+    def render(rows, columns):
+        if step == 1:
+            region = heightmap[rows, columns]
+        else:
+            region = heightmap[(arange(rows.start, rows.stop, rows.step) // step)[:, None],
+                               (arange(columns.start, columns.stop, columns.step) // step)[None, :]]
+        return convert_heightmap_into_gray(region, levels)
+    return render
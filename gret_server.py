@@ -0,0 +1,414 @@
+"""
+gret_server - chunks of infinite world generated on demand, served over HTTP (TCP port or unix socket).
+
+Usage:
+    python gret_server.py world.json --port 8000 --store ~/.cache/gret_chunks
+    python gret_server.py world.json --unix /tmp/gret.sock --cache-mb 512
+
+Requests:
+    GET /chunk/<lod>/<cx>/<cy>.png - colorized chunk (PNG)
+    GET /chunk/<lod>/<cx>/<cy>.npy - heightmap of the chunk (quantized 0-1, .npy)
+    GET /stats - counters of the chunk service (JSON)
+Chunk (cx, cy) of level of detail lod covers columns from cx * chunk size * 2^lod and rows from
+cy * chunk size * 2^lod of the world (relative to offset of the spec), sampled every 2^lod pixel -
+lod 0 is the full resolution. Spec file is the same as for gret_generate (MapSpec) - its map_size
+is the size of the area masked by the gradient (if any), the world itself has no borders.
+"""
+import asyncio
+import json
+import re
+import sys
+
+from argparse import ArgumentParser
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from gret_cache import LayerCache
+from gret_composite import MapComposer
+from gret_core import compose_maps, generate_layer, noise_params
+from gret_generate import load_spec
+from gret_gradient import gradient_tile
+from io import BytesIO
+from multiprocessing import cpu_count
+from numpy import array as np_array, save, uint8, zeros
+from PIL import Image
+from threading import Lock
+
+# size of chunk's side (pixels)
+CHUNK_SIZE = 256
+# the lowest level of detail - chunk covers 2^MAX_LOD chunks of full resolution along each axis
+MAX_LOD = 10
+# memory for chunks kept in memory (heightmaps and RGB maps)
+MAX_BYTES = 256 * 1024 ** 2
+# neighbours of requested chunk generated in advance (8 around it)
+NEIGHBOURS = [(dx, dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy]
+# prefetching waits while this many chunks are being prefetched - requests are not delayed by it
+# (requested chunk waiting in the queue of prefetching is moved to the pool of requests)
+MAX_PREFETCHING = 16
+# counters of ChunkService (see get_stats)
+STATS = ('requests', 'hits', 'deduplicated', 'promoted', 'store_hits', 'generated', 'prefetched', 'evicted',
+         'errors')
+CHUNK_PATH = re.compile(r'^/chunk/(\d+)/(-?\d+)/(-?\d+)\.(png|npy)$')
+
+
+def generate_chunk(spec, cx, cy, lod=0, chunk_size=CHUNK_SIZE):
+    """
+    generate_chunk - heightmap and colorized map of one chunk of the world.
+    Layers are normalized by fixed range of noise (as for MapSpec.with_window), so chunks fit together
+    without seams - chunk of lod 0 is the same as window of the world of its position and size.
+    Gradient is the gradient of the area of map_size at the origin of the world - chunks out of it are masked too.
+    :param spec: MapSpec of the world
+    :param cx: column of the chunk
+    :param cy: row of the chunk
+    :param lod: level of detail - every 2^lod pixel of the world is sampled (origin is rounded to 2^lod)
+    :param chunk_size: size of chunk's side
+    :return: tuple of (heightmap quantized into levels (0-1), RGB map (uint8))
+    """
+    step = 2 ** lod
+    shape = (chunk_size, chunk_size)
+    # position of the chunk in pixels of its level of detail, relative to the origin of the world
+    row, column = cy * chunk_size, cx * chunk_size
+    offset = (spec.offset[0] // step + row, spec.offset[1] // step + column)
+    period = None if spec.period is None else (spec.period[0] / step, spec.period[1] / step)
+    factors = [float(layer['factor']) for layer in spec.layers]
+    value_range = (sum(min(0.0, factor) for factor in factors), sum(max(0.0, factor) for factor in factors))
+    # chunks are generated by many threads at once - one thread per chunk
+    composer = MapComposer(spec.levels, spec.dtype, workers=1, value_range=value_range)
+    for index, layer in enumerate(spec.layers):
+        # noise sampled every step pixels is noise of scale divided by step (as for previews)
+        params = noise_params(layer)
+        params.update(scale=params['scale'] / step, offset=offset)
+        if period is not None:
+            params['period'] = period
+        _, array = generate_layer(shape, params, spec.kernel, dtype=spec.dtype, fixed_range=True, workers=1)
+        composer.set_layer(index, array, factors[index])
+    if spec.gradient is not None:
+        composer.set_gradient(gradient_tile((-(-spec.map_size[0] // step), -(-spec.map_size[1] // step)),
+                                            spec.gradient['min_value_radius'], spec.gradient['max_value_radius'],
+                                            offset=(row, column), shape=shape, pattern=spec.gradient['pattern'],
+                                            dtype=spec.dtype))
+    biomes = None
+    if spec.biomes is not None:
+        # climate is sampled every step pixels as well
+        biomes = dict(spec.biomes, **{name: dict(spec.biomes[name], scale=spec.biomes[name]['scale'] / step)
+                                      for name in ('temperature', 'moisture')})
+    heightmap, rgb_map, _ = compose_maps(composer, shape, spec.color_levels, spec.brightness, biomes=biomes,
+                                         offset=offset, period=period, kernel=spec.kernel)
+    if rgb_map is None:
+        # all factors are 0 - flat world
+        return zeros(shape, dtype=spec.dtype), zeros(shape + (3,), dtype=uint8)
+    return heightmap, rgb_map
+
+
+class ChunkService(object):
+    """
+    ChunkService - chunks of the world generated on demand by a pool of threads.
+     - recently used chunks are kept in memory (LRU, limited by max_bytes)
+     - optional on-disk store (LayerCache) keeps generated chunks between runs
+     - concurrent requests of the same chunk wait for one generation
+     - neighbours of requested chunks are generated in advance (prefetch), with lower priority
+    All methods are thread-safe, results are futures (see asyncio.wrap_future for asyncio code).
+    """
+    def __init__(self, spec, chunk_size=CHUNK_SIZE, max_bytes=MAX_BYTES, store=None, workers=None, prefetch=True):
+        """
+        :param spec: MapSpec of the world
+        :param chunk_size: size of chunk's side
+        :param max_bytes: memory for chunks kept in memory
+        :param store: optional LayerCache for generated chunks
+        :param workers: number of threads generating requested chunks (all cores by default)
+        :param prefetch: if True, neighbours of requested chunks are generated in advance
+        """
+        if spec.hydrology is not None:
+            raise ValueError("Chunks of infinite world can't have hydrology (it is computed for the whole map)")
+        self.spec = spec
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.store = store
+        self.prefetch = prefetch
+        # (cx, cy, lod) -> (heightmap, RGB map) of chunks in memory, the least recently used first
+        self.chunks = OrderedDict()
+        self.bytes = 0
+        # (cx, cy, lod) -> future of chunks being generated (or loaded from the store)
+        self.pending = {}
+        # keys of prefetched chunks waiting in the queue of prefetching (not started yet)
+        self.queued = set()
+        self.prefetching = 0
+        self.stats = Counter(dict.fromkeys(STATS, 0))
+        self.lock = Lock()
+        self.executor = ThreadPoolExecutor(workers or cpu_count())
+        # one thread - prefetching never takes all cores
+        self.prefetch_executor = ThreadPoolExecutor(1)
+        # chunks of the store are identified by the world they come from
+        self.world_key = LayerCache.key(spec=spec.to_dict(), chunk_size=chunk_size)
+
+    def request(self, cx, cy, lod=0):
+        """
+        request - chunk of the world.
+        :param cx: column of the chunk
+        :param cy: row of the chunk
+        :param lod: level of detail (0 - full resolution)
+        :return: future of (heightmap, RGB map) of the chunk
+        """
+        if not 0 <= lod <= MAX_LOD:
+            raise ValueError("Level of detail has to be in range 0-{0}".format(MAX_LOD))
+        key = (cx, cy, lod)
+        with self.lock:
+            self.stats['requests'] += 1
+            future = self.cached(key)
+            if future is None:
+                future = self.pending.get(key)
+                if future is not None:
+                    self.stats['deduplicated'] += 1
+                    if key in self.queued:
+                        # requested chunk does not wait behind prefetching - it is generated by the pool
+                        # of requests, the queued prefetch of it is skipped
+                        self.queued.discard(key)
+                        self.stats['promoted'] += 1
+                        self.executor.submit(self.run, key, future, False)
+                else:
+                    future = self.submit(key, self.executor)
+        if self.prefetch:
+            self.prefetch_neighbours(cx, cy, lod)
+        return future
+
+    def chunk(self, cx, cy, lod=0):
+        # blocking version of request
+        return self.request(cx, cy, lod).result()
+
+    def cached(self, key):
+        # future of chunk in memory or None (called with the lock)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return None
+        self.chunks.move_to_end(key)
+        self.stats['hits'] += 1
+        future = Future()
+        future.set_result(chunk)
+        return future
+
+    def submit(self, key, executor, prefetched=False):
+        # starts loading or generation of the chunk (called with the lock)
+        future = Future()
+        self.pending[key] = future
+        executor.submit(self.run, key, future, prefetched)
+        return future
+
+    def prefetch_neighbours(self, cx, cy, lod):
+        with self.lock:
+            for dx, dy in NEIGHBOURS:
+                key = (cx + dx, cy + dy, lod)
+                if self.prefetching >= MAX_PREFETCHING:
+                    break
+                if key in self.chunks or key in self.pending:
+                    continue
+                self.prefetching += 1
+                self.stats['prefetched'] += 1
+                self.queued.add(key)
+                self.submit(key, self.prefetch_executor, prefetched=True)
+
+    def run(self, key, future, prefetched):
+        # runs in a thread of the pool - chunk is moved from pending to memory before anyone gets it
+        if prefetched:
+            with self.lock:
+                if key not in self.queued:
+                    # moved to the pool of requests (see request)
+                    self.prefetching -= 1
+                    return
+                self.queued.discard(key)
+        try:
+            chunk = self.load_or_generate(key)
+        except Exception as error:
+            with self.lock:
+                self.pending.pop(key, None)
+                self.prefetching -= prefetched
+                self.stats['errors'] += 1
+            future.set_exception(error)
+            return
+        with self.lock:
+            self.pending.pop(key, None)
+            self.prefetching -= prefetched
+            self.add_chunk(key, chunk)
+        future.set_result(chunk)
+
+    def store_keys(self, key):
+        world_key = LayerCache.key(world=self.world_key, chunk=list(key))
+        return world_key + '_height', world_key + '_rgb'
+
+    def load_or_generate(self, key):
+        if self.store is not None:
+            height_key, rgb_key = self.store_keys(key)
+            heightmap, rgb_map = self.store.load(height_key), self.store.load(rgb_key)
+            if heightmap is not None and rgb_map is not None:
+                self.count('store_hits')
+                # chunks are small - they are kept in memory, not mapped
+                return np_array(heightmap), np_array(rgb_map)
+        heightmap, rgb_map = generate_chunk(self.spec, *key, chunk_size=self.chunk_size)
+        self.count('generated')
+        if self.store is not None:
+            self.store.store(height_key, heightmap)
+            self.store.store(rgb_key, rgb_map)
+        return heightmap, rgb_map
+
+    def add_chunk(self, key, chunk):
+        # chunk kept in memory, the least recently used ones are removed (called with the lock)
+        self.chunks[key] = chunk
+        self.bytes += chunk[0].nbytes + chunk[1].nbytes
+        while self.bytes > self.max_bytes and len(self.chunks) > 1:
+            _, (old_heightmap, old_rgb_map) = self.chunks.popitem(last=False)
+            self.bytes -= old_heightmap.nbytes + old_rgb_map.nbytes
+            self.stats['evicted'] += 1
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, chunks=len(self.chunks), bytes=self.bytes, pending=len(self.pending))
+
+    def close(self):
+        self.prefetch_executor.shutdown(wait=True, cancel_futures=True)
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        # chunks which were not started are never generated
+        with self.lock:
+            pending, self.pending = list(self.pending.values()), {}
+            self.queued.clear()
+        for future in pending:
+            future.cancel()
+
+
+def encode_png(rgb_map):
+    buffer = BytesIO()
+    # fast compression - chunks are generated on demand, size matters less than latency
+    Image.fromarray(rgb_map).save(buffer, 'PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+def encode_npy(heightmap):
+    buffer = BytesIO()
+    save(buffer, heightmap)
+    return buffer.getvalue()
+
+
+async def respond(service, method, target):
+    """
+    respond - response for HTTP request.
+    :param service: ChunkService
+    :param method: HTTP method
+    :param target: path of the request
+    :return: tuple of (status, content type, body)
+    """
+    if method != 'GET':
+        return '405 Method Not Allowed', 'text/plain', b'Only GET is supported\n'
+    target = target.split('?')[0]
+    if target == '/stats':
+        return '200 OK', 'application/json', json.dumps(service.get_stats()).encode()
+    match = CHUNK_PATH.match(target)
+    if match is None:
+        return '404 Not Found', 'text/plain', b'Unknown path\n'
+    lod, cx, cy = (int(group) for group in match.groups()[:3])
+    try:
+        heightmap, rgb_map = await asyncio.wrap_future(service.request(cx, cy, lod))
+    except ValueError as error:
+        return '400 Bad Request', 'text/plain', (str(error) + '\n').encode()
+    # encoding takes a while - the event loop serves other connections meanwhile
+    if match.group(4) == 'png':
+        body = await asyncio.get_running_loop().run_in_executor(None, encode_png, rgb_map)
+        return '200 OK', 'image/png', body
+    body = await asyncio.get_running_loop().run_in_executor(None, encode_npy, heightmap)
+    return '200 OK', 'application/octet-stream', body
+
+
+async def handle_connection(service, reader, writer):
+    # minimal HTTP/1.1 server - GET requests only, connections are kept alive (for load testing)
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            try:
+                method, target, version = request_line.decode('latin-1').split()
+            except ValueError:
+                status, content_type, body, version = '400 Bad Request', 'text/plain', b'Bad request\n', 'HTTP/1.0'
+            else:
+                status, content_type, body = await respond(service, method, target)
+            keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+            writer.write(('HTTP/1.1 {0}\r\nContent-Type: {1}\r\nContent-Length: {2}\r\nConnection: {3}\r\n\r\n'
+                          .format(status, content_type, len(body), 'keep-alive' if keep_alive else 'close'))
+                         .encode('latin-1') + body)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(service, host='127.0.0.1', port=8000, unix=None, ready=None):
+    """
+    serve - runs HTTP server of the chunk service until cancelled.
+    :param service: ChunkService
+    :param host: host of TCP server
+    :param port: port of TCP server
+    :param unix: path of unix socket (used instead of TCP if given)
+    :param ready: optional function(server) called when the server is listening
+    :return: None
+    """
+    handler = partial(handle_connection, service)
+    if unix is not None:
+        server = await asyncio.start_unix_server(handler, path=unix)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Chunks of infinite world generated on demand, served over HTTP.")
+    parser.add_argument('spec', help="JSON or TOML file with parameters of the world (MapSpec)")
+    parser.add_argument('--host', default='127.0.0.1', help="host of the server (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8000, help="port of the server (default: 8000)")
+    parser.add_argument('--unix', default=None, help="path of unix socket (instead of TCP port)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="size of chunk's side")
+    parser.add_argument('--cache-mb', type=int, default=MAX_BYTES // 1024 ** 2,
+                        help="memory for chunks kept in memory in MB")
+    parser.add_argument('--store', default=None, help="directory of on-disk store of generated chunks")
+    parser.add_argument('--store-mb', type=int, default=2048, help="size of on-disk store in MB")
+    parser.add_argument('-w', '--workers', type=int, default=cpu_count(), help="number of generating threads")
+    parser.add_argument('--no-prefetch', action='store_true', help="neighbours are not generated in advance")
+    args = parser.parse_args(argv)
+
+    try:
+        spec = load_spec(args.spec)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+    store = None if args.store is None else LayerCache(args.store, max_bytes=args.store_mb * 1024 ** 2)
+    try:
+        service = ChunkService(spec, args.chunk_size, args.cache_mb * 1024 ** 2, store, args.workers,
+                               prefetch=not args.no_prefetch)
+    except ValueError as error:
+        parser.error(str(error))
+
+    def ready(server):
+        print("Serving chunks on", args.unix or 'http://{0}:{1}'.format(args.host, args.port), file=sys.stderr)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix, ready))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
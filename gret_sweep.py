@@ -0,0 +1,170 @@
+import csv
+
+from functools import partial
+from gret_biomes import BIOMES
+from gret_core import DEFAULT_GRADIENT, DEFAULT_LAYER, MapSpec, generate_map_with_biomes, save_map
+from itertools import product
+from numpy import bincount, count_nonzero, intp, mean, rint
+from os import makedirs, path
+from PIL import Image
+
+# size of the longer side of thumbnails (pixels)
+THUMBNAIL_SIZE = 128
+# name of the results table in the output directory
+TABLE_NAME = 'sweep.csv'
+# tasks sent to a worker at once - whole maps are big tasks, a few per worker are enough for load balancing
+TASKS_PER_WORKER = 4
+
+
+def grid_path(key):
+    """
+    grid_path - path of the parameter in MapSpec's dictionary (see MapSpec.to_dict) from key of the grid.
+    Keys are dotted paths ('layers.0.scale', 'gradient.max_value_radius', 'biomes.lapse_rate'), '*' stands for
+    every layer ('layers.*.base'). Parameters of layers and of the gradient may be given by name only
+    ('scale' - scale of every layer, 'min_value_radius' - of the gradient). 'seed' is the seed (see MapSpec.with_seed).
+    :param key: key of the grid
+    :return: list of keys of the path
+    """
+    if '.' in key or key == 'seed':
+        return key.split('.')
+    if key in DEFAULT_LAYER:
+        return ['layers', '*', key]
+    if key in DEFAULT_GRADIENT:
+        return ['gradient', key]
+    return [key]
+
+
+def set_grid_value(data, keys, value):
+    # sets value at the path of dictionary of the spec (every element of lists for '*')
+    targets = [data]
+    for key in keys[:-1]:
+        if key == 'gradient' and data.get('gradient') is None:
+            # sweeping parameters of the gradient of map without one - default gradient
+            data['gradient'] = {}
+        targets = [item for target in targets
+                   for item in (target if key == '*' else [target[int(key) if isinstance(target, list) else key]])]
+    for target in targets:
+        target[keys[-1]] = value
+
+
+def sweep_points(spec, grid):
+    """
+    sweep_points - all combinations of values of the grid (in order of keys, the last one changes the fastest).
+    :param spec: MapSpec with parameters not swept
+    :param grid: dictionary of key (see grid_path) -> list of values
+    :return: list of (index, dictionary of values of the point, MapSpec of the point)
+    """
+    for key, values in grid.items():
+        if not isinstance(values, (list, tuple)) or not values:
+            raise ValueError("Values of {0} have to be a non-empty list".format(key))
+    keys = list(grid)
+    points = []
+    for index, values in enumerate(product(*(grid[key] for key in keys))):
+        data = spec.to_dict()
+        seed = None
+        for key, value in zip(keys, values):
+            if key == 'seed':
+                seed = value
+                continue
+            try:
+                set_grid_value(data, grid_path(key), value)
+            except (KeyError, IndexError, TypeError, ValueError):
+                raise ValueError("Unknown parameter of the grid: {0}".format(key))
+        point_spec = MapSpec.from_dict(data)
+        points.append((index, dict(zip(keys, values)), point_spec if seed is None else point_spec.with_seed(seed)))
+    return points
+
+
+def map_stats(heightmap, levels, sea_level, biome_map=None):
+    """
+    map_stats - summary statistics of the map.
+    :param heightmap: heightmap quantized into levels (0-1)
+    :param levels: number of levels
+    :param sea_level: height of the sea level
+    :param biome_map: optional uint8 array of ids of biomes
+    :return: dictionary with land_ratio (part of the map above the sea level), mean_height,
+             histogram (number of cells of every level) and biomes (number of cells of every biome, if any)
+    """
+    stats = dict(land_ratio=count_nonzero(heightmap > sea_level) / heightmap.size,
+                 mean_height=float(mean(heightmap, dtype=float)),
+                 histogram=bincount(rint(heightmap * levels).astype(intp).ravel(), minlength=levels + 1).tolist())
+    if biome_map is not None:
+        stats['biomes'] = bincount(biome_map.ravel(), minlength=len(BIOMES)).tolist()
+    return stats
+
+
+def save_thumbnail(rgb_map, filename, size=THUMBNAIL_SIZE):
+    image = Image.fromarray(rgb_map)
+    # box filter - every pixel of the thumbnail is the mean of pixels of the map
+    image.thumbnail((size, size), Image.BOX)
+    image.save(filename)
+    return filename
+
+
+def sweep_job(point, directory, thumbnail_size=THUMBNAIL_SIZE, formats=()):
+    """
+    sweep_job - generates one map of the sweep, saves its thumbnail (and the map in given formats).
+    Only statistics are returned, so the full map never leaves the worker.
+    :param point: (index, values, MapSpec) of the point of the grid (see sweep_points)
+    :param directory: output directory
+    :param thumbnail_size: size of the longer side of the thumbnail
+    :param formats: formats of saved maps (see save_map), none by default
+    :return: tuple of (index, statistics or None if map is flat, names of saved files)
+    """
+    index, _, spec = point
+    # one map per worker process - composition in one thread, all cores are busy anyway
+    heightmap, rgb_map, biome_map = generate_map_with_biomes(spec, workers=1)
+    if heightmap is None:
+        return index, None, []
+    name = 'sweep_{0:05d}'.format(index)
+    files = [save_thumbnail(rgb_map, path.join(directory, 'thumbnails', name + '.png'), thumbnail_size)]
+    if formats:
+        files += save_map(directory, name, heightmap, rgb_map, formats, workers=1, biome_map=biome_map)
+    return index, map_stats(heightmap, spec.levels, spec.color_levels[0], biome_map), files
+
+
+def generate_sweep(spec, grid, directory, pool=None, thumbnail_size=THUMBNAIL_SIZE, formats=(), progress=None,
+                   chunk_size=None):
+    """
+    generate_sweep - generates maps for every combination of values of the grid (e.g. seeds, scales
+    and gradient radii), with statistics and thumbnails in the results table (CSV, one row per map).
+    Whole maps are scheduled across workers of the pool (chunks of tasks), rows of the table are written
+    as soon as maps are done, in order of the grid - no map is kept in memory after its row is written.
+    :param spec: MapSpec with parameters not swept
+    :param grid: dictionary of key -> list of values (see grid_path)
+    :param directory: output directory - table, thumbnails/ and saved maps (if any formats)
+    :param pool: optional multiprocessing pool
+    :param thumbnail_size: size of the longer side of thumbnails
+    :param formats: formats of saved maps (see save_map), only thumbnails by default
+    :param progress: optional function(done, total) called after each map
+    :param chunk_size: number of maps sent to a worker at once (a few tasks per worker by default)
+    :return: name of the results table
+    """
+    points = sweep_points(spec, grid)
+    makedirs(path.join(directory, 'thumbnails'), exist_ok=True)
+    job = partial(sweep_job, directory=directory, thumbnail_size=thumbnail_size, formats=tuple(formats))
+    if pool is None:
+        results = map(job, points)
+    else:
+        if chunk_size is None:
+            chunk_size = max(1, len(points) // (TASKS_PER_WORKER * pool._processes))
+        # ordered results - rows follow the grid, only small results wait for earlier maps
+        results = pool.imap(job, points, chunksize=chunk_size)
+    table = path.join(directory, TABLE_NAME)
+    with open(table, 'w', newline='') as file:
+        writer = csv.writer(file)
+        stats_columns = ['land_ratio', 'mean_height', 'histogram'] + ([] if spec.biomes is None else ['biomes'])
+        writer.writerow(['index'] + list(grid) + stats_columns + ['files'])
+        for count, (index, stats, files) in enumerate(results, 1):
+            values = [points[index][1][key] for key in grid]
+            if stats is None:
+                # flat map
+                writer.writerow([index] + values + [''] * len(stats_columns) + [''])
+            else:
+                writer.writerow([index] + values + ['%.6f' % stats['land_ratio'], '%.6f' % stats['mean_height']]
+                                + [' '.join(str(number) for number in stats[column]) for column in stats_columns[2:]]
+                                + [' '.join(path.relpath(name, directory) for name in files)])
+            file.flush()
+            if progress is not None:
+                progress(count, len(points))
+    return table
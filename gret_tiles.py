@@ -0,0 +1,199 @@
+from functools import partial
+from gret_biomes import convert_biomes_into_RGB, generate_biome_map
+from gret_convert import convert_heightmap_into_RGB
+from gret_gradient import gradient_tile
+from gret_jit import generate_noise_array
+from gret_trace import span
+from numpy import amax, amin, divide, sqrt, subtract, trunc, uint8, zeros
+from numpy.lib.format import open_memmap
+from os import makedirs, path
+
+# rough estimate of bytes needed for processing one pixel of a tile
+# (composite sum, layer's tile, gradient's tile, colorization temporaries and RGB output)
+BYTES_PER_TILE_PIXEL = 96
+# smaller tiles would make overhead of the pipeline bigger than the work itself
+MIN_TILE_SIZE = 64
+
+
+def split_range(size, tile_size):
+    """
+    split_range - divides range into parts of (almost) equal size, not bigger than tile_size.
+    :param size: size of the range
+    :param tile_size: maximum size of the part
+    :return: list of (start, length) tuples
+    """
+    parts = max(1, -(-size // tile_size))
+    borders = [size * i // parts for i in range(parts + 1)]
+    return [(borders[i], borders[i + 1] - borders[i]) for i in range(parts)]
+
+
+def split_into_tiles(map_size, tile_size):
+    """
+    split_into_tiles - divides map into tiles.
+    :param map_size: size of the map (rows, columns)
+    :param tile_size: maximum size of the tile's side
+    :return: list of (row, column, rows, columns) tuples
+    """
+    return [(row, column, rows, columns)
+            for row, rows in split_range(map_size[0], tile_size)
+            for column, columns in split_range(map_size[1], tile_size)]
+
+
+def tile_size_for_budget(tile_size, memory_budget=None, workers=1):
+    """
+    tile_size_for_budget - reduces size of tiles, so all tiles processed at once fit in memory budget.
+    :param tile_size: wanted size of the tile's side
+    :param memory_budget: maximum number of bytes for processing tiles (no limit if None)
+    :param workers: number of tiles processed at once
+    :return: size of the tile's side
+    """
+    if memory_budget is None:
+        return tile_size
+    max_tile_size = int(sqrt(memory_budget / (workers * BYTES_PER_TILE_PIXEL)))
+    if max_tile_size < MIN_TILE_SIZE:
+        raise ValueError("Memory budget of {0} bytes is too small for {1} workers".format(memory_budget, workers))
+    return min(tile_size, max_tile_size)
+
+
+def open_store_array(directory, name, shape=None, dtype=float, mode='r+'):
+    """
+    open_store_array - opens (or creates with 'w+' mode) array of the disk-backed store.
+    Arrays are kept as memory-mapped .npy files, so only used parts of them are loaded into memory.
+    :param directory: directory of the store
+    :param name: name of the array
+    :param shape: shape of the array (only for creating)
+    :param dtype: type of the array (only for creating)
+    :param mode: 'r' - read only, 'r+' - read and write, 'w+' - create new array
+    :return: memory-mapped array
+    """
+    filename = path.join(directory, name + '.npy')
+    if mode == 'w+':
+        return open_memmap(filename, mode=mode, dtype=dtype, shape=tuple(shape))
+    return open_memmap(filename, mode=mode)
+
+
+def layer_tile_job(tile, directory, index, noise_params, origin=(0, 0), kernel='numpy'):
+    # pass 1 - raw noise of the layer, its minimum and maximum are needed for normalization
+    row, column, rows, columns = tile
+    layer = open_store_array(directory, 'layer_%d' % index)
+    out = layer[row:row + rows, column:column + columns]
+    # one thread per tile - tiles are processed by workers of the pool
+    generate_noise_array((rows, columns), kernel, workers=1, out=out, offset=(origin[0] + row, origin[1] + column),
+                         **noise_params)
+    layer.flush()
+    return amin(out), amax(out)
+
+
+def composite_tile_job(tile, directory, map_size, layers, gradient, dtype):
+    # pass 2 - weighted sum of normalized layers, multiplied by the gradient
+    row, column, rows, columns = tile
+    noise_map = zeros((rows, columns), dtype=dtype)
+    for index, (factor, low, high) in enumerate(layers):
+        layer = open_store_array(directory, 'layer_%d' % index, mode='r')
+        layer_tile = layer[row:row + rows, column:column + columns].astype(dtype)
+        if high > low:
+            layer_tile -= low
+            layer_tile /= high - low
+        layer_tile *= factor
+        noise_map += layer_tile
+    if gradient is not None:
+        noise_map *= gradient_tile(map_size, gradient['min_value_radius'], gradient['max_value_radius'],
+                                   offset=(row, column), shape=(rows, columns),
+                                   pattern=gradient.get('pattern', 'circle'), dtype=dtype)
+    heightmap = open_store_array(directory, 'heightmap')
+    heightmap[row:row + rows, column:column + columns] = noise_map
+    heightmap.flush()
+    return amin(noise_map), amax(noise_map)
+
+
+def colorize_tile_job(tile, directory, value_range, levels, color_levels, brightness, biomes=None, origin=(0, 0),
+                      period=None, kernel='numpy'):
+    # pass 3 - quantization of the heightmap (in place) and colors of quantized levels (or of biomes)
+    row, column, rows, columns = tile
+    heightmap = open_store_array(directory, 'heightmap')
+    rgb_map = open_store_array(directory, 'rgb')
+    noise_map = heightmap[row:row + rows, column:column + columns]
+    if value_range[1] > value_range[0]:
+        # the same steps in double precision as MapComposer.quantize_block - the same heightmap as without store
+        quantized_map = subtract(noise_map, value_range[0], dtype=float)
+        divide(quantized_map, value_range[1] - value_range[0], out=quantized_map)
+        quantized_map *= levels
+        trunc(quantized_map, out=quantized_map)
+        # whole quantized map is in range 0-1
+        quantized_map /= levels
+        noise_map[:] = quantized_map
+        if biomes is None:
+            rgb_map[row:row + rows, column:column + columns] = convert_heightmap_into_RGB(
+                quantized_map, brightness=brightness, levels=list(color_levels), value_range=(0.0, 1.0), steps=levels)
+        else:
+            # climate of the tile from its position - tiles of biomes fit together as tiles of noise
+            biome_map = open_store_array(directory, 'biomes')
+            biome_tile = generate_biome_map(quantized_map, biomes, levels, color_levels,
+                                            (origin[0] + row, origin[1] + column), period,
+                                            out=biome_map[row:row + rows, column:column + columns], workers=1,
+                                            kernel=kernel)
+            convert_biomes_into_RGB(biome_tile, brightness, out=rgb_map[row:row + rows, column:column + columns])
+            biome_map.flush()
+    else:
+        noise_map[:] = 0
+    heightmap.flush()
+    rgb_map.flush()
+
+
+def generate_tiled_map(directory, map_size, layers, gradient=None, levels=32, color_levels=(0.3, 0.5, 0.5),
+                       brightness=1, tile_size=1024, memory_budget=None, dtype=float, pool=None, offset=(0, 0),
+                       period=None, biomes=None, kernel='numpy'):
+    """
+    generate_tiled_map - generation of the whole map tile by tile, with results stored on disk.
+    Noise and gradient are pure functions of position in the map, so tiles are computed separately
+    and fit together without seams. Only tiles being processed are kept in memory.
+    Store's directory will contain: layer_N.npy (raw noise layers), heightmap.npy (quantized into levels, 0-1)
+    and rgb.npy (colorized map, uint8), with biomes also biomes.npy (ids of biomes, uint8).
+    :param directory: directory for the disk-backed store
+    :param map_size: size of the map (rows, columns)
+    :param layers: list of dictionaries with noise parameters (scale, octaves, persistence, base) and factor
+    :param gradient: dictionary with min_value_radius, max_value_radius and pattern, or None for no gradient
+    :param levels: number of levels of quantized heightmap
+    :param color_levels: sea, plains and hills levels for colorization
+    :param brightness: brightness of colors for output (range from 0 to 1)
+    :param tile_size: maximum size of tile's side
+    :param memory_budget: maximum number of bytes used for processing tiles at once (no limit if None)
+    :param dtype: type of heightmap and layers
+    :param pool: optional multiprocessing pool, for processing tiles in parallel
+    :param offset: (row, column) of the map in infinite noise plane
+    :param period: optional (rows, columns) after which noise repeats (tileable map)
+    :param biomes: optional dictionary with parameters of biomes (see gret_biomes.generate_biome_map) -
+                   the map is colored by biomes
+    :param kernel: noise kernel of layers and climate - 'numpy', 'snoise2' or 'numba' (see gret_core.generate_layer)
+    :return: tuple of (heightmap, RGB map) - both memory-mapped in read-only mode
+    """
+    workers = 1 if pool is None else pool._processes
+    tiles = split_into_tiles(map_size, tile_size_for_budget(tile_size, memory_budget, workers))
+    map_function = map if pool is None else pool.map
+    makedirs(directory, exist_ok=True)
+
+    layers_ranges = []
+    for index, layer in enumerate(layers):
+        open_store_array(directory, 'layer_%d' % index, map_size, dtype, mode='w+').flush()
+        noise_params = {key: layer[key] for key in ('scale', 'octaves', 'persistence', 'base') if key in layer}
+        noise_params['period'] = period
+        with span('tiles: noise', layer=index, tiles=len(tiles)):
+            stats = list(map_function(partial(layer_tile_job, directory=directory, index=index,
+                                              noise_params=noise_params, origin=tuple(offset), kernel=kernel),
+                                      tiles))
+        layers_ranges.append((layer.get('factor', 1.0), min(s[0] for s in stats), max(s[1] for s in stats)))
+
+    open_store_array(directory, 'heightmap', map_size, dtype, mode='w+').flush()
+    open_store_array(directory, 'rgb', (map_size[0], map_size[1], 3), uint8, mode='w+').flush()
+    if biomes is not None:
+        open_store_array(directory, 'biomes', map_size, uint8, mode='w+').flush()
+    with span('tiles: compose', tiles=len(tiles)):
+        stats = list(map_function(partial(composite_tile_job, directory=directory, map_size=tuple(map_size),
+                                          layers=layers_ranges, gradient=gradient, dtype=dtype), tiles))
+    value_range = (min(s[0] for s in stats), max(s[1] for s in stats))
+
+    with span('tiles: colorize', tiles=len(tiles), biomes=biomes is not None):
+        list(map_function(partial(colorize_tile_job, directory=directory, value_range=value_range, levels=levels,
+                                  color_levels=tuple(color_levels), brightness=brightness, biomes=biomes,
+                                  origin=tuple(offset), period=period, kernel=kernel), tiles))
+    return open_store_array(directory, 'heightmap', mode='r'), open_store_array(directory, 'rgb', mode='r')
@@ -24,14 +24,14 @@ def validate_for_int(p):
     :param p:
     :return:
     """
-    if p:
+    if p and p != '-':
         try:
             int(p)
             return True
         except ValueError:
             return False
     else:
-        # Causes ValueError, but allows deleting all chars from entry
+        # Causes ValueError, but allows deleting all chars from entry (and typing negative numbers)
         return True
 
 
@@ -65,6 +65,10 @@ class LabeledEntry(Frame):
     def get(self):
         return self.entry.get()
 
+    def set(self, value):
+        self.entry.delete(0, 'end')
+        self.entry.insert(0, value)
+
 
 class LabeledVerticalScale(Frame):
     """
@@ -91,3 +95,6 @@ class LabeledVerticalScale(Frame):
 
     def get(self):
         return self.slider.get()
+
+    def set(self, value):
+        self.slider.set(value)
@@ -0,0 +1,218 @@
+import json
+import sys
+
+from collections import deque
+from os import getpid, O_RDONLY, open as os_open
+from threading import current_thread, get_ident, Lock
+from time import perf_counter_ns
+
+try:
+    import resource
+    from os import pread, sysconf
+except ImportError:
+    # Windows - no memory counters
+    resource = sysconf = None
+
+# number of recent spans kept by the tracer - older ones are dropped, so memory of the tracer is bounded
+MAX_EVENTS = 20000
+PAGE_SIZE = 4096 if sysconf is None else sysconf('SC_PAGE_SIZE')
+# (process id, descriptor) of open /proc/self/statm
+STATM = (None, None)
+
+
+def memory_usage():
+    """
+    memory_usage - resident memory of the process (bytes), read from /proc (Linux) - cheap enough for every span
+    (the file stays open, it is opened again in forked processes).
+    :return: bytes or None if not available
+    """
+    global STATM
+    if sysconf is None:
+        return None
+    try:
+        if STATM[0] != getpid():
+            STATM = (getpid(), os_open('/proc/self/statm', O_RDONLY))
+        return int(pread(STATM[1], 64, 0).split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_memory_usage():
+    """
+    peak_memory_usage - the highest resident memory of the process so far (bytes).
+    :return: bytes or None if not available
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere (Linux, BSD)
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Span(object):
+    """
+    Span - timed stage of the pipeline (context manager, see Tracer.span).
+    Arguments of the span (shape, kernel, number of tiles...) may be added while it runs: span.args['tiles'] = 5.
+    """
+    __slots__ = ('tracer', 'name', 'category', 'args', 'start')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        self.tracer.record(self.name, self.category, self.start, perf_counter_ns() - self.start, self.args,
+                           cancelled=error_type is not None)
+        return False
+
+
+class NoSpan(object):
+    # span of disabled tracer - nothing is measured
+    __slots__ = ('args',)
+
+    def __init__(self):
+        self.args = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        return False
+
+
+class Tracer(object):
+    """
+    Tracer - timing spans and memory counters of stages of the pipeline, from any thread.
+    Every span costs two reads of the clock and (with memory) one read of resident memory, spans are kept
+    in a bounded queue and summed up per name - cheap enough to stay on (spans are stages, not pixels).
+    Spans are shown in the status panel of the sandbox (see summary) and exported as Chrome trace
+    (see export_chrome_trace - open in chrome://tracing or https://ui.perfetto.dev).
+    Spans of worker processes of multiprocessing pools are not collected - time of the pool is the span around it.
+    """
+    def __init__(self, max_events=MAX_EVENTS, enabled=True, memory=True):
+        self.enabled = enabled
+        # resident memory is sampled at the end of every span
+        self.memory = memory
+        self.events = deque(maxlen=max_events)
+        # name -> [count, total ns, maximum ns, last ns, resident memory at the end of the last one]
+        self.totals = {}
+        self.thread_names = {}
+        self.origin = perf_counter_ns()
+        self.lock = Lock()
+
+    def span(self, name, category='pipeline', **args):
+        """
+        span - context manager measuring the stage: with tracer.span('noise', kernel='numpy'): ...
+        :param name: name of the stage
+        :param category: category of the stage (e.g. 'pipeline', 'ui', 'export')
+        :param args: arguments of the span shown in the trace
+        :return: Span
+        """
+        if not self.enabled:
+            return NoSpan()
+        return Span(self, name, category, args)
+
+    def record(self, name, category, start, duration, args=None, cancelled=False):
+        """
+        record - adds finished span (e.g. measured without context manager).
+        :param name: name of the stage
+        :param category: category of the stage
+        :param start: start (perf_counter_ns)
+        :param duration: duration in nanoseconds
+        :param args: optional dictionary of arguments of the span
+        :param cancelled: True if the stage ended with exception (e.g. cancelled job)
+        :return: None
+        """
+        rss = memory_usage() if self.memory else None
+        thread = get_ident()
+        if thread not in self.thread_names:
+            self.thread_names[thread] = current_thread().name
+        if cancelled:
+            args = dict(args or {}, cancelled=True)
+        with self.lock:
+            self.events.append((name, category, start, duration, thread, args, rss))
+            totals = self.totals.get(name)
+            if totals is None:
+                self.totals[name] = [1, duration, duration, duration, rss]
+            else:
+                totals[0] += 1
+                totals[1] += duration
+                totals[2] = max(totals[2], duration)
+                totals[3] = duration
+                totals[4] = rss
+
+    def clear(self):
+        with self.lock:
+            self.events.clear()
+            self.totals = {}
+
+    def summary(self):
+        """
+        summary - statistics of spans of every name, the most expensive first.
+        :return: list of (name, count, total seconds, maximum seconds, last seconds, resident memory after the last)
+        """
+        with self.lock:
+            totals = [(name,) + tuple(values) for name, values in self.totals.items()]
+        return [(name, count, total / 1e9, maximum / 1e9, last / 1e9, rss)
+                for name, count, total, maximum, last, rss in sorted(totals, key=lambda item: -item[2])]
+
+    def chrome_trace(self):
+        """
+        chrome_trace - spans as Chrome trace events: complete events of spans, counter of resident memory
+        and names of threads.
+        :return: dictionary of the trace (JSON object format)
+        """
+        pid = getpid()
+        with self.lock:
+            events = list(self.events)
+        trace = [dict(name='thread_name', ph='M', pid=pid, tid=thread, args=dict(name=name))
+                 for thread, name in list(self.thread_names.items())]
+        for name, category, start, duration, thread, args, rss in events:
+            # microseconds since the tracer was created
+            trace.append(dict(name=name, cat=category, ph='X', ts=(start - self.origin) / 1000, dur=duration / 1000,
+                              pid=pid, tid=thread, args=args or {}))
+            if rss is not None:
+                trace.append(dict(name='memory', ph='C', ts=(start + duration - self.origin) / 1000, pid=pid,
+                                  args=dict(rss_mb=round(rss / 1024 ** 2, 1))))
+        return dict(traceEvents=trace, displayTimeUnit='ms')
+
+    def export_chrome_trace(self, filename):
+        """
+        export_chrome_trace - saves spans as Chrome trace JSON file.
+        :param filename: name of the output file
+        :return: filename
+        """
+        with open(filename, 'w') as file:
+            json.dump(self.chrome_trace(), file, default=str)
+        return filename
+
+
+# tracer of the process - stages of the pipeline are measured with it
+TRACER = Tracer()
+
+
+def span(name, category='pipeline', **args):
+    # span of the tracer of the process (see Tracer.span)
+    return TRACER.span(name, category, **args)
+
+
+def format_summary(summary, limit=8):
+    """
+    format_summary - text of the status panel: the most expensive stages and memory of the process.
+    :param summary: result of Tracer.summary
+    :param limit: number of stages
+    :return: text
+    """
+    lines = ["{0}: {1:.0f} ms (x{2}, max {3:.0f} ms)".format(name, 1000 * last, count, 1000 * maximum)
+             for name, count, _, maximum, last, _ in summary[:limit]]
+    rss, peak = memory_usage(), peak_memory_usage()
+    if rss is not None:
+        lines.append("memory: {0:.0f} MB".format(rss / 1024 ** 2)
+                     + ("" if peak is None else " (peak {0:.0f} MB)".format(peak / 1024 ** 2)))
+    return '\n'.join(lines)
@@ -0,0 +1,142 @@
+from math import floor, log2
+from gret_trace import span
+from PIL import Image, ImageTk
+from tkinter import Canvas, Frame, Scrollbar, HORIZONTAL, VERTICAL
+
+# zoom range - zooming in magnifies tiles of full resolution, zooming out uses levels of the pyramid
+MIN_ZOOM = 1 / 64
+MAX_ZOOM = 8
+# tiles around the visible area, rendered in advance for smooth scrolling
+MARGIN_TILES = 1
+
+
+class MapViewport(Frame):
+    """
+    MapViewport - canvas with scrollbars showing TilePyramid.
+    Only tiles in the visible area (plus margin) are placed on the canvas - scrolling, dragging
+    and zooming fetch missing tiles on demand. Zoom (mouse wheel) is a power of 2:
+     - zoom out - tiles of the pyramid level of the same downsampling (nothing is resampled)
+     - zoom in - tiles of full resolution magnified (only visible ones)
+    """
+    def __init__(self, parent, width=0, height=0):
+        Frame.__init__(self, parent, bg=parent['bg'])
+        self.canvas = Canvas(self, width=width, height=height, bg='black')
+        self.canvas.grid(row=0, column=0, sticky='nw')
+        # scrollbars for canvas
+        self.side_scrollbar = Scrollbar(self, orient=VERTICAL, command=self.canvas.yview)
+        self.side_scrollbar.grid(row=0, column=1, sticky='ns')
+        self.bottom_scrollbar = Scrollbar(self, orient=HORIZONTAL, command=self.canvas.xview)
+        self.bottom_scrollbar.grid(row=1, column=0, sticky='we')
+        # every change of the view (scrollbars, drag, resize) ends up in these commands
+        self.canvas.config(yscrollcommand=self.scroll_event(self.side_scrollbar),
+                           xscrollcommand=self.scroll_event(self.bottom_scrollbar))
+        # some additional bind for drag and drop the canvas
+        self.canvas.bind('<Button-1>', lambda event: self.canvas.scan_mark(event.x // 10, event.y // 10))
+        self.canvas.bind('<B1-Motion>', lambda event: self.canvas.scan_dragto(event.x // 10, event.y // 10))
+        # zoom with mouse wheel (Button-4/5 on X11)
+        self.canvas.bind('<MouseWheel>', lambda event: self.zoom_event(event, event.delta > 0))
+        self.canvas.bind('<Button-4>', lambda event: self.zoom_event(event, True))
+        self.canvas.bind('<Button-5>', lambda event: self.zoom_event(event, False))
+        self.canvas.bind('<Configure>', lambda event: self.schedule_refresh())
+
+        self.pyramid = None
+        self.zoom = 1.0
+        # (level, row, column) -> (canvas item, photo image) of tiles placed on the canvas
+        self.items = {}
+        self.refresh_scheduled = False
+
+    def scroll_event(self, scrollbar):
+        def command(first, last):
+            scrollbar.set(first, last)
+            self.schedule_refresh()
+        return command
+
+    def show(self, pyramid):
+        """
+        show - replaces displayed map with given pyramid (zoom and position of the view are kept).
+        :param pyramid: TilePyramid or None for empty canvas
+        :return: None
+        """
+        self.clear_items()
+        self.pyramid = pyramid
+        self.update_scrollregion()
+        self.schedule_refresh()
+
+    def clear_items(self):
+        for item, _ in self.items.values():
+            self.canvas.delete(item)
+        self.items = {}
+
+    def update_scrollregion(self):
+        if self.pyramid is None:
+            return
+        self.canvas.config(scrollregion=(0, 0, round(self.pyramid.shape[1] * self.zoom),
+                                         round(self.pyramid.shape[0] * self.zoom)))
+
+    def zoom_event(self, event, zoom_in):
+        self.set_zoom(self.zoom * 2 if zoom_in else self.zoom / 2, event.x, event.y)
+
+    def set_zoom(self, zoom, x=0, y=0):
+        """
+        set_zoom - changes zoom, point (x, y) of the canvas window stays in place.
+        :param zoom: new zoom (power of 2, limited to MIN_ZOOM - MAX_ZOOM)
+        :param x: column of the point in canvas window
+        :param y: row of the point in canvas window
+        :return: None
+        """
+        zoom = min(MAX_ZOOM, max(MIN_ZOOM, 2 ** round(log2(zoom))))
+        if zoom == self.zoom or self.pyramid is None:
+            return
+        # position of the point in the map (pixels of full resolution)
+        map_x = self.canvas.canvasx(x) / self.zoom
+        map_y = self.canvas.canvasy(y) / self.zoom
+        self.zoom = zoom
+        self.clear_items()
+        self.update_scrollregion()
+        width = self.pyramid.shape[1] * zoom
+        height = self.pyramid.shape[0] * zoom
+        self.canvas.xview_moveto(max(0.0, map_x * zoom - x) / width)
+        self.canvas.yview_moveto(max(0.0, map_y * zoom - y) / height)
+        self.schedule_refresh()
+
+    def schedule_refresh(self):
+        # many events may come at once (e.g. dragging) - tiles are updated once, when Tk is idle
+        if not self.refresh_scheduled:
+            self.refresh_scheduled = True
+            self.after_idle(self.refresh)
+
+    def refresh(self):
+        """
+        refresh - places tiles of the visible area on the canvas, removes tiles out of it.
+        :return: None
+        """
+        self.refresh_scheduled = False
+        if self.pyramid is None:
+            return
+        # level of the pyramid and magnification of its tiles
+        level = min(self.pyramid.levels - 1, max(0, floor(-log2(self.zoom))))
+        scale = self.zoom * 2 ** level
+        tile_span = self.pyramid.tile_size * scale
+        margin = MARGIN_TILES * tile_span
+        wanted = set((level, row, column) for row, column in self.pyramid.tiles_in_region(
+            level, (self.canvas.canvasy(0) - margin) / scale, (self.canvas.canvasx(0) - margin) / scale,
+            (self.canvas.winfo_height() + 2 * margin) / scale, (self.canvas.winfo_width() + 2 * margin) / scale))
+
+        for key in [key for key in self.items if key not in wanted]:
+            self.canvas.delete(self.items.pop(key)[0])
+        missing = wanted - set(self.items)
+        if not missing:
+            return
+        with span('viewport', 'ui', tiles=len(missing), level=level):
+            for key in missing:
+                with span('render tile', 'ui'):
+                    tile = self.pyramid.tile(*key)
+                with span('photo image', 'ui'):
+                    image = Image.fromarray(tile)
+                    if scale != 1:
+                        image = image.resize((round(tile.shape[1] * scale), round(tile.shape[0] * scale)),
+                                             Image.NEAREST)
+                    photo = ImageTk.PhotoImage(image=image)
+                item = self.canvas.create_image(round(key[2] * tile_span), round(key[1] * tile_span),
+                                                anchor='nw', image=photo)
+                self.items[key] = (item, photo)
@@ -0,0 +1,253 @@
+"""
+Benchmark of stages of map generation - each stage is timed on its own.
+
+Stages:
+ - noise_rows: snoise2 row by row (generate_simplex_row, the original generation)
+ - noise_numpy: vectorized simplex noise (generate_simplex_array)
+ - noise_pool: vectorized noise generated by pool of workers into memory-mapped file
+ - noise_jit: compiled noise kernels filling bands of rows by threads (gret_jit - Numba,
+   or snoise2 pixel by pixel if Numba is not installed - backend is printed and saved with results)
+ - gradient: gradient of the gradient kit (base values, clipping and normalization)
+ - composite: composition of the whole map (weighted sum of 2 layers, gradient, quantization)
+ - colorize: convert_heightmap_into_RGB of quantized map
+ - depressions: fill_depressions of noise map (gret_hydrology - strips of columns swept by threads)
+ - erosion: erode of noise map by default droplets (gret_hydrology - parts of rounds of droplets by threads)
+
+Usage:
+    python testing_area/benchmark.py --sizes 512,1024,2048 --output results.json
+    python testing_area/benchmark.py --stages noise_pool --workers 1,2,4,8 --compare results.json
+    python testing_area/benchmark.py --stages depressions --sizes 4096,8192 --dtypes float32
+    python testing_area/benchmark.py --stages erosion --sizes 8192 --workers 1,4,8 --dtypes float32 --repeat 1
+
+Throughput is reported in Mpixels/s (for the best of repeats) and peak memory in MB - memory
+allocated by the main process during the stage (traced by tracemalloc in a separate run, memory of workers is not
+included).
+Time of the first run of noise_jit includes compilation (if not cached yet) - compare the best time.
+"""
+import json
+import platform
+import sys
+import tracemalloc
+
+from argparse import ArgumentParser
+from os import path
+from statistics import median
+from subprocess import run, DEVNULL
+from time import perf_counter
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import numpy as np
+
+from gret_composite import MapComposer
+from gret_convert import convert_heightmap_into_RGB
+from gret_gradient import apply_gradient_thresholds, gradient_base, gradient_thresholds
+from gret_hydrology import border_outlets, erode, fill_depressions
+from gret_jit import generate_jit_array, noise_backend
+from gret_noise import generate_mapped_noise_array, generate_simplex_array, generate_simplex_row, \
+    release_mapped_file
+from multiprocessing import cpu_count, Pool
+from multiprocessing.pool import ThreadPool
+
+STAGES = ('noise_rows', 'noise_numpy', 'noise_pool', 'noise_jit', 'gradient', 'composite', 'colorize', 'depressions',
+          'erosion')
+# stages using parameters (other stages are run once for every size and dtype)
+OCTAVES_STAGES = ('noise_rows', 'noise_numpy', 'noise_pool', 'noise_jit')
+WORKERS_STAGES = ('noise_pool', 'noise_jit', 'depressions', 'erosion')
+
+
+def noise_params(octaves):
+    return dict(scale=400.0, octaves=octaves, persistence=0.5, base=0.0)
+
+
+def bench_noise_rows(size, octaves, workers, dtype):
+    array = np.empty((size, size), dtype=dtype)
+    params = noise_params(octaves)
+
+    def stage():
+        for x in range(size):
+            array[x] = generate_simplex_row(x, size, **params)
+    return stage, None
+
+
+def bench_noise_numpy(size, octaves, workers, dtype):
+    params = noise_params(octaves)
+    return lambda: generate_simplex_array((size, size), dtype=dtype, **params), None
+
+
+def bench_noise_pool(size, octaves, workers, dtype):
+    params = noise_params(octaves)
+    pool = Pool(workers)
+
+    def stage():
+        filename, array = generate_mapped_noise_array(pool, (size, size), dtype=dtype, **params)
+        del array
+        release_mapped_file(filename)
+
+    def cleanup():
+        pool.close()
+        pool.join()
+    return stage, cleanup
+
+
+def bench_noise_jit(size, octaves, workers, dtype):
+    params = noise_params(octaves)
+    out = np.empty((size, size), dtype=dtype)
+    return lambda: generate_jit_array((size, size), out=out, workers=workers, **params), None
+
+
+def bench_gradient(size, octaves, workers, dtype):
+    def stage():
+        array = gradient_base((size, size), dtype=dtype)
+        apply_gradient_thresholds(array, *gradient_thresholds((size, size), 0.2, 0.8))
+    return stage, None
+
+
+def bench_composite(size, octaves, workers, dtype):
+    rng = np.random.default_rng(0)
+    layers = [rng.random((size, size)).astype(dtype) for _ in range(2)]
+    gradient = rng.random((size, size)).astype(dtype)
+    composer = MapComposer(dtype=dtype)
+
+    def stage():
+        composer.set_layer(0, layers[0], 1.0)
+        composer.set_layer(1, layers[1], 0.5)
+        composer.set_gradient(gradient)
+        # the whole composition - no cached stages
+        composer.invalidate_sum()
+        composer.get_quantized_map((size, size))
+    return stage, None
+
+
+def bench_colorize(size, octaves, workers, dtype):
+    heightmap = (np.trunc(np.random.default_rng(0).random((size, size)) * 32) / 32).astype(dtype)
+    out = np.empty((size, size, 3), dtype=np.uint8)
+    return lambda: convert_heightmap_into_RGB(heightmap, levels=[0.3, 0.5, 0.5], steps=32, out=out), None
+
+
+def bench_depressions(size, octaves, workers, dtype):
+    heightmap = generate_simplex_array((size, size), dtype=dtype, **noise_params(octaves))
+    heightmap -= heightmap.min()
+    heightmap /= heightmap.max()
+    outlets = border_outlets(heightmap)
+    pool = ThreadPool(workers) if workers > 1 else None
+
+    def cleanup():
+        if pool is not None:
+            pool.close()
+    return lambda: fill_depressions(heightmap, outlets, pool=pool, workers=workers), cleanup
+
+
+def bench_erosion(size, octaves, workers, dtype):
+    heightmap = generate_simplex_array((size, size), dtype=dtype, **noise_params(octaves))
+    eroded = np.empty_like(heightmap)
+    pool = ThreadPool(workers) if workers > 1 else None
+
+    def stage():
+        # every run erodes the same map
+        np.copyto(eroded, heightmap)
+        erode(eroded, pool=pool)
+
+    def cleanup():
+        if pool is not None:
+            pool.close()
+    return stage, cleanup
+
+
+def measure(setup, size, octaves, workers, dtype, repeat):
+    """
+    measure - times of the stage and peak of memory allocated during it.
+    Stage is timed without tracing (tracemalloc slows down Python code several times, e.g. snoise2 row by row),
+    peak memory is measured by one more, traced run.
+    :return: tuple of (list of times in seconds, peak memory in bytes)
+    """
+    stage, cleanup = setup(size, octaves, workers, dtype)
+    times = []
+    try:
+        for _ in range(repeat):
+            start_time = perf_counter()
+            stage()
+            times.append(perf_counter() - start_time)
+        tracemalloc.start()
+        stage()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if cleanup is not None:
+            cleanup()
+    return times, peak
+
+
+def result_key(result):
+    return result['stage'], result['size'], result['octaves'], result['workers'], result['dtype']
+
+
+def environment():
+    try:
+        commit = run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, stdin=DEVNULL,
+                     cwd=path.dirname(path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return dict(commit=commit, python=platform.python_version(), numpy=np.__version__,
+                machine=platform.machine(), system=platform.system(), cpu_count=cpu_count(),
+                noise_backend=noise_backend())
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Benchmark of stages of map generation.")
+    as_ints = lambda text: [int(x) for x in text.split(',')]
+    parser.add_argument('--stages', type=lambda text: text.split(','), default=list(STAGES),
+                        help="comma separated stages: " + ', '.join(STAGES))
+    parser.add_argument('--sizes', type=as_ints, default=[512, 1024, 2048],
+                        help="comma separated sizes of square maps (e.g. 512,1024,4096,16384)")
+    parser.add_argument('--octaves', type=as_ints, default=[6], help="comma separated numbers of octaves")
+    parser.add_argument('--workers', type=as_ints, default=[min(cpu_count(), 6)],
+                        help="comma separated numbers of workers (" + ', '.join(WORKERS_STAGES) + " only)")
+    parser.add_argument('--dtypes', type=lambda text: text.split(','), default=['float64'],
+                        help="comma separated dtypes of arrays (e.g. float64,float32)")
+    parser.add_argument('--repeat', type=int, default=3, help="number of runs of each case")
+    parser.add_argument('--max-rows-size', type=int, default=1024,
+                        help="noise_rows is skipped for bigger maps (it is very slow)")
+    parser.add_argument('--output', default=None, help="JSON file for results")
+    parser.add_argument('--compare', default=None, help="JSON file of previous results, for comparison")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error("unknown stages: " + ', '.join(sorted(unknown)))
+    baseline = {}
+    if args.compare is not None:
+        with open(args.compare) as file:
+            baseline = {result_key(result): result for result in json.load(file)['results']}
+
+    results = []
+    print("noise backend (noise_jit):", noise_backend())
+    print("{0:<12} {1:>6} {2:>7} {3:>7} {4:>8} {5:>9} {6:>9} {7:>9} {8:>8}".format(
+        'stage', 'size', 'octaves', 'workers', 'dtype', 'best s', 'Mpix/s', 'peak MB', 'vs base'))
+    for stage in args.stages:
+        setup = globals()['bench_' + stage]
+        for size in args.sizes:
+            if stage == 'noise_rows' and size > args.max_rows_size:
+                continue
+            for octaves in (args.octaves if stage in OCTAVES_STAGES else [None]):
+                for workers in (args.workers if stage in WORKERS_STAGES else [1]):
+                    for dtype in args.dtypes:
+                        times, peak = measure(setup, size, octaves or 6, workers, np.dtype(dtype), args.repeat)
+                        result = dict(stage=stage, size=size, octaves=octaves, workers=workers, dtype=dtype,
+                                      best_s=min(times), median_s=median(times),
+                                      mpix_s=size * size / min(times) / 1e6, peak_mb=peak / 1024 ** 2)
+                        results.append(result)
+                        old = baseline.get(result_key(result))
+                        print("{stage:<12} {size:>6} {0:>7} {workers:>7} {dtype:>8} {best_s:>9.4f} {mpix_s:>9.2f} "
+                              "{peak_mb:>9.1f} {1:>8}".format(
+                                  '-' if octaves is None else octaves,
+                                  '-' if old is None else '%.2fx' % (result['mpix_s'] / old['mpix_s']), **result))
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(dict(environment=environment(), results=results), file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
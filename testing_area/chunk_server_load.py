@@ -0,0 +1,117 @@
+"""
+Load test of the chunk server (gret_server) - simulated players walk randomly through the world
+and request chunks around them, each player over its own keep-alive connection.
+
+Usage:
+    python gret_server.py world.json --unix /tmp/gret.sock &
+    python testing_area/chunk_server_load.py --unix /tmp/gret.sock --players 16 --steps 50
+    python testing_area/chunk_server_load.py --port 8000 --players 64 --view 2 --format npy
+
+Every step a player moves to a neighbouring chunk (or stays) and requests all chunks within
+'view' chunks around it - chunks seen before by the player are not requested again (as a client would cache them).
+Latency percentiles (ms) and throughput (chunks/s) are printed, with /stats of the server after the test.
+"""
+import asyncio
+import json
+import random
+import sys
+
+from argparse import ArgumentParser
+from statistics import quantiles
+from time import perf_counter
+
+PERCENTILES = (50, 90, 99)
+
+
+async def connect(args):
+    if args.unix is not None:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+
+async def fetch(reader, writer, target):
+    """
+    fetch - body of GET request over kept-alive connection.
+    :param reader: StreamReader of the connection
+    :param writer: StreamWriter of the connection
+    :param target: path of the request
+    :return: tuple of (status code, body)
+    """
+    writer.write('GET {0} HTTP/1.1\r\nHost: localhost\r\n\r\n'.format(target).encode('latin-1'))
+    await writer.drain()
+    status = (await reader.readline()).decode('latin-1').split()[1]
+    length = 0
+    while True:
+        line = (await reader.readline()).decode('latin-1').strip()
+        if not line:
+            break
+        name, _, value = line.partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def player(args, number, latencies, errors):
+    rng = random.Random(args.seed + number)
+    # players start spread over the world
+    x, y = rng.randrange(-args.spread, args.spread + 1), rng.randrange(-args.spread, args.spread + 1)
+    seen = set()
+    reader, writer = await connect(args)
+    try:
+        for _ in range(args.steps):
+            x, y = x + rng.choice((-1, 0, 1)), y + rng.choice((-1, 0, 1))
+            for dy in range(-args.view, args.view + 1):
+                for dx in range(-args.view, args.view + 1):
+                    if (x + dx, y + dy) in seen:
+                        continue
+                    seen.add((x + dx, y + dy))
+                    start = perf_counter()
+                    status, _ = await fetch(reader, writer, '/chunk/{0}/{1}/{2}.{3}'.format(
+                        args.lod, x + dx, y + dy, args.format))
+                    latencies.append(perf_counter() - start)
+                    if status != '200':
+                        errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_load(args):
+    latencies, errors = [], []
+    start = perf_counter()
+    await asyncio.gather(*(player(args, number, latencies, errors) for number in range(args.players)))
+    elapsed = perf_counter() - start
+    reader, writer = await connect(args)
+    _, stats = await fetch(reader, writer, '/stats')
+    writer.close()
+    return latencies, errors, elapsed, json.loads(stats)
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Load test of the chunk server - players walking randomly through the world.")
+    parser.add_argument('--host', default='127.0.0.1', help="host of the server (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8000, help="port of the server (default: 8000)")
+    parser.add_argument('--unix', default=None, help="path of unix socket of the server (instead of TCP port)")
+    parser.add_argument('--players', type=int, default=16, help="number of simulated players (connections)")
+    parser.add_argument('--steps', type=int, default=30, help="number of steps of each player")
+    parser.add_argument('--view', type=int, default=1, help="chunks seen around the player")
+    parser.add_argument('--spread', type=int, default=20, help="players start within this many chunks of the origin")
+    parser.add_argument('--lod', type=int, default=0, help="level of detail of requested chunks")
+    parser.add_argument('--format', choices=('png', 'npy'), default='png', help="format of requested chunks")
+    parser.add_argument('--seed', type=int, default=0, help="seed of random walks")
+    args = parser.parse_args(argv)
+
+    latencies, errors, elapsed, stats = asyncio.run(run_load(args))
+    if len(latencies) < 2:
+        print("Not enough requests for statistics")
+        return 1
+    cut_points = quantiles(latencies, n=100)
+    print("requests: {0}, errors: {1}, time: {2:.2f}s, throughput: {3:.1f} chunks/s".format(
+        len(latencies), len(errors), elapsed, len(latencies) / elapsed))
+    print("latency (ms): " + ", ".join("p{0} {1:.1f}".format(percentile, 1000 * cut_points[percentile - 1])
+                                       for percentile in PERCENTILES) + ", max {0:.1f}".format(1000 * max(latencies)))
+    print("server:", json.dumps(stats))
+    return 0 if not errors else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
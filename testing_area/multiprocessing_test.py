@@ -1,14 +1,19 @@
 import multiprocessing as mp
-from opensimplex import OpenSimplex
 from noise import pnoise2, snoise2
 import numpy as np
 import time
 
+try:
+    from opensimplex import OpenSimplex
+except ImportError:
+    # opensimplex is optional - only its (commented out) comparison needs it
+    OpenSimplex = None
+
 
 class A(object):
     def __init__(self, *args, **kwargs):
         self.MAP_SIZE = 1024
-        self.noise_map = np.empty((self.MAP_SIZE, self.MAP_SIZE), dtype=np.float)
+        self.noise_map = np.empty((self.MAP_SIZE, self.MAP_SIZE), dtype=float)
         self.time = None
 
     # PNOISE2
@@ -32,10 +37,9 @@ class A(object):
         return noise_table
 
     def run_perlin(self, cores):
-        p = mp.Pool(cores)
-        start_time = time.time()
-        self.noise_map = p.map(self.fast_perlin, range(self.MAP_SIZE))
-        #p.close
+        with mp.Pool(cores) as p:
+            start_time = time.time()
+            self.noise_map = p.map(self.fast_perlin, range(self.MAP_SIZE))
         print("Pnoise2 multi time ({0} cores):  {1:.3f} seconds".format(cores, (time.time() - start_time)))
         self.time = (time.time() - start_time)
 
@@ -61,10 +65,9 @@ class A(object):
         return noise_table
 
     def run_simplex(self, cores):
-        p = mp.Pool(cores)
-        start_time = time.time()
-        self.noise_map = p.map(self.fast_simplex, range(self.MAP_SIZE))
-        #p.close
+        with mp.Pool(cores) as p:
+            start_time = time.time()
+            self.noise_map = p.map(self.fast_simplex, range(self.MAP_SIZE))
         #print("Snoise2 multi time ({0} cores):  {1:.3f} seconds".format(cores, (time.time() - start_time)))
         self.time = (time.time() - start_time)
 
@@ -90,9 +93,8 @@ class A(object):
 
     def run_multi(self):
         start_time = time.time()
-        p = Pool()
-        self.noise_map = p.map(self.fast_opensimplex, range(self.MAP_SIZE))
-        #p.close
+        with mp.Pool() as p:
+            self.noise_map = p.map(self.fast_opensimplex, range(self.MAP_SIZE))
         print("Opensimplex multi time:  %.3f seconds" % (time.time() - start_time))
         self.time = (time.time() - start_time)
 
@@ -101,29 +103,31 @@ if __name__ == '__main__':
     a = A()
     #a.MAP_SIZE = 1000
     """
-    a.noise_map = np.empty((a.MAP_SIZE, a.MAP_SIZE), dtype=np.float)
+    a.noise_map = np.empty((a.MAP_SIZE, a.MAP_SIZE), dtype=float)
     a.make_noise_perlin()
-    a.noise_map = np.empty((a.MAP_SIZE, a.MAP_SIZE), dtype=np.float)
+    a.noise_map = np.empty((a.MAP_SIZE, a.MAP_SIZE), dtype=float)
     a.run_perlin()
-    a.noise_map = np.empty((a.MAP_SIZE, a.MAP_SIZE), dtype=np.float)
+    a.noise_map = np.empty((a.MAP_SIZE, a.MAP_SIZE), dtype=float)
     a.make_noise_simplex()
     """
+    # see benchmark.py for benchmark of all stages of the generation
+    repeats = 1
     for size in range(400, 401, 100):
         print("Table size: %s^2" % size)
         a.MAP_SIZE = size
         sum = 0
-        for i in range(1):
-            a.noise_map = np.empty((a.MAP_SIZE, a.MAP_SIZE), dtype=np.float)
+        for i in range(repeats):
+            a.noise_map = np.empty((a.MAP_SIZE, a.MAP_SIZE), dtype=float)
             a.make_noise_simplex()
             sum += a.time
-        print("Average time for 1 core: {0:.3f} s".format(sum/10))
+        print("Average time for 1 core: {0:.3f} s".format(sum / repeats))
         for core in range(4, 5):
             sum = 0
-            for i in range(1):
-                a.noise_map = np.empty((a.MAP_SIZE, a.MAP_SIZE), dtype=np.float)
+            for i in range(repeats):
+                a.noise_map = np.empty((a.MAP_SIZE, a.MAP_SIZE), dtype=float)
                 a.run_simplex(core)
                 sum += a.time
-            print("Average time for {0} cores: {1:.3f} s".format(core, sum/10))
+            print("Average time for {0} cores: {1:.3f} s".format(core, sum / repeats))
     # Opensimplex is too slow even with multiprocessing
     #a.make_noise_opensimplex()
     #a.run_multi()
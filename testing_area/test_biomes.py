@@ -0,0 +1,111 @@
+"""
+Biomes (gret_biomes) - every cell classified by lookup table from height, temperature and moisture,
+tiles of the map get the same biomes as the whole map, biome map is saved as indexed PNG.
+
+Run with: python -m pytest testing_area/test_biomes.py (or just python testing_area/test_biomes.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import tempfile
+
+import numpy as np
+
+from gret_biomes import BARE_ROCK, BIOMES, DEEP_OCEAN, DEFAULT_BIOMES, OCEAN, SNOW, biome_palette, build_biome_lut, \
+    climate_noise, generate_biome_map
+from gret_core import MapSpec, generate_map_with_biomes, save_map
+from gret_generate import main
+from gret_noise import generate_simplex_row
+from gret_server import generate_chunk
+from gret_tiles import generate_tiled_map
+from PIL import Image
+
+LEVELS = 32
+COLOR_LEVELS = (0.3, 0.5, 0.5)
+
+
+def make_spec(**params):
+    return MapSpec(map_size=[200, 300], layers=[dict(scale=120.0, octaves=5, base=4.0)],
+                   gradient=dict(min_value_radius=0.2, max_value_radius=0.9), biomes={}, **params)
+
+
+def test_lookup_table():
+    lut = build_biome_lut(LEVELS, COLOR_LEVELS)
+    assert lut.shape == (LEVELS + 1, 64, 64) and lut.dtype == np.uint8
+    # below the sea is always ocean, whatever the climate
+    assert set(np.unique(lut[:int(0.3 * LEVELS) + 1])) <= {DEEP_OCEAN, OCEAN}
+    # tops of mountains (above hills level) are rock or snow, the coldest climate is snow
+    assert set(np.unique(lut[-1])) <= {BARE_ROCK, SNOW} and lut[-1, 0, 0] == SNOW
+    # land of warm, wet climate is not the same as of cold, dry one
+    assert lut[LEVELS // 2, -1, -1] != lut[LEVELS // 2, 0, 0]
+    # every biome is reachable
+    assert set(np.unique(lut)) == set(range(len(BIOMES)))
+
+
+def test_tiles_fit_together():
+    spec = make_spec()
+    heightmap, rgb_map, biome_map = generate_map_with_biomes(spec)
+    assert biome_map.dtype == np.uint8 and biome_map.shape == spec.map_size
+    assert np.array_equal(rgb_map, biome_palette()[biome_map])
+    assert len(np.unique(biome_map)) > 4
+    # blocks of rows generated separately (threads, tiles of the store) give the same biomes
+    tiles = np.vstack([generate_biome_map(heightmap[row:row + 70], spec.biomes, LEVELS, COLOR_LEVELS, offset=(row, 0))
+                       for row in range(0, 200, 70)])
+    assert np.array_equal(tiles, biome_map)
+    # chunks of the world have biomes of windows of the world (gradient of a window is not the one of the world)
+    world = MapSpec.from_dict(dict(spec.to_dict(), gradient=None))
+    _, chunk_rgb_map = generate_chunk(world, 1, -1, chunk_size=64)
+    assert np.array_equal(chunk_rgb_map, generate_map_with_biomes(world.with_window(64, -64, 64, 64))[1])
+    # other seed - other climate
+    _, _, other_biome_map = generate_map_with_biomes(spec.with_seed(1))
+    assert not np.array_equal(other_biome_map, biome_map)
+    assert MapSpec.from_dict(spec.to_dict()).biomes == spec.biomes
+
+
+def test_climate_of_noise_kernel():
+    # climate layers are generated by the kernel of layers of the map - snoise2 rounds differently than numpy
+    layer = dict(DEFAULT_BIOMES['temperature'], scale=23.0)
+    params = {key: layer[key] for key in ('scale', 'octaves', 'persistence', 'base')}
+    climate = climate_noise(layer, (40, 60), (5, -7), None, 'snoise2')
+    rows = np.array([generate_simplex_row(5 + row, 60, column=-7, **params) for row in range(40)], dtype=np.float32)
+    assert np.array_equal(climate, rows)
+    assert not np.array_equal(climate, climate_noise(layer, (40, 60), (5, -7), None, 'numpy'))
+    # kernels give the same noise up to rounding - only cells at borders of levels and steps of climate differ
+    _, _, biome_map = generate_map_with_biomes(make_spec())
+    _, _, jit_biome_map = generate_map_with_biomes(make_spec(kernel='numba'))
+    assert np.mean(jit_biome_map != biome_map) < 0.01
+
+
+def test_tiled_store_and_export():
+    spec = make_spec()
+    _, rgb_map, biome_map = generate_map_with_biomes(spec)
+    with tempfile.TemporaryDirectory() as directory:
+        _, tiled_rgb_map = generate_tiled_map(path.join(directory, 'store'), spec.map_size, spec.layers, spec.gradient,
+                                              dtype=np.float32, tile_size=64, biomes=spec.biomes)
+        # tiled map is normalized by the range of float32 noise - allow a few cells at borders of levels
+        assert np.mean(np.any(tiled_rgb_map != rgb_map, axis=-1)) < 0.01
+        save_map(directory, 'map', None, rgb_map, formats=('biomes',), biome_map=biome_map)
+        image = Image.open(path.join(directory, 'map_biomes.png'))
+        assert image.mode == 'P'
+        assert np.array_equal(np.asarray(image), biome_map)
+        assert np.array_equal(np.reshape(image.getpalette()[:3 * len(BIOMES)], (-1, 3)), biome_palette())
+
+
+def test_command_line():
+    with tempfile.TemporaryDirectory() as directory:
+        spec_file = path.join(directory, 'spec.json')
+        with open(spec_file, 'w') as file:
+            file.write('{"map_size": [96, 128], "biomes": {"lapse_rate": 0.2}}')
+        assert main([spec_file, '-o', directory, '-w', '1', '-f', 'png,biomes']) == 0
+        assert path.exists(path.join(directory, 'map_0_biomes.png'))
+        assert main([spec_file, '-o', directory, '-w', '1', '-f', 'biomes', '--store', path.join(directory, 's')]) == 0
+
+
+if __name__ == '__main__':
+    for test in (test_lookup_table, test_tiles_fit_together, test_climate_of_noise_kernel, test_tiled_store_and_export,
+                 test_command_line):
+        test()
+        print(test.__name__, 'OK')
@@ -0,0 +1,176 @@
+"""
+Chunk service (gret_server) - chunks are windows of the world, generated once and served over HTTP.
+
+Run with: python -m pytest testing_area/test_chunk_service.py (or just python testing_area/test_chunk_service.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import asyncio
+import json
+import tempfile
+
+import numpy as np
+
+from gret_core import MapSpec, generate_map
+from gret_server import ChunkService, generate_chunk, serve
+from io import BytesIO
+from threading import Event
+
+CHUNK = 64
+LAYERS = [dict(scale=120.0, octaves=4, persistence=0.5, factor=1.0, base=3.0),
+          dict(scale=30.0, octaves=2, persistence=0.5, factor=-0.3, base=7.0)]
+
+
+def make_spec(gradient=None):
+    return MapSpec(map_size=[CHUNK * 4, CHUNK * 4], layers=LAYERS, gradient=gradient, kernel='numpy')
+
+
+def test_chunk_is_window_of_the_world():
+    spec = make_spec()
+    heightmap, rgb_map = generate_chunk(spec, -2, 1, chunk_size=CHUNK)
+    window_heightmap, window_rgb_map = generate_map(spec.with_window(-2 * CHUNK, CHUNK, CHUNK, CHUNK))
+    assert np.array_equal(heightmap, window_heightmap)
+    assert np.array_equal(rgb_map, window_rgb_map)
+
+
+def test_lower_level_of_detail_covers_more_world():
+    spec = make_spec(gradient=dict(min_value_radius=0.2, max_value_radius=0.8, pattern='square'))
+    heightmap, rgb_map = generate_chunk(spec, 0, 0, lod=2, chunk_size=CHUNK)
+    assert heightmap.shape == (CHUNK, CHUNK) and rgb_map.shape == (CHUNK, CHUNK, 3)
+    # chunk of lod 2 covers the whole gradient area (4 chunks along each axis) - borders are masked,
+    # as is the world out of the area
+    outside, _ = generate_chunk(spec, 1, 0, lod=2, chunk_size=CHUNK)
+    assert np.all(outside == heightmap[0, 0]) and heightmap[CHUNK // 2, CHUNK // 2] > heightmap[0, 0]
+
+
+def test_concurrent_requests_are_generated_once():
+    service = ChunkService(make_spec(), chunk_size=CHUNK, workers=2, prefetch=False)
+    try:
+        futures = [service.request(0, 0) for _ in range(8)]
+        results = [future.result() for future in futures]
+        assert all(result[0] is results[0][0] for result in results)
+        stats = service.get_stats()
+        assert stats['generated'] == 1 and stats['deduplicated'] + stats['hits'] == 7
+    finally:
+        service.close()
+
+
+def test_requested_chunk_does_not_wait_for_prefetching():
+    service = ChunkService(make_spec(), chunk_size=CHUNK, workers=1)
+    release = Event()
+    try:
+        # the thread of prefetching is busy - all prefetched chunks wait in its queue
+        service.prefetch_executor.submit(release.wait)
+        service.chunk(0, 0)
+        service.chunk(5, 5)
+        assert service.prefetching == 16 and (1, 0, 0) in service.queued
+        # queued neighbour is generated by the pool of requests, not after the queue
+        heightmap, _ = service.request(1, 0).result(timeout=30)
+        assert np.array_equal(heightmap, generate_chunk(make_spec(), 1, 0, chunk_size=CHUNK)[0])
+        assert service.get_stats()['promoted'] == 1 and (1, 0, 0) not in service.queued
+    finally:
+        release.set()
+        service.close()
+
+
+def test_least_recently_used_chunks_are_evicted():
+    chunk_bytes = CHUNK * CHUNK * (4 + 3)
+    service = ChunkService(make_spec(), chunk_size=CHUNK, max_bytes=2 * chunk_bytes, workers=1, prefetch=False)
+    try:
+        for cx in (0, 1, 0, 2):
+            service.chunk(cx, 0)
+        # chunk 1 was the least recently used one
+        assert set(service.chunks) == {(0, 0, 0), (2, 0, 0)}
+        assert service.get_stats()['evicted'] == 1
+    finally:
+        service.close()
+
+
+def test_store_keeps_chunks_between_services():
+    from gret_cache import LayerCache
+    with tempfile.TemporaryDirectory() as directory:
+        first = ChunkService(make_spec(), chunk_size=CHUNK, store=LayerCache(directory), prefetch=False)
+        heightmap, _ = first.chunk(3, -1)
+        first.close()
+        second = ChunkService(make_spec(), chunk_size=CHUNK, store=LayerCache(directory), prefetch=False)
+        try:
+            assert np.array_equal(second.chunk(3, -1)[0], heightmap)
+            assert second.get_stats()['store_hits'] == 1 and second.get_stats()['generated'] == 0
+        finally:
+            second.close()
+
+
+def test_store_entry_evicted_while_loaded():
+    import gret_cache
+    utime = gret_cache.utime
+
+    def evict_first(filename):
+        # another thread evicts the entry between mapping and marking it as used
+        gret_cache.remove(filename)
+        utime(filename)
+    with tempfile.TemporaryDirectory() as directory:
+        cache = gret_cache.LayerCache(directory)
+        cache.store('layer', np.arange(12.0).reshape(3, 4))
+        gret_cache.utime = evict_first
+        try:
+            array = cache.load('layer')
+        finally:
+            gret_cache.utime = utime
+        assert np.array_equal(array, np.arange(12.0).reshape(3, 4))
+        assert cache.load('layer') is None
+
+
+def test_http_over_unix_socket():
+    service = ChunkService(make_spec(), chunk_size=CHUNK, workers=2)
+
+    async def fetch(reader, writer, target):
+        writer.write('GET {0} HTTP/1.1\r\nHost: localhost\r\n\r\n'.format(target).encode())
+        await writer.drain()
+        status = (await reader.readline()).decode()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode().strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.lower()] = value.strip()
+        return status.split()[1], await reader.readexactly(int(headers['content-length']))
+
+    async def run(socket_path):
+        started = asyncio.Event()
+        server = asyncio.ensure_future(serve(service, unix=socket_path, ready=lambda _: started.set()))
+        await started.wait()
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        # one connection, many requests (keep-alive)
+        responses = [await fetch(reader, writer, target)
+                     for target in ('/chunk/0/1/1.npy', '/chunk/0/1/1.png', '/chunk/99/0/0.png', '/nothing', '/stats')]
+        writer.close()
+        await writer.wait_closed()
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+        return responses
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            responses = asyncio.run(run(path.join(directory, 'chunks.sock')))
+        (npy_status, npy), (png_status, png), (lod_status, _), (missing_status, _), (_, stats) = responses
+        assert (npy_status, png_status, lod_status, missing_status) == ('200', '200', '400', '404')
+        assert np.array_equal(np.load(BytesIO(npy)), service.chunk(1, 1)[0])
+        assert png.startswith(b'\x89PNG')
+        assert json.loads(stats)['requests'] >= 2
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    for test in (test_chunk_is_window_of_the_world, test_lower_level_of_detail_covers_more_world,
+                 test_concurrent_requests_are_generated_once, test_requested_chunk_does_not_wait_for_prefetching,
+                 test_least_recently_used_chunks_are_evicted,
+                 test_store_keeps_chunks_between_services, test_store_entry_evicted_while_loaded,
+                 test_http_over_unix_socket):
+        test()
+        print(test.__name__, 'OK')
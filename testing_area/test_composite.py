@@ -0,0 +1,105 @@
+"""
+Composition of the map (gret_composite) - fused blocked passes give the same quantized map as the straightforward
+weighted sum, gradient, normalization and quantization of whole arrays, by one thread or more.
+
+Run with: python -m pytest testing_area/test_composite.py (or just python testing_area/test_composite.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import numpy as np
+
+import gret_composite
+
+from gret_composite import MapComposer
+from gret_gradient import gradient_tile
+from gret_noise import generate_simplex_array
+
+SHAPE = (200, 300)
+LAYERS = [(dict(scale=120.0, octaves=5, base=1.0), 1.0),
+          (dict(scale=40.0, octaves=3, base=4.0), -0.4),
+          (dict(scale=15.0, octaves=2, base=9.0), 0.25)]
+
+
+def make_layers(shape=SHAPE):
+    return [(generate_simplex_array(shape, dtype=np.float64, **params), factor) for params, factor in LAYERS]
+
+
+def straightforward_map(layers, gradient, levels):
+    # the original display_map - every stage over the whole map, with temporary arrays
+    noise_map = np.zeros(np.shape(layers[0][0]))
+    for array, factor in layers:
+        noise_map += factor * array
+    if np.ptp(noise_map) == 0:
+        return None
+    if gradient is not None:
+        noise_map *= gradient
+    noise_map = ((noise_map - np.amin(noise_map)) / np.ptp(noise_map) * levels).astype(int)
+    return noise_map / levels
+
+
+def compose(layers, gradient, levels, workers=1, shape=SHAPE):
+    composer = MapComposer(levels=levels, dtype=np.float64, workers=workers)
+    for key, (array, factor) in enumerate(layers):
+        composer.set_layer(key, array, factor)
+    composer.set_gradient(gradient)
+    return composer.get_quantized_map(shape)
+
+
+def test_quantized_map_matches_straightforward():
+    layers = make_layers()
+    gradient = gradient_tile(SHAPE, 0.2, 0.8)
+    for levels in (8, 32, 100):
+        for current_gradient in (None, gradient):
+            expected = straightforward_map(layers, current_gradient, levels)
+            assert np.array_equal(compose(layers, current_gradient, levels), expected)
+            assert np.array_equal(compose(layers[:1], current_gradient, levels),
+                                  straightforward_map(layers[:1], current_gradient, levels))
+
+
+def test_blocks_by_threads_match_straightforward():
+    # several blocks of rows and no minimal size of the map - blocks composed by threads
+    shape = (1000, 300)
+    assert len(gret_composite.row_blocks(shape)) > 2
+    parallel_size = gret_composite.PARALLEL_SIZE
+    gret_composite.PARALLEL_SIZE = 0
+    try:
+        layers = make_layers(shape)
+        gradient = gradient_tile(shape, 0.9, 0.3)
+        assert np.array_equal(compose(layers, gradient, 32, workers=4, shape=shape),
+                              straightforward_map(layers, gradient, 32))
+    finally:
+        gret_composite.PARALLEL_SIZE = parallel_size
+
+
+def test_changed_factor_matches_new_map():
+    layers = make_layers()
+    gradient = gradient_tile(SHAPE, 0.2, 0.8)
+    composer = MapComposer(levels=32, dtype=np.float64, workers=1)
+    for key, (array, factor) in enumerate(layers):
+        composer.set_layer(key, array, factor)
+    composer.set_gradient(gradient)
+    composer.get_quantized_map(SHAPE)
+    # new factor is applied as a delta of the cached sum - rounding may move a pixel lying on the border of levels
+    composer.set_layer(1, layers[1][0], 0.7)
+    layers[1] = (layers[1][0], 0.7)
+    quantized_map = composer.get_quantized_map(SHAPE)
+    expected = straightforward_map(layers, gradient, 32)
+    assert np.abs(quantized_map - expected).max() <= 1.0 / 32
+    assert np.count_nonzero(quantized_map != expected) <= 2
+
+
+def test_flat_map_is_none():
+    flat = np.full(SHAPE, 0.5)
+    assert straightforward_map([(flat, 1.0)], None, 32) is None
+    assert compose([(flat, 1.0)], None, 32) is None
+
+
+if __name__ == '__main__':
+    for test in (test_quantized_map_matches_straightforward, test_blocks_by_threads_match_straightforward,
+                 test_changed_factor_matches_new_map, test_flat_map_is_none):
+        test()
+        print(test.__name__, 'OK')
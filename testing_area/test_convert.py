@@ -0,0 +1,111 @@
+"""
+Colorizer (gret_convert) - lookup table gives the same colors as the original level by level conversion
+for quantized heightmaps, tiles are colorized the same as the whole map.
+
+Run with: python -m pytest testing_area/test_convert.py (or just python testing_area/test_convert.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import numpy as np
+
+from gret_convert import convert_heightmap_into_RGB
+
+SHAPE = (80, 120)
+RGB_DICT = {'R': [(1, 0), (0.5, 0.2), (0, 0.9)],
+            'G': [(0.3, 0.1), (-1, 1), (0.2, 0.4)],
+            'B': [(-2, 1.5), (0, 0.3), (1, 0)]}
+# (levels, rgb_dict, brightness) - the default colors, custom colors and levels out of range
+SETUPS = ((None, None, 1), ([0.3, 0.5, 0.5], None, 0.7), ([0.25, 0.6], RGB_DICT, 1), ([0.4, 1.5], RGB_DICT, 0.5))
+
+
+def levels_reference(heightmap, brightness=1, levels=None, rgb_dict=None):
+    # the original convert_heightmap_into_RGB - every level and channel computed over the whole heightmap
+    if levels is None:
+        levels = [0.3, 0.5, 0.5]
+    else:
+        levels = [(x if 0 <= x <= 1 else 0) for x in levels]
+    if rgb_dict is None:
+        rgb_dict = {
+            'R': [(2, -1), (0.95, -0.3), (0.1, 0.65), (-0.75, 0.75)],
+            'G': [(1, 0), (0.55, 0.1), (-0.25, 0.65), (-0.4, 0.4)],
+            'B': [(2, 0), (0, 0), (0, 0), (0, 0)]
+        }
+    if np.ptp(heightmap) == 0:
+        return np.zeros(heightmap.shape + (3,), dtype=np.uint8)
+    heightmap = (heightmap.astype(float) - np.amin(heightmap)) / np.ptp(heightmap)
+    if len(levels) > 1:
+        for i in range(1, len(levels)):
+            levels[i] = levels[i] * (1 - levels[i-1]) + levels[i-1]
+    levels = [0.0] + levels
+    if levels[-1] != 1:
+        levels = levels + [1.0]
+    brightness = brightness if 0 <= brightness <= 1 else 1
+    rgb_map = np.zeros(heightmap.shape + (3,), dtype=float)
+    for i in range(1, len(levels)):
+        basic_map = heightmap.copy()
+        basic_map[heightmap > levels[i]] = levels[i]
+        basic_map[heightmap < levels[i-1]] = levels[i-1]
+        if np.ptp(basic_map) != 0:
+            basic_map = (basic_map - np.amin(basic_map)) / np.ptp(basic_map)
+        for channel, key in enumerate(('R', 'G', 'B')):
+            tmp_map = basic_map * rgb_dict[key][i-1][0] + rgb_dict[key][i-1][1]
+            tmp_map[tmp_map < 0] = 0
+            tmp_map[tmp_map > 1] = 1
+            tmp_map[heightmap > levels[i]] = 0
+            tmp_map[heightmap <= levels[i-1]] = 0
+            rgb_map[:, :, channel] += tmp_map
+    rgb_map *= brightness * 255
+    return rgb_map.astype(np.uint8)
+
+
+def quantized_heightmap(levels, seed=0, dtype=np.float64):
+    # every level present, the lowest and the highest one too - the range of the map is 0-1
+    values = np.random.default_rng(seed).integers(0, levels + 1, SHAPE)
+    values.flat[:2] = 0, levels
+    return (values / levels).astype(dtype)
+
+
+def test_colors_match_levels_reference():
+    for levels in (16, 32, 64):
+        for seed, (color_levels, rgb_dict, brightness) in enumerate(SETUPS):
+            heightmap = quantized_heightmap(levels, seed)
+            expected = levels_reference(heightmap, brightness, color_levels and list(color_levels), rgb_dict)
+            rgb_map = convert_heightmap_into_RGB(heightmap, brightness, color_levels and list(color_levels),
+                                                 rgb_dict)
+            assert np.array_equal(rgb_map, expected)
+            # steps of the lookup table equal to the number of levels are enough
+            rgb_map = convert_heightmap_into_RGB(heightmap, brightness, color_levels and list(color_levels),
+                                                 rgb_dict, steps=levels)
+            assert np.array_equal(rgb_map, expected)
+
+
+def test_float32_and_shifted_heightmaps():
+    # values of any range are normalized first - the same colors for float32 and shifted and scaled heightmap
+    heightmap = quantized_heightmap(32, 7)
+    expected = levels_reference(heightmap)
+    assert np.array_equal(convert_heightmap_into_RGB(heightmap.astype(np.float32)), expected)
+    assert np.array_equal(convert_heightmap_into_RGB(heightmap * 32 - 5), expected)
+
+
+def test_tiles_are_colorized_as_whole_map():
+    heightmap = quantized_heightmap(32, 3)
+    whole = convert_heightmap_into_RGB(heightmap)
+    out = np.empty((30, 50, 3), dtype=np.uint8)
+    tile = convert_heightmap_into_RGB(heightmap[20:50, 40:90], value_range=(0.0, 1.0), out=out)
+    assert tile is out
+    assert np.array_equal(tile, whole[20:50, 40:90])
+
+
+def test_flat_heightmap_is_black():
+    assert not convert_heightmap_into_RGB(np.full(SHAPE, 0.5)).any()
+
+
+if __name__ == '__main__':
+    for test in (test_colors_match_levels_reference, test_float32_and_shifted_heightmaps,
+                 test_tiles_are_colorized_as_whole_map, test_flat_heightmap_is_black):
+        test()
+        print(test.__name__, 'OK')
@@ -0,0 +1,74 @@
+"""
+Export (gret_export, gret_generate --store) - map generated tile by tile in disk-backed store is exported
+the same as map generated in memory.
+
+Run with: python -m pytest testing_area/test_export.py (or just python testing_area/test_export.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import json
+import tempfile
+
+import numpy as np
+
+from gret_core import MapSpec, noise_params
+from gret_generate import main
+from gret_noise import generate_simplex_array
+from PIL import Image
+
+SPEC = ('{"map_size": [150, 230], "layers": [{"scale": 60, "octaves": 4}, {"scale": 15, "factor": 0.3, "base": 4}],'
+        ' "gradient": {"min_value_radius": 0.2, "max_value_radius": 0.9}}')
+
+
+def write_spec(directory, **params):
+    spec_file = path.join(directory, 'spec.json')
+    with open(spec_file, 'w') as file:
+        file.write(json.dumps(dict(json.loads(SPEC), **params)))
+    return spec_file
+
+
+def test_store_exports_the_same_map():
+    with tempfile.TemporaryDirectory() as directory:
+        spec_file = write_spec(directory)
+        formats = ['-f', 'npy,png,png16', '-w', '1']
+        assert main([spec_file, '-o', path.join(directory, 'memory')] + formats) == 0
+        assert main([spec_file, '-o', path.join(directory, 'store'), '--store', path.join(directory, 's'),
+                     '--memory-budget', '1'] + formats) == 0
+        for name in ('map_0.npy', 'map_0.png', 'map_0_height.png'):
+            load = np.load if name.endswith('.npy') else lambda filename: np.asarray(Image.open(filename))
+            memory, store = load(path.join(directory, 'memory', name)), load(path.join(directory, 'store', name))
+            assert memory.dtype == store.dtype and np.array_equal(memory, store), name
+        # heightmap is quantized into levels
+        heightmap = np.load(path.join(directory, 'store', 'map_0.npy'))
+        assert np.array_equal(heightmap * 32, np.rint(heightmap * 32)) and len(np.unique(heightmap)) > 10
+
+
+
+def test_store_uses_noise_kernel():
+    # layers (and climate of biomes) of tiles are generated by the kernel of the spec, as in memory
+    for kernel in ('snoise2', 'numba'):
+        with tempfile.TemporaryDirectory() as directory:
+            spec_file = write_spec(directory, kernel=kernel, biomes={})
+            formats = ['-f', 'npy,biomes', '-w', '1']
+            assert main([spec_file, '-o', path.join(directory, 'memory')] + formats) == 0
+            assert main([spec_file, '-o', path.join(directory, 'store'), '--store', path.join(directory, 's'),
+                         '--memory-budget', '1'] + formats) == 0
+            for name in ('map_0.npy', 'map_0_biomes.png'):
+                load = np.load if name.endswith('.npy') else lambda filename: np.asarray(Image.open(filename))
+                memory, store = load(path.join(directory, 'memory', name)), load(path.join(directory, 'store', name))
+                assert np.array_equal(memory, store), (kernel, name)
+            layer = np.load(path.join(directory, 's', 'layer_0.npy'))
+            if kernel == 'snoise2':
+                # snoise2 rounds differently than vectorized noise
+                params = noise_params(MapSpec.from_dict(json.loads(SPEC)).layers[0])
+                assert not np.array_equal(layer, generate_simplex_array(layer.shape, dtype=layer.dtype, **params))
+
+
+if __name__ == '__main__':
+    for test in (test_store_exports_the_same_map, test_store_uses_noise_kernel):
+        test()
+        print(test.__name__, 'OK')
@@ -0,0 +1,71 @@
+"""
+Float32 pipeline gives the same maps as float64 one.
+
+Noise is computed in float32 anyway, so float32 layers are exact. Later stages (normalization of layers,
+weighted sum, gradient) round to float32, so a pixel lying exactly on the border of two levels
+may fall into the neighbouring level - that happens for a few pixels per million at most.
+
+Run with: python -m pytest testing_area/test_float32_pipeline.py (or just python testing_area/test_float32_pipeline.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import numpy as np
+
+from gret_composite import MapComposer
+from gret_core import MapSpec, generate_map
+from gret_noise import generate_simplex_array
+
+MAP_SIZE = (400, 500)
+GRADIENTS = (None,
+             dict(min_value_radius=0.1, max_value_radius=0.8, pattern='circle'),
+             dict(min_value_radius=0.9, max_value_radius=0.3, pattern='square'))
+# fraction of pixels allowed to fall into the neighbouring level
+MAX_CHANGED_FRACTION = 1e-4
+
+
+def map_spec(seed, gradient, dtype):
+    return MapSpec(map_size=MAP_SIZE, layers=[dict(scale=200, octaves=5, base=seed),
+                                              dict(scale=60, factor=0.4, base=seed + 7)],
+                   gradient=gradient, dtype=dtype)
+
+
+def test_float32_noise_is_exact():
+    noise64 = generate_simplex_array(MAP_SIZE, scale=100.0, octaves=6, dtype=np.float64)
+    noise32 = generate_simplex_array(MAP_SIZE, scale=100.0, octaves=6, dtype=np.float32)
+    assert noise32.dtype == np.float32
+    assert np.array_equal(noise64, noise32)
+
+
+def test_float32_map_is_unchanged():
+    for seed in range(4):
+        for gradient in GRADIENTS:
+            heightmap64, rgb64 = generate_map(map_spec(seed, gradient, 'float64'))
+            heightmap32, rgb32 = generate_map(map_spec(seed, gradient, 'float32'))
+            assert heightmap32.dtype == np.float32
+            changed = heightmap64 != heightmap32
+            assert changed.sum() <= MAX_CHANGED_FRACTION * changed.size
+            # only neighbouring levels, and colors change only there
+            assert np.abs(heightmap64 - heightmap32).max() <= 1 / 32
+            assert not (rgb64 != rgb32).any(axis=2)[~changed].any()
+
+
+def test_float32_composer_halves_memory():
+    layer = np.random.default_rng(0).random(MAP_SIZE)
+    sizes = {}
+    for dtype in (np.float64, np.float32):
+        composer = MapComposer(dtype=dtype)
+        composer.set_layer(0, layer.astype(dtype), 1.0)
+        composer.get_quantized_map(MAP_SIZE)
+        sizes[dtype] = sum(buffer.nbytes for buffer in (composer.weighted_sum, composer.masked_map,
+                                                        composer.quantized_map))
+    assert sizes[np.float32] * 2 == sizes[np.float64]
+
+
+if __name__ == '__main__':
+    for test in (test_float32_noise_is_exact, test_float32_map_is_unchanged, test_float32_composer_halves_memory):
+        test()
+        print(test.__name__, 'OK')
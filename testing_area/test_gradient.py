@@ -0,0 +1,91 @@
+"""
+Gradient (gret_gradient) - closed form gives the same gradient as the original loop of GradientKit, tiles of the
+gradient fit together.
+
+Run with: python -m pytest testing_area/test_gradient.py (or just python testing_area/test_gradient.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import numpy as np
+
+from gret_gradient import gradient_base, gradient_tile
+
+SIZES = ((64, 96), (50, 50), (90, 40))
+# (min_value_radius, max_value_radius) - the usual one, reversed, equal and the widest
+RADII = ((0.2, 0.8), (0.9, 0.3), (0.5, 0.5), (0.0, 1.0))
+
+
+def loop_base(map_size):
+    # the original GradientKit.generate_gradient - quarter of the map by loop, mirrored into other quarters
+    array = np.full(map_size, np.nan)
+    for i in range(map_size[0] // 2):
+        a = map_size[0] // 2 - i
+        for j in range(map_size[1] // 2):
+            b = map_size[1] // 2 - j
+            x = - np.sqrt(a * a + b * b)
+            array[i][j] = x
+            array[i][map_size[1] - j - 1] = x
+            array[map_size[0] - i - 1][j] = x
+            array[map_size[0] - i - 1][map_size[1] - j - 1] = x
+    return array
+
+
+def loop_gradient(map_size, min_value_radius, max_value_radius):
+    # the original clipping and normalization of GradientKit.generate_gradient
+    circle_basic_array = loop_base(map_size)
+    if max_value_radius < min_value_radius:
+        array = 1 - circle_basic_array
+    else:
+        array = circle_basic_array.copy()
+    x_of_border = int(map_size[0] * (1 - max_value_radius) / 2)
+    y_of_border = int(map_size[1] * (1 - max_value_radius) / 2)
+    array[array < array[x_of_border, y_of_border]] = array[x_of_border, y_of_border]
+    if max_value_radius == min_value_radius:
+        x_of_border += 1
+        y_of_border += 1
+    else:
+        x_of_border = int(map_size[0] * (1 - min_value_radius) / 2)
+        y_of_border = int(map_size[1] * (1 - min_value_radius) / 2)
+    array[array > array[x_of_border, y_of_border]] = array[x_of_border, y_of_border]
+    if np.ptp(array):
+        array = (array - np.amin(array)) / np.ptp(array)
+    return array
+
+
+def test_base_matches_loop():
+    # odd sizes too - the loop does not fill the middle row (column) of odd sizes, the rest is compared
+    for map_size in SIZES + ((33, 48), (41, 27)):
+        expected = loop_base(map_size)
+        filled = ~np.isnan(expected)
+        # hypot may differ from sqrt of the sum of squares by the last bit
+        assert np.allclose(gradient_base(map_size)[filled], expected[filled], rtol=1e-15, atol=0)
+        assert np.allclose(gradient_base(map_size, dtype=np.float32)[filled], expected[filled], rtol=1e-6)
+
+
+def test_gradient_matches_loop():
+    for map_size in SIZES:
+        for min_value_radius, max_value_radius in RADII:
+            expected = loop_gradient(map_size, min_value_radius, max_value_radius)
+            gradient = gradient_tile(map_size, min_value_radius, max_value_radius)
+            assert np.allclose(gradient, expected, rtol=0, atol=1e-12)
+            gradient = gradient_tile(map_size, min_value_radius, max_value_radius, dtype=np.float32)
+            assert gradient.dtype == np.float32
+            assert np.allclose(gradient, expected, rtol=0, atol=1e-6)
+
+
+def test_tiles_fit_together():
+    map_size = (64, 96)
+    for pattern in ('circle', 'square'):
+        whole = gradient_tile(map_size, 0.2, 0.8, pattern=pattern)
+        tile = gradient_tile(map_size, 0.2, 0.8, offset=(10, 50), shape=(30, 40), pattern=pattern)
+        assert np.array_equal(tile, whole[10:40, 50:90])
+
+
+if __name__ == '__main__':
+    for test in (test_base_matches_loop, test_gradient_matches_loop, test_tiles_fit_together):
+        test()
+        print(test.__name__, 'OK')
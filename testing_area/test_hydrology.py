@@ -0,0 +1,120 @@
+"""
+Hydrology (gret_hydrology) - filled depressions are the same as of priority flood, water flows out of every cell,
+erosion does not depend on the number of threads, rivers and lakes are painted over the map.
+
+Run with: python -m pytest testing_area/test_hydrology.py (or just python testing_area/test_hydrology.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import heapq
+
+import numpy as np
+
+import gret_hydrology
+
+from gret_core import MapSpec, generate_map
+from gret_hydrology import LAKE_COLOR, NEIGHBOURS, RIVER_COLOR, border_outlets, erode, fill_depressions, \
+    flow_accumulation, flow_receivers
+from gret_noise import generate_simplex_array
+from multiprocessing.pool import ThreadPool
+
+SHAPE = (120, 170)
+SEA_LEVEL = 0.3
+
+
+def make_heightmap(dtype=np.float64):
+    heightmap = generate_simplex_array(SHAPE, scale=35.0, octaves=5, persistence=0.5, base=2.0, dtype=dtype)
+    return (heightmap - heightmap.min()) / (heightmap.max() - heightmap.min())
+
+
+def priority_flood(heightmap, outlets):
+    # reference - cells are flooded from outlets in order of height of water, one by one
+    surface = np.where(outlets, heightmap, np.inf)
+    queue = [(heightmap[row, column], row, column) for row, column in zip(*np.nonzero(outlets))]
+    heapq.heapify(queue)
+    done = outlets.copy()
+    while queue:
+        level, row, column = heapq.heappop(queue)
+        for dy, dx in NEIGHBOURS:
+            y, x = row + dy, column + dx
+            if 0 <= y < SHAPE[0] and 0 <= x < SHAPE[1] and not done[y, x]:
+                done[y, x] = True
+                surface[y, x] = max(heightmap[y, x], level)
+                heapq.heappush(queue, (surface[y, x], y, x))
+    return surface
+
+
+def test_filled_depressions_match_priority_flood():
+    heightmap = make_heightmap()
+    outlets = border_outlets(heightmap, SEA_LEVEL)
+    surface = fill_depressions(heightmap, outlets, epsilon=0.0)
+    assert np.array_equal(surface, priority_flood(heightmap, outlets))
+    assert (surface > heightmap).any()
+
+
+def test_water_flows_out_of_every_cell():
+    heightmap = make_heightmap()
+    outlets = border_outlets(heightmap, SEA_LEVEL)
+    surface = fill_depressions(heightmap, outlets)
+    receivers = flow_receivers(surface, outlets).ravel()
+    draining = receivers != np.arange(receivers.size)
+    assert np.array_equal(draining, ~outlets.ravel())
+    assert (surface.ravel()[receivers[draining]] < surface.ravel()[draining]).all()
+    # all water ends in outlets
+    accumulation = flow_accumulation(receivers.reshape(SHAPE))
+    assert accumulation[outlets].sum() == heightmap.size
+
+
+def test_filled_depressions_keep_type_of_heightmap():
+    heightmap = make_heightmap(np.float32)
+    outlets = border_outlets(heightmap, SEA_LEVEL)
+    surface = fill_depressions(heightmap, outlets)
+    assert surface.dtype == np.float32 and (surface > heightmap).any()
+    with ThreadPool(3) as pool:
+        assert np.array_equal(fill_depressions(heightmap, outlets, pool=pool, workers=3), surface)
+    receivers = flow_receivers(surface, outlets).ravel()
+    assert np.array_equal(receivers != np.arange(receivers.size), ~outlets.ravel())
+    # slope would be lost in precision of float32 heights far above 1
+    assert fill_depressions(heightmap + 1000, outlets).dtype == np.float64
+
+
+def test_erosion_does_not_depend_on_threads():
+    heightmap = make_heightmap(np.float32)
+    batch = gret_hydrology.DROPLET_BATCH
+    try:
+        # small parts of rounds - changes of parts are applied by threads (or one by one where parts overlap)
+        for gret_hydrology.DROPLET_BATCH in (batch, 8):
+            single = erode(heightmap.copy(), droplets=0.5, seed=3)
+            with ThreadPool(3) as pool:
+                threaded = erode(heightmap.copy(), droplets=0.5, seed=3, pool=pool)
+            assert np.array_equal(single, threaded)
+            assert not np.array_equal(single, heightmap)
+    finally:
+        gret_hydrology.DROPLET_BATCH = batch
+
+
+def test_map_with_rivers_and_lakes():
+    spec = MapSpec(map_size=[300, 300], layers=[dict(scale=150.0, octaves=6, base=3.0)],
+                   gradient=dict(min_value_radius=0.2, max_value_radius=0.9), hydrology=dict(droplets=0.2))
+    heightmap, rgb_map = generate_map(spec)
+    assert heightmap.shape == (300, 300) and heightmap.min() >= 0 and heightmap.max() <= 1
+    # heightmap is quantized into levels of the spec
+    assert np.array_equal(heightmap * spec.levels, np.trunc(heightmap * spec.levels))
+    rivers = (rgb_map == RIVER_COLOR).all(axis=-1)
+    lakes = (rgb_map == LAKE_COLOR).all(axis=-1)
+    assert rivers.any() and lakes.any()
+    # rivers end in the sea - they are never under sea level (up to one level of quantization)
+    assert (heightmap[rivers] > spec.color_levels[0] - 1.0 / spec.levels).all()
+    assert MapSpec.from_dict(spec.to_dict()).hydrology == spec.hydrology
+
+
+if __name__ == '__main__':
+    for test in (test_filled_depressions_match_priority_flood, test_water_flows_out_of_every_cell,
+                 test_filled_depressions_keep_type_of_heightmap, test_erosion_does_not_depend_on_threads,
+                 test_map_with_rivers_and_lakes):
+        test()
+        print(test.__name__, 'OK')
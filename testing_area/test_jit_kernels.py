@@ -0,0 +1,65 @@
+"""
+Compiled noise kernels (gret_jit) give the same noise as noise package and as vectorized generation.
+
+Without Numba, gret_jit falls back to snoise2 / pnoise2 - the same tests check the fallback then.
+
+Run with: python -m pytest testing_area/test_jit_kernels.py (or just python testing_area/test_jit_kernels.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import numpy as np
+
+from gret_jit import generate_jit_array, noise_backend
+from gret_noise import NOISE_TOLERANCE, generate_simplex_array
+from noise import pnoise2, snoise2
+
+SHAPE = (150, 220)
+OFFSET = (-40, 1000)
+PARAMS = (dict(scale=400.0, octaves=6, persistence=0.5, base=0.0),
+          dict(scale=23.0, octaves=3, persistence=0.7, base=5.0),
+          dict(scale=7.0, octaves=1, persistence=0.5, base=2.0))
+# every n-th element is compared with noise package (pixel by pixel is slow)
+STEP = 7
+
+
+def reference(noise_function, params):
+    rows = range(OFFSET[0], OFFSET[0] + SHAPE[0], STEP)
+    columns = range(OFFSET[1], OFFSET[1] + SHAPE[1], STEP)
+    # pnoise2 takes integer seed
+    base = params['base'] if noise_function is snoise2 else int(params['base'])
+    return np.array([[noise_function(x / params['scale'], y / params['scale'], octaves=params['octaves'],
+                                     persistence=params['persistence'], base=base)
+                      for y in columns] for x in rows])
+
+
+def test_simplex_matches_snoise2_and_numpy():
+    for params in PARAMS:
+        noise = generate_jit_array(SHAPE, offset=OFFSET, **params)
+        assert np.abs(noise[::STEP, ::STEP] - reference(snoise2, params)).max() <= NOISE_TOLERANCE
+        vectorized = generate_simplex_array(SHAPE, offset=OFFSET, dtype=np.float32, **params)
+        assert np.abs(noise - vectorized).max() <= NOISE_TOLERANCE
+
+
+def test_perlin_matches_pnoise2():
+    for params in PARAMS:
+        noise = generate_jit_array(SHAPE, offset=OFFSET, noise_type='perlin', **params)
+        assert np.abs(noise[::STEP, ::STEP] - reference(pnoise2, params)).max() <= NOISE_TOLERANCE
+
+
+def test_threads_fill_the_same_array():
+    # bands filled by threads - the same result as by one thread, written in place
+    out = np.zeros(SHAPE, dtype=np.float64)
+    single = generate_jit_array(SHAPE, scale=50.0, workers=1)
+    assert generate_jit_array(SHAPE, scale=50.0, out=out, workers=4) is out
+    assert np.array_equal(out, single)
+
+
+if __name__ == '__main__':
+    print('backend:', noise_backend())
+    for test in (test_simplex_matches_snoise2_and_numpy, test_perlin_matches_pnoise2, test_threads_fill_the_same_array):
+        test()
+        print(test.__name__, 'OK')
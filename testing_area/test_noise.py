@@ -0,0 +1,44 @@
+"""
+Vectorized simplex noise (gret_noise) follows snoise2 row by row (generate_simplex_row) within NOISE_TOLERANCE.
+
+Run with: python -m pytest testing_area/test_noise.py (or just python testing_area/test_noise.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import numpy as np
+
+from gret_noise import NOISE_TOLERANCE, generate_simplex_array, generate_simplex_row
+
+SHAPE = (60, 90)
+PARAMS = (dict(scale=100.0, octaves=6, persistence=0.5, base=0.0),
+          dict(scale=400.0, octaves=8, persistence=0.5, base=3.0),
+          dict(scale=23.0, octaves=3, persistence=0.7, base=5.5),
+          dict(scale=7.0, octaves=1, persistence=0.5, base=2.0),
+          dict(scale=55.5, octaves=4, persistence=0.3, base=17.0))
+# windows of the noise plane - (row, column) of the first element
+OFFSETS = ((0, 0), (-40, 1000), (2500, -700))
+
+
+def rows_reference(shape, offset, params):
+    return np.array([generate_simplex_row(row, shape[1], column=offset[1], **params)
+                     for row in range(offset[0], offset[0] + shape[0])])
+
+
+def test_vectorized_noise_matches_rows():
+    for params in PARAMS:
+        for offset in OFFSETS:
+            reference = rows_reference(SHAPE, offset, params)
+            for dtype in (np.float32, np.float64):
+                noise = generate_simplex_array(SHAPE, offset=offset, dtype=dtype, **params)
+                assert noise.dtype == dtype
+                assert np.abs(noise - reference).max() <= NOISE_TOLERANCE
+
+
+if __name__ == '__main__':
+    for test in (test_vectorized_noise_matches_rows,):
+        test()
+        print(test.__name__, 'OK')
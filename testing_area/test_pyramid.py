@@ -0,0 +1,89 @@
+"""
+Pyramid of tiles (gret_pyramid) - every level is 2x2 mean of the level below, levels above 0 never read the source,
+exported web-map tiles are tiles of the pyramid.
+
+Run with: python -m pytest testing_area/test_pyramid.py (or just python testing_area/test_pyramid.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import tempfile
+
+import numpy as np
+
+from gret_export import export_xyz_tiles
+from gret_pyramid import TilePyramid, array_source
+from PIL import Image
+
+# odd sizes - tiles and levels at the borders are not full
+SHAPE = (333, 517)
+TILE = 64
+
+
+def make_map():
+    return np.random.default_rng(5).integers(0, 256, SHAPE + (3,), dtype=np.uint8)
+
+
+def level_image(pyramid, level):
+    grid = pyramid.tile_grid(level)
+    return np.concatenate([np.concatenate([pyramid.tile(level, row, column) for column in range(grid[1])], axis=1)
+                           for row in range(grid[0])], axis=0)
+
+
+def test_levels_are_means_of_level_below():
+    rgb_map = make_map()
+    pyramid = TilePyramid(SHAPE, array_source(rgb_map), tile_size=TILE)
+    expected = rgb_map.astype(float)
+    for level in range(pyramid.levels):
+        image = level_image(pyramid, level)
+        assert image.shape[:2] == pyramid.level_shape(level)
+        assert np.array_equal(image, np.floor(expected + 0.5).astype(np.uint8))
+        # reference - pixels of the level below (rounded) averaged over 2x2 boxes, odd edges averaged alone
+        below = np.floor(expected + 0.5)
+        below = np.pad(below, ((0, below.shape[0] % 2), (0, below.shape[1] % 2), (0, 0)), mode='edge')
+        expected = below.reshape(below.shape[0] // 2, 2, below.shape[1] // 2, 2, 3).mean(axis=(1, 3))
+    assert max(pyramid.level_shape(pyramid.levels - 1)) <= TILE
+
+
+def test_levels_read_only_level_below():
+    rgb_map = make_map()
+    regions = []
+
+    def render(rows, columns):
+        regions.append((rows, columns))
+        return rgb_map[rows, columns]
+    pyramid = TilePyramid(SHAPE, render, tile_size=TILE, max_tiles=1000)
+    pyramid.tile(pyramid.levels - 1, 0, 0)
+    # every tile of the source is read once, at full resolution
+    grid = pyramid.tile_grid(0)
+    assert len(regions) == grid[0] * grid[1]
+    assert all(rows.step == 1 and columns.step == 1 for rows, columns in regions)
+    for level in range(1, pyramid.levels):
+        level_image(pyramid, level)
+    assert len(regions) == grid[0] * grid[1]
+
+
+def test_exported_tiles_are_tiles_of_pyramid():
+    rgb_map = make_map()
+    pyramid = TilePyramid(SHAPE, array_source(rgb_map), tile_size=TILE)
+    with tempfile.TemporaryDirectory() as directory:
+        max_zoom = export_xyz_tiles(rgb_map, directory, tile_size=TILE, workers=2)
+        for level in range(pyramid.levels):
+            grid = pyramid.tile_grid(level)
+            for row in range(grid[0]):
+                for column in range(grid[1]):
+                    tile = pyramid.tile(level, row, column)
+                    filename = path.join(directory, str(max_zoom - level), str(column), '%d.png' % row)
+                    with Image.open(filename) as image:
+                        pixels = np.asarray(image)[:tile.shape[0], :tile.shape[1], :3]
+                    assert np.array_equal(pixels, tile)
+
+
+if __name__ == '__main__':
+    for test in (test_levels_are_means_of_level_below, test_levels_read_only_level_below,
+                 test_exported_tiles_are_tiles_of_pyramid):
+        test()
+        print(test.__name__, 'OK')
@@ -0,0 +1,83 @@
+"""
+Startup - generation without GUI does not import Tk, PIL.ImageTk or Numba (kernels are compiled on first use),
+the sandbox imports its window only when run, and workers of pools import only the noise kernels they run.
+Import times are printed (python testing_area/test_startup.py) and checked against generous bounds.
+
+Run with: python -m pytest testing_area/test_startup.py (or just python testing_area/test_startup.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import json
+import subprocess
+
+from gret_noise import generate_mapped_noise_array, generate_simplex_array, release_mapped_file
+from multiprocessing import get_context
+from time import perf_counter
+
+REPOSITORY = path.dirname(path.dirname(path.abspath(__file__)))
+# modules of GUI and of compiled kernels
+HEAVY_MODULES = ('tkinter', '_tkinter', 'PIL.ImageTk', 'numba', 'llvmlite')
+# bounds of import times (seconds) - far above usual times, they catch heavy imports coming back
+STARTUP_LIMIT = 2.0
+WORKER_LIMIT = 5.0
+
+
+def import_in_new_process(module):
+    # time of import and imported modules, measured in fresh interpreter
+    script = ("import sys, json, time\nstart = time.perf_counter()\nimport {0}\n"
+              "print(json.dumps([time.perf_counter() - start, sorted(sys.modules)]))").format(module)
+    output = subprocess.run([sys.executable, '-c', script], cwd=REPOSITORY, capture_output=True, text=True,
+                            check=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def worker_modules(_):
+    # modules imported by worker process
+    return sorted(sys.modules)
+
+
+def test_headless_startup():
+    for module in ('gret_generate', 'gret_server', 'gret_sweep'):
+        seconds, modules = import_in_new_process(module)
+        print(module, "imported in %.0f ms" % (seconds * 1000))
+        assert not set(HEAVY_MODULES) & set(modules), module
+        assert seconds < STARTUP_LIMIT
+
+
+def test_sandbox_startup():
+    # the window and everything it needs are imported only when the sandbox is run
+    seconds, modules = import_in_new_process('gret_sandbox')
+    assert not {'numpy', 'tkinter', 'gret_app'} & set(modules)
+    seconds, modules = import_in_new_process('gret_app')
+    print("gret_app imported in %.0f ms" % (seconds * 1000))
+    assert 'tkinter' in modules and not {'numba', 'llvmlite'} & set(modules)
+    assert seconds < STARTUP_LIMIT
+
+
+def test_worker_imports():
+    # spawned workers (Windows, macOS) start empty - they import modules of their jobs only
+    start = perf_counter()
+    with get_context('spawn').Pool(2) as pool:
+        filename, array = generate_mapped_noise_array(pool, (64, 80), dtype='float32', scale=30.0, octaves=3)
+        seconds = perf_counter() - start
+        modules = pool.map(worker_modules, range(2))
+    try:
+        assert (array == generate_simplex_array((64, 80), scale=30.0, octaves=3, dtype='float32')).all()
+    finally:
+        del array
+        release_mapped_file(filename)
+    print("spawned workers ready in %.0f ms" % (seconds * 1000))
+    for worker in modules:
+        assert 'gret_noise' in worker
+        assert not (set(HEAVY_MODULES) | {'PIL', 'gret_core', 'gret_jit'}) & set(worker)
+    assert seconds < WORKER_LIMIT
+
+
+if __name__ == '__main__':
+    for test in (test_headless_startup, test_sandbox_startup, test_worker_imports):
+        test()
+        print(test.__name__, 'OK')
@@ -0,0 +1,67 @@
+"""
+Seed sweep (gret_sweep) - maps for every combination of values of the grid, generated by a pool of processes,
+with statistics and thumbnails in the results table.
+
+Run with: python -m pytest testing_area/test_sweep.py (or just python testing_area/test_sweep.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import csv
+import tempfile
+
+import numpy as np
+
+from gret_core import MapSpec, generate_map
+from gret_sweep import TABLE_NAME, generate_sweep, map_stats, sweep_points
+from multiprocessing import Pool
+from PIL import Image
+
+SPEC = MapSpec(map_size=[120, 160], layers=[dict(scale=60.0, octaves=4), dict(scale=20.0, factor=0.3, base=9.0)])
+GRID = {'scale': [40.0, 80.0], 'layers.1.factor': [0.1, 0.5], 'max_value_radius': [0.8], 'seed': [0, 3]}
+
+
+def test_grid_points():
+    points = sweep_points(SPEC, GRID)
+    assert len(points) == 8 and [point[0] for point in points] == list(range(8))
+    index, values, spec = points[5]
+    # the last key changes the fastest
+    assert values == {'scale': 80.0, 'layers.1.factor': 0.1, 'max_value_radius': 0.8, 'seed': 3}
+    assert [layer['scale'] for layer in spec.layers] == [80.0, 80.0]
+    assert spec.layers[1]['factor'] == 0.1 and spec.layers[1]['base'] == 12.0
+    # map without gradient gets the default one
+    assert spec.gradient == dict(min_value_radius=0.0, max_value_radius=0.8, pattern='circle')
+    for grid in ({'layers.5.scale': [1.0]}, {'octaves': 6}, {'nothing': [1]}):
+        try:
+            sweep_points(SPEC, grid)
+        except ValueError:
+            continue
+        assert False, grid
+
+
+def test_sweep_table():
+    with tempfile.TemporaryDirectory() as directory, Pool(2) as pool:
+        table = generate_sweep(SPEC, GRID, directory, pool, thumbnail_size=64, formats=('npy',), chunk_size=3)
+        with open(table) as file:
+            rows = list(csv.DictReader(file))
+        assert path.basename(table) == TABLE_NAME
+        # rows in order of the grid
+        assert [int(row['index']) for row in rows] == list(range(8))
+        _, _, spec = sweep_points(SPEC, GRID)[6]
+        heightmap, _ = generate_map(spec)
+        stats = map_stats(heightmap, spec.levels, spec.color_levels[0])
+        assert float(rows[6]['land_ratio']) == round(stats['land_ratio'], 6)
+        assert [int(count) for count in rows[6]['histogram'].split()] == stats['histogram']
+        assert sum(stats['histogram']) == heightmap.size
+        thumbnail, saved = rows[6]['files'].split()
+        assert Image.open(path.join(directory, thumbnail)).size == (64, 48)
+        assert np.array_equal(np.load(path.join(directory, saved)), heightmap)
+
+
+if __name__ == '__main__':
+    for test in (test_grid_points, test_sweep_table):
+        test()
+        print(test.__name__, 'OK')
@@ -0,0 +1,106 @@
+"""
+Tracing (gret_trace) - timing spans and memory counters of stages of the pipeline, exported as Chrome trace.
+
+Run with: python -m pytest testing_area/test_trace.py (or just python testing_area/test_trace.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import json
+import tempfile
+
+from gret_core import MapSpec, generate_map
+from gret_generate import main
+from gret_trace import TRACER, Tracer, format_summary
+from threading import Thread
+from time import perf_counter, sleep
+
+
+def test_spans():
+    tracer = Tracer()
+    with tracer.span('outer', shape=(2, 3)) as outer:
+        with tracer.span('inner'):
+            sleep(0.01)
+        outer.args['tiles'] = 4
+    thread = Thread(target=lambda: tracer.span('inner').__enter__().__exit__(None, None, None), name='worker')
+    thread.start()
+    thread.join()
+    try:
+        with tracer.span('cancelled'):
+            raise KeyError
+    except KeyError:
+        pass
+    summary = {name: (count, total, maximum) for name, count, total, maximum, _, _ in tracer.summary()}
+    assert summary['inner'][0] == 2 and summary['outer'][0] == 1
+    # outer span contains the inner one
+    assert summary['outer'][1] >= summary['inner'][2] >= 0.01
+    assert tracer.summary()[0][0] in ('outer', 'inner')
+    events = {event[0]: event for event in tracer.events}
+    assert events['outer'][5] == dict(shape=(2, 3), tiles=4)
+    assert events['cancelled'][5] == dict(cancelled=True)
+    assert 'worker' in tracer.thread_names.values()
+    assert 'inner: ' in format_summary(tracer.summary())
+    tracer.clear()
+    assert not tracer.summary() and not tracer.events
+
+
+def test_chrome_trace():
+    tracer = Tracer(max_events=3)
+    for index in range(5):
+        with tracer.span('stage', 'export', index=index):
+            pass
+    with tempfile.TemporaryDirectory() as directory:
+        with open(tracer.export_chrome_trace(path.join(directory, 'trace.json'))) as file:
+            trace = json.load(file)
+    events = trace['traceEvents']
+    # only the last spans are kept, totals count all of them
+    spans = [event for event in events if event['ph'] == 'X']
+    assert [event['args']['index'] for event in spans] == [2, 3, 4]
+    assert tracer.summary()[0][1] == 5
+    assert all(event['cat'] == 'export' and event['dur'] >= 0 for event in spans)
+    assert spans[0]['ts'] <= spans[1]['ts'] <= spans[2]['ts']
+    assert any(event['ph'] == 'M' and event['name'] == 'thread_name' for event in events)
+    if sys.platform.startswith('linux'):
+        assert all(event['args']['rss_mb'] > 0 for event in events if event['ph'] == 'C')
+        assert len([event for event in events if event['ph'] == 'C']) == 3
+
+
+def test_overhead():
+    tracer = Tracer()
+    disabled = Tracer(enabled=False)
+    with disabled.span('nothing') as nothing:
+        nothing.args['tiles'] = 1
+    assert not disabled.summary() and not disabled.events
+    count = 2000
+    start = perf_counter()
+    for _ in range(count):
+        with tracer.span('stage', shape=(1, 1)):
+            pass
+    # spans are stages (milliseconds at least), a few microseconds each are negligible
+    assert (perf_counter() - start) / count < 100e-6
+
+
+def test_pipeline_spans():
+    TRACER.clear()
+    generate_map(MapSpec(map_size=[64, 96], layers=[dict(scale=30.0, octaves=3)], gradient={},
+                         hydrology=dict(droplets=0.1)))
+    names = {name for name, *_ in TRACER.summary()}
+    assert {'noise', 'normalize', 'gradient', 'compose', 'quantize', 'erosion', 'colorize'} <= names
+    with tempfile.TemporaryDirectory() as directory:
+        spec_file = path.join(directory, 'spec.json')
+        with open(spec_file, 'w') as file:
+            file.write('{"map_size": [64, 64]}')
+        trace_file = path.join(directory, 'trace.json')
+        assert main([spec_file, '-o', directory, '-w', '1', '--trace', trace_file]) == 0
+        with open(trace_file) as file:
+            names = {event['name'] for event in json.load(file)['traceEvents']}
+        assert {'noise', 'export png', 'export npy', 'memory'} <= names
+
+
+if __name__ == '__main__':
+    for test in (test_spans, test_chrome_trace, test_overhead, test_pipeline_spans):
+        test()
+        print(test.__name__, 'OK')
@@ -0,0 +1,49 @@
+"""
+Windows of the world (MapSpec.with_window) fit together without seams, tileable noise repeats.
+
+Run with: python -m pytest testing_area/test_world_windows.py (or just python testing_area/test_world_windows.py)
+"""
+import sys
+
+from os import path
+
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import numpy as np
+
+from gret_core import MapSpec, generate_map
+from gret_noise import generate_simplex_array, generate_simplex_row
+
+WORLD = MapSpec(map_size=(256, 384), layers=[dict(scale=150), dict(scale=40, base=3, factor=0.4)])
+NOISE = dict(scale=60.0, octaves=4, persistence=0.5, base=1.0)
+
+
+def test_chunks_fit_together():
+    heightmap, rgb_map = generate_map(WORLD.with_window(-128, 64, 384, 256))
+    chunks = [[generate_map(WORLD.with_window(x, y, 192, 128)) for x in (-128, 64)] for y in (64, 192)]
+    assert np.array_equal(np.block([[chunk[0] for chunk in row] for row in chunks]), heightmap)
+    assert np.array_equal(np.concatenate([np.concatenate([chunk[1] for chunk in row], axis=1)
+                                          for row in chunks]), rgb_map)
+
+
+def test_tileable_noise_repeats():
+    period = (200, 300)
+    noise = generate_simplex_array((200, 301), period=period, dtype=np.float32, **NOISE)
+    # column after the last one is the first one again
+    assert np.abs(noise[:, -1] - noise[:, 0]).max() < 1e-5
+    # angles of the torus are float32 (as in snoise2) - precision drops a little with distance from the origin
+    shifted = generate_simplex_array((200, 300), offset=(-200, 600), period=period, dtype=np.float32, **NOISE)
+    assert np.abs(shifted - noise[:, :300]).max() < 1e-3
+
+
+def test_tileable_noise_is_the_same_as_snoise2():
+    period = (120, 90)
+    noise = generate_simplex_array((4, 90), offset=(30, -45), period=period, dtype=np.float32, **NOISE)
+    rows = [generate_simplex_row(30 + x, 90, column=-45, period=period, **NOISE) for x in range(4)]
+    assert np.array_equal(noise, np.array(rows, dtype=np.float32))
+
+
+if __name__ == '__main__':
+    for test in (test_chunks_fit_together, test_tileable_noise_repeats, test_tileable_noise_is_the_same_as_snoise2):
+        test()
+        print(test.__name__, 'OK')